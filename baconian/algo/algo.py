@@ -102,7 +102,7 @@ class Algo(Basic):
         :return: True if in training
         :rtype: bool
         """
-        return self.get_status()['status'] == 'TRAIN'
+        return self._status.status_val == 'TRAIN'
 
     @property
     def is_testing(self):
@@ -112,4 +112,4 @@ class Algo(Basic):
         :return: True if in testing
         :rtype: bool
         """
-        return self.get_status()['status'] == 'TEST'
+        return self._status.status_val == 'TEST'
@@ -2,7 +2,7 @@ from baconian.core.core import EnvSpec
 from baconian.algo.rl_algo import ModelFreeAlgo, OffPolicyAlgo
 from baconian.config.dict_config import DictConfig
 from baconian.algo.value_func.mlp_q_value import MLPQValueFunction
-from baconian.algo.misc.replay_buffer import UniformRandomReplayBuffer, BaseReplayBuffer
+from baconian.algo.misc.replay_buffer import UniformRandomReplayBuffer, BaseReplayBuffer, PrioritisedReplayBuffer
 import tensorflow as tf
 from baconian.common.sampler.sample_data import TransitionData, TrajectoryData
 from baconian.tf.tf_parameters import ParametersWithTensorflowVariable
@@ -15,6 +15,7 @@ from baconian.common.logging import record_return_decorator
 from baconian.core.status import register_counter_info_to_status_decorator
 from baconian.algo.misc.placeholder_input import MultiPlaceholderInput
 from baconian.tf.util import clip_grad
+from baconian.tf.mlp import MLP
 
 
 class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
@@ -55,7 +56,7 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
         self.state_input = self.actor.state_input
 
         if replay_buffer:
-            assert issubclass(replay_buffer, BaseReplayBuffer)
+            assert isinstance(replay_buffer, BaseReplayBuffer)
             self.replay_buffer = replay_buffer
         else:
             self.replay_buffer = UniformRandomReplayBuffer(limit=self.config('REPLAY_BUFFER_SIZE'),
@@ -84,14 +85,28 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
             self.next_state_input = tf.placeholder(shape=[None, self.env_spec.flat_obs_dim], dtype=tf.float32)
             self.done_input = tf.placeholder(shape=[None, 1], dtype=tf.bool)
             self.target_q_input = tf.placeholder(shape=[None, self.env_spec.flat_action_dim], dtype=tf.float32)
+            # importance sampling weights of prioritised replay, all ones if not fed
+            self.importance_weight_input = tf.placeholder_with_default(tf.ones_like(self.reward_input),
+                                                                       shape=[None, 1])
             done = tf.cast(self.done_input, dtype=tf.float32)
             self.predict_q_value = (1. - done) * self.config('GAMMA') * self.target_q_input + self.reward_input
+            self.td_error = self.predict_q_value - self.critic.q_tensor
             with tf.variable_scope('train'):
                 self.critic_loss, self.critic_update_op, self.target_critic_update_op, self.critic_optimizer, \
                 self.critic_grads = self._setup_critic_loss()
                 self.actor_loss, self.actor_update_op, self.target_actor_update_op, self.action_optimizer, \
                 self.actor_grads = self._set_up_actor_loss()
 
+        config_dict = self.config.config_dict
+        self.fused_train_flag = config_dict['FUSED_TRAIN'] if 'FUSED_TRAIN' in config_dict else False
+        self.fused_minibatch_num = config_dict['FUSED_MINIBATCH_NUM'] if 'FUSED_MINIBATCH_NUM' in config_dict else 1
+        # predict with the compiled inference mode of the actor
+        self.compiled_predict_flag = config_dict['COMPILED_PREDICT'] if 'COMPILED_PREDICT' in config_dict else False
+        if self.fused_minibatch_num < 1:
+            raise ValueError('FUSED_MINIBATCH_NUM should be at least 1 instead of {}'.format(self.fused_minibatch_num))
+        if self.fused_train_flag is True:
+            self._setup_fused_train()
+
         var_list = get_tf_collection_var_list(
             '{}/train'.format(name)) + self.critic_optimizer.variables() + self.action_optimizer.variables()
         self.parameters.set_tf_var_list(tf_var_list=sorted(list(set(var_list)), key=lambda x: x.name))
@@ -129,12 +144,20 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
         train_iter = self.parameters("TRAIN_ITERATION") if not train_iter else train_iter
         average_critic_loss = 0.0
         average_actor_loss = 0.0
+        prioritised_flag = batch_data is None and isinstance(self.replay_buffer, PrioritisedReplayBuffer)
+        if self.fused_train_flag is True:
+            return self._fused_train(batch_data, tf_sess, train_iter=train_iter, update_target=update_target,
+                                     prioritised_flag=prioritised_flag)
         for i in range(train_iter):
             train_batch = self.replay_buffer.sample(
                 batch_size=self.parameters('BATCH_SIZE')) if batch_data is None else batch_data
             assert isinstance(train_batch, TransitionData)
             #print(train_batch.action_set)
-            critic_loss, _ = self._critic_train(train_batch, tf_sess)
+            critic_loss, _, td_error = self._critic_train(train_batch, tf_sess, prioritised_flag=prioritised_flag)
+            if prioritised_flag is True:
+                self.replay_buffer.update_priorities(
+                    idxes=train_batch('buffer_index_set'),
+                    priorities=np.abs(np.reshape(td_error, [-1])) + PrioritisedReplayBuffer.MIN_PRIORITY)
 
             actor_loss, _ = self._actor_train(train_batch, tf_sess)
 
@@ -145,7 +168,46 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
         return dict(average_actor_loss=average_actor_loss / train_iter,
                     average_critic_loss=average_critic_loss / train_iter)
 
-    def _critic_train(self, batch_data, sess) -> ():
+    def _fused_train(self, batch_data, sess, train_iter, update_target, prioritised_flag=False) -> dict:
+        """
+        Train with the fused graph, every session run updates the critic and the actor on fused_minibatch_num
+        minibatches, so train_iter is rounded up to a multiple of it. The target networks are soft updated in the last
+        run if update_target is True.
+        """
+        run_num = int(np.ceil(train_iter / self.fused_minibatch_num))
+        average_critic_loss = 0.0
+        average_actor_loss = 0.0
+        for i in range(run_num):
+            # with prioritised replay, all minibatches of a run are sampled before their priorities are updated
+            batch_list = [self.replay_buffer.sample(batch_size=self.parameters('BATCH_SIZE'))
+                          if batch_data is None else batch_data for _ in range(self.fused_minibatch_num)]
+            feed_dict = {
+                self.fused_state_input: np.concatenate([batch.state_set for batch in batch_list]),
+                self.fused_action_input: np.concatenate([batch.action_set for batch in batch_list]),
+                self.fused_next_state_input: np.concatenate([batch.new_state_set for batch in batch_list]),
+                self.fused_done_input: np.reshape(np.concatenate([batch.done_set for batch in batch_list]), [-1, 1]),
+                self.fused_reward_input: np.reshape(np.concatenate([batch.reward_set for batch in batch_list]),
+                                                    [-1, 1]),
+                **self.parameters.return_tf_parameter_feed_dict()
+            }
+            if prioritised_flag is True:
+                feed_dict[self.fused_importance_weight_input] = np.reshape(
+                    np.concatenate([batch('importance_weight_set') for batch in batch_list]), [-1, 1])
+            train_op = self.fused_train_with_target_update_op if update_target and i == run_num - 1 \
+                else self.fused_train_op
+            critic_loss, actor_loss, td_error, _ = sess.run(
+                [self.fused_critic_loss, self.fused_actor_loss, self.fused_td_error, train_op],
+                feed_dict=feed_dict)
+            if prioritised_flag is True:
+                self.replay_buffer.update_priorities(
+                    idxes=np.concatenate([batch('buffer_index_set') for batch in batch_list]),
+                    priorities=np.abs(np.reshape(td_error, [-1])) + PrioritisedReplayBuffer.MIN_PRIORITY)
+            average_critic_loss += np.sum(critic_loss)
+            average_actor_loss += np.sum(actor_loss)
+        return dict(average_actor_loss=average_actor_loss / (run_num * self.fused_minibatch_num),
+                    average_critic_loss=average_critic_loss / (run_num * self.fused_minibatch_num))
+
+    def _critic_train(self, batch_data, sess, prioritised_flag=False) -> ():
         target_q = sess.run(
             self._target_critic_with_target_actor_output.q_tensor,
             feed_dict={
@@ -154,20 +216,21 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
             }
         )
         #print(self.parameters.return_tf_parameter_feed_dict())
-        loss, _, grads = sess.run(
-            [self.critic_loss, self.critic_update_op, self.critic_grads
-             ],
-
-            feed_dict={
-                self.target_q_input: target_q,
-                self.critic.state_input: batch_data.state_set,
-                self.critic.action_input: batch_data.action_set,
-                self.done_input: np.reshape(batch_data.done_set, [-1, 1]),
-                self.reward_input: np.reshape(batch_data.reward_set, [-1, 1]),
-                **self.parameters.return_tf_parameter_feed_dict()
-            }
+        feed_dict = {
+            self.target_q_input: target_q,
+            self.critic.state_input: batch_data.state_set,
+            self.critic.action_input: batch_data.action_set,
+            self.done_input: np.reshape(batch_data.done_set, [-1, 1]),
+            self.reward_input: np.reshape(batch_data.reward_set, [-1, 1]),
+            **self.parameters.return_tf_parameter_feed_dict()
+        }
+        if prioritised_flag is True:
+            feed_dict[self.importance_weight_input] = np.reshape(batch_data('importance_weight_set'), [-1, 1])
+        loss, _, grads, td_error = sess.run(
+            [self.critic_loss, self.critic_update_op, self.critic_grads, self.td_error],
+            feed_dict=feed_dict
         )
-        return loss, grads
+        return loss, grads, td_error
 
     def _actor_train(self, batch_data, sess) -> ():
         target_q, loss, _, grads = sess.run(
@@ -186,12 +249,26 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
 
     def predict(self, obs: np.ndarray, sess=None, batch_flag: bool = False):
         tf_sess = sess if sess else tf.get_default_session()
+        if self.compiled_predict_flag is True:
+            return self.actor.forward(obs=obs, sess=tf_sess, compiled_flag=True, extra_parameters=[self.parameters])
         feed_dict = {
             self.state_input: make_batch(obs, original_shape=self.env_spec.obs_shape),
             **self.parameters.return_tf_parameter_feed_dict()
         }
         return self.actor.forward(obs=obs, sess=tf_sess, feed_dict=feed_dict)
 
+    def export_numpy_actor_state(self, sess=None, version=None) -> dict:
+        """
+        Export the actor as a plain dict, with which baconian.common.numpy_mlp.NumpyMLP predicts the same actions as
+        predict without tensorflow, e.g., in sampling worker processes.
+
+        :param sess: tf session
+        :param version: version of the exported weights, NumpyMLP.load_state skips a state of the loaded version
+        :return: dict of the state
+        :rtype: dict
+        """
+        return self.actor.export_numpy_state(sess=sess, version=version)
+
     def append_to_memory(self, samples: TransitionData):
 
         self.replay_buffer.append_batch(obs0=samples.state_set,
@@ -216,7 +293,7 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
 
     def _setup_critic_loss(self):
         reg_loss = tf.get_collection(tf.GraphKeys.REGULARIZATION_LOSSES, scope=self.critic.name_scope)
-        loss = tf.reduce_sum((self.predict_q_value - self.critic.q_tensor) ** 2)
+        loss = tf.reduce_sum(self.importance_weight_input * self.td_error ** 2)
         if len(reg_loss) > 0:
             loss += tf.reduce_sum(reg_loss)
         optimizer = tf.train.AdamOptimizer(learning_rate=self.parameters('CRITIC_LEARNING_RATE'))
@@ -260,4 +337,111 @@ class DDPG(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
 
         return loss, optimize_op, op, optimizer, grads
 
+    def _setup_fused_train(self):
+        """
+        Build the fused training graph, the fed batch is split into fused_minibatch_num minibatches and each of them
+        does one update: the target q value is computed in graph by the target networks, then the critic is updated,
+        then the actor. The actor and critic are rebuilt on the minibatch tensors under tf.control_dependencies, so a
+        network is only evaluated after the previous update is applied and reads the updated variables. The optimizers
+        of the unfused training are reused, their slots are shared by both modes.
+        """
+        with tf.variable_scope(self.name):
+            with tf.variable_scope('fused_train'):
+                self.fused_state_input = tf.placeholder(shape=[None, self.env_spec.flat_obs_dim], dtype=tf.float32)
+                self.fused_action_input = tf.placeholder(shape=[None, self.env_spec.flat_action_dim],
+                                                         dtype=tf.float32)
+                self.fused_next_state_input = tf.placeholder(shape=[None, self.env_spec.flat_obs_dim],
+                                                             dtype=tf.float32)
+                self.fused_reward_input = tf.placeholder(shape=[None, 1], dtype=tf.float32)
+                self.fused_done_input = tf.placeholder(shape=[None, 1], dtype=tf.bool)
+                self.fused_importance_weight_input = tf.placeholder_with_default(
+                    tf.ones_like(self.fused_reward_input), shape=[None, 1])
+        critic_reg_loss = tf.get_collection(tf.GraphKeys.REGULARIZATION_LOSSES, scope=self.critic.name_scope)
+        actor_reg_loss = tf.get_collection(tf.GraphKeys.REGULARIZATION_LOSSES, scope=self.actor.name_scope)
+        split_input_list = [tf.split(ph, self.fused_minibatch_num, axis=0) for ph in (self.fused_state_input,
+                                                                                      self.fused_action_input,
+                                                                                      self.fused_next_state_input,
+                                                                                      self.fused_reward_input,
+                                                                                      self.fused_done_input,
+                                                                                      self.fused_importance_weight_input)]
+        critic_loss_list = []
+        actor_loss_list = []
+        td_error_list = []
+        dependency = []
+        for state, action, next_state, reward, done, importance_weight in zip(*split_input_list):
+            with tf.control_dependencies(dependency):
+                target_q = self._fused_q_tensor(self.target_critic, next_state,
+                                                self._fused_action_tensor(self.target_actor, next_state))
+                done = tf.cast(done, dtype=tf.float32)
+                td_error = (1. - done) * self.config('GAMMA') * tf.stop_gradient(target_q) + reward - \
+                           self._fused_q_tensor(self.critic, state, action)
+                critic_loss = tf.reduce_sum(importance_weight * td_error ** 2)
+                if len(critic_reg_loss) > 0:
+                    critic_loss += tf.reduce_sum(critic_reg_loss)
+                critic_update_op = self._fused_apply_gradients(
+                    optimizer=self.critic_optimizer,
+                    loss=critic_loss,
+                    var_list=self.critic.parameters('tf_var_list'),
+                    clip_flag=self.parameters('critic_clip_norm') is not None)
+            with tf.control_dependencies([critic_update_op]):
+                actor_loss = -tf.reduce_mean(self._fused_q_tensor(self.critic, state,
+                                                                  self._fused_action_tensor(self.actor, state)))
+                if len(actor_reg_loss) > 0:
+                    actor_loss += tf.reduce_sum(actor_reg_loss)
+                # same as _set_up_actor_loss, the actor gradients are clipped by critic_clip_norm
+                actor_update_op = self._fused_apply_gradients(
+                    optimizer=self.action_optimizer,
+                    loss=actor_loss,
+                    var_list=self.actor.parameters('tf_var_list'),
+                    clip_flag=self.parameters('actor_clip_norm') is not None)
+            dependency = [actor_update_op]
+            critic_loss_list.append(critic_loss)
+            actor_loss_list.append(actor_loss)
+            td_error_list.append(td_error)
+        self.fused_critic_loss = tf.stack(critic_loss_list)
+        self.fused_actor_loss = tf.stack(actor_loss_list)
+        self.fused_td_error = tf.concat(td_error_list, axis=0)
+        self.fused_train_op = tf.group(*dependency)
+        target_update_op = []
+        with tf.control_dependencies(dependency):
+            for source, target in ((self.critic, self.target_critic), (self.actor, self.target_actor)):
+                for var, target_var in zip(source.parameters('tf_var_list'), target.parameters('tf_var_list')):
+                    ref_val = self.parameters('DECAY') * target_var + (1.0 - self.parameters('DECAY')) * var
+                    target_update_op.append(tf.assign(target_var, ref_val))
+        self.fused_train_with_target_update_op = tf.group(*target_update_op)
+
+    def _fused_apply_gradients(self, optimizer, loss, var_list, clip_flag: bool):
+        if clip_flag is True:
+            grad_var_pair, _ = clip_grad(optimizer=optimizer,
+                                         loss=loss,
+                                         var_list=var_list,
+                                         clip_norm=self.parameters('critic_clip_norm'))
+        else:
+            grad_var_pair = optimizer.compute_gradients(loss=loss, var_list=var_list)
+        return optimizer.apply_gradients(grad_var_pair)
+
+    @staticmethod
+    def _fused_action_tensor(policy: DeterministicMLPPolicy, state: tf.Tensor) -> tf.Tensor:
+        return MLP(input_ph=state,
+                   net_name='deterministic_mlp_policy',
+                   reuse=True,
+                   mlp_config=policy.mlp_config,
+                   input_norm=policy.input_norm,
+                   output_norm=policy.output_norm,
+                   output_low=policy.output_low,
+                   output_high=policy.output_high,
+                   name_scope=policy.name_scope).output
+
+    @staticmethod
+    def _fused_q_tensor(value_func: MLPQValueFunction, state: tf.Tensor, action: tf.Tensor) -> tf.Tensor:
+        return MLP(input_ph=tf.concat([state, action], axis=1),
+                   net_name=value_func.name_scope,
+                   reuse=True,
+                   mlp_config=value_func.mlp_config,
+                   input_norm=value_func.input_norm,
+                   output_norm=value_func.output_norm,
+                   output_low=value_func.output_low,
+                   output_high=value_func.output_high,
+                   name_scope=value_func.name_scope).output
+
 # todo identify API and their examples, limitations
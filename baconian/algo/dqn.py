@@ -1,4 +1,4 @@
-from baconian.common.special import flatten_n
+from baconian.common.special import flatten_n, make_batch
 from baconian.algo.rl_algo import ModelFreeAlgo, OffPolicyAlgo
 from baconian.config.dict_config import DictConfig
 from typeguard import typechecked
@@ -34,17 +34,22 @@ class DQN(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
         self.config = construct_dict_config(config_or_config_dict, self)
 
         if replay_buffer:
-            assert issubclass(replay_buffer, BaseReplayBuffer)
+            assert isinstance(replay_buffer, BaseReplayBuffer)
             self.replay_buffer = replay_buffer
         else:
             self.replay_buffer = UniformRandomReplayBuffer(limit=self.config('REPLAY_BUFFER_SIZE'),
                                                            action_shape=self.env_spec.action_shape,
                                                            observation_shape=self.env_spec.obs_shape)
         self.q_value_func = value_func
+        self._action_one_hot_code = generate_n_actions_hot_code(n=self.env_spec.flat_action_dim)
         self.state_input = self.q_value_func.state_input
         self.action_input = self.q_value_func.action_input
         self.update_target_q_every_train = self.config('UPDATE_TARGET_Q_FREQUENCY') if 'UPDATE_TARGET_Q_FREQUENCY' in \
                                                                                        self.config.config_dict else 1
+        # evaluate the q values of predict with the compiled inference mode
+        self.compiled_predict_flag = self.config('COMPILED_PREDICT') if 'COMPILED_PREDICT' in \
+                                                                        self.config.config_dict else False
+        self._compiled_runner = CompiledRunner()
         self.parameters = ParametersWithTensorflowVariable(tf_var_list=[],
                                                            rest_parameters=dict(),
                                                            to_scheduler_param_tuple=schedule_param_list,
@@ -57,6 +62,9 @@ class DQN(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
             self.next_state_input = tf.placeholder(shape=[None, self.env_spec.flat_obs_dim], dtype=tf.float32)
             self.done_input = tf.placeholder(shape=[None, 1], dtype=tf.bool)
             self.target_q_input = tf.placeholder(shape=[None, 1], dtype=tf.float32)
+            # importance sampling weights of prioritised replay, all ones if not fed
+            self.importance_weight_input = tf.placeholder_with_default(tf.ones_like(self.reward_input),
+                                                                       shape=[None, 1])
             done = tf.cast(self.done_input, dtype=tf.float32)
             self.target_q_value_func = self.q_value_func.make_copy(name_scope='{}_targe_q_value_net'.format(name),
                                                                    name='{}_targe_q_value_net'.format(name),
@@ -99,6 +107,7 @@ class DQN(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
         train_iter = self.parameters("TRAIN_ITERATION") if not train_iter else train_iter
         average_loss = 0.0
 
+        prioritised_flag = batch_data is None and isinstance(self.replay_buffer, PrioritisedReplayBuffer)
         for i in range(train_iter):
             train_data = self.replay_buffer.sample(
                 batch_size=self.parameters('BATCH_SIZE')) if batch_data is None else batch_data
@@ -115,8 +124,14 @@ class DQN(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
                 self.target_q_input: target_q_val_on_new_s,
                 **self.parameters.return_tf_parameter_feed_dict()
             }
-            res, _ = tf_sess.run([self.q_value_func_loss, self.update_q_value_func_op],
-                                 feed_dict=feed_dict)
+            if prioritised_flag is True:
+                feed_dict[self.importance_weight_input] = np.reshape(train_data('importance_weight_set'), [-1, 1])
+            res, _, td_error = tf_sess.run([self.q_value_func_loss, self.update_q_value_func_op, self.td_error],
+                                           feed_dict=feed_dict)
+            if prioritised_flag is True:
+                self.replay_buffer.update_priorities(
+                    idxes=train_data('buffer_index_set'),
+                    priorities=np.abs(np.reshape(td_error, [-1])) + PrioritisedReplayBuffer.MIN_PRIORITY)
             average_loss += res
 
         average_loss /= train_iter
@@ -148,6 +163,19 @@ class DQN(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
         else:
             return action.astype(np.int).tolist()
 
+    def export_numpy_actor_state(self, sess=None, version=None) -> dict:
+        """
+        Export the q value function as a plain dict to act without tensorflow, e.g., in sampling worker processes. The
+        greedy actions as the ones of predict are given by baconian.common.numpy_mlp.greedy_discrete_action with
+        the NumpyMLP of the state.
+
+        :param sess: tf session
+        :param version: version of the exported weights, NumpyMLP.load_state skips a state of the loaded version
+        :return: dict of the state
+        :rtype: dict
+        """
+        return self.q_value_func.export_numpy_state(sess=sess, version=version)
+
     def predict_target_with_q_val(self, obs: np.ndarray, sess=None, batch_flag: bool = False):
         if batch_flag:
             action, q_val = self._predict_batch_action(obs=obs,
@@ -190,31 +218,43 @@ class DQN(ModelFreeAlgo, OffPolicyAlgo, MultiPlaceholderInput):
                         sess=None):
         if self.env_spec.obs_space.contains(obs) is False:
             raise StateOrActionOutOfBoundError("obs {} out of bound {}".format(obs, self.env_spec.obs_space.bound()))
-        obs = repeat_ndarray(obs, repeats=self.env_spec.flat_action_dim)
-        tf_sess = sess if sess else tf.get_default_session()
-        feed_dict = {action_ph: generate_n_actions_hot_code(n=self.env_spec.flat_action_dim),
-                     state_ph: obs, **self.parameters.return_tf_parameter_feed_dict()}
-        res = tf_sess.run([q_value_tensor],
-                          feed_dict=feed_dict)[0]
-        return np.argmax(res, axis=0), np.max(res, axis=0)
+        action, q_val = self._predict_batch_action(obs=obs,
+                                                   q_value_tensor=q_value_tensor,
+                                                   action_ph=action_ph,
+                                                   state_ph=state_ph,
+                                                   sess=sess)
+        return action[0], q_val[0]
 
     def _predict_batch_action(self, obs: np.ndarray, q_value_tensor: tf.Tensor, action_ph: tf.Tensor,
                               state_ph: tf.Tensor, sess=None):
-        actions = []
-        q_values = []
-        for obs_i in obs:
-            action, q_val = self._predict_action(obs=obs_i,
-                                                 q_value_tensor=q_value_tensor,
-                                                 action_ph=action_ph,
-                                                 state_ph=state_ph,
-                                                 sess=sess)
-            actions.append(np.argmax(action, axis=0))
-            q_values.append(np.max(q_val, axis=0))
-        return np.array(actions), np.array(q_values)
+        """
+        Evaluate the q value of every (state, action) pair of the batch with one session run, the states are repeated
+        flat_action_dim times and paired with the one-hot code of each action.
+
+        :return: argmax action and max q value for each state of the batch
+        """
+        obs = make_batch(obs, original_shape=self.env_spec.obs_shape)
+        batch_size = obs.shape[0]
+        action_dim = self.env_spec.flat_action_dim
+        tf_sess = sess if sess else tf.get_default_session()
+        if self.compiled_predict_flag is True:
+            res = self._compiled_runner.run(q_value_tensor,
+                                            input_ph_list=[action_ph, state_ph],
+                                            input_value_list=[np.tile(self._action_one_hot_code, (batch_size, 1)),
+                                                              np.repeat(obs, repeats=action_dim, axis=0)],
+                                            parameters_list=[self.parameters],
+                                            sess=tf_sess)
+        else:
+            feed_dict = {action_ph: np.tile(self._action_one_hot_code, (batch_size, 1)),
+                         state_ph: np.repeat(obs, repeats=action_dim, axis=0),
+                         **self.parameters.return_tf_parameter_feed_dict()}
+            res = tf_sess.run(q_value_tensor, feed_dict=feed_dict)
+        res = np.reshape(res, [batch_size, action_dim])
+        return np.argmax(res, axis=1), np.max(res, axis=1)
 
     def _set_up_loss(self):
         reg_loss = tf.get_collection(tf.GraphKeys.REGULARIZATION_LOSSES, scope=self.q_value_func.name_scope)
-        loss = tf.reduce_sum((self.predict_q_value - self.q_value_func.q_tensor) ** 2)
+        loss = tf.reduce_sum(self.importance_weight_input * (self.predict_q_value - self.q_value_func.q_tensor) ** 2)
         if len(reg_loss) > 0:
             loss += tf.reduce_sum(reg_loss)
         optimizer = tf.train.AdamOptimizer(learning_rate=self.parameters('LEARNING_RATE'))
@@ -13,6 +13,8 @@ from baconian.core.core import EnvSpec, Env
 from baconian.algo.dynamics.reward_func.reward_func import RewardFunc
 from baconian.algo.dynamics.terminal_func.terminal_func import TerminalFunc
 from baconian.common.data_pre_processing import DataScaler, IdenticalDataScaler
+from baconian.common.special import flatten_n, make_batch
+from baconian.common.spaces import Box, Discrete
 
 
 class DynamicsModel(Basic):
@@ -101,6 +103,73 @@ class DynamicsModel(Basic):
         self.state = new_state
         return new_state
 
+    def step_batch(self, states: np.ndarray, actions: np.ndarray, allow_clip=False, **kwargs_for_transit):
+        """
+        Batched state transition function, the transitions of all the (state, action) pairs are computed together.
+        Different from step, the stored state of the dynamics model is not changed.
+
+        :param states: batch of current states
+        :type states: np.ndarray
+        :param actions: batch of actions to be taken
+        :type actions: np.ndarray
+        :param allow_clip: allow clip of observation space, default False
+        :type allow_clip: bool
+        :param kwargs_for_transit: extra kwargs for calling the _state_transit_batch
+        :type kwargs_for_transit:
+        :return: batch of new states
+        :rtype: np.ndarray
+        """
+        states = make_batch(np.array(states), original_shape=self.env_spec.obs_shape)
+        actions = make_batch(np.array(actions), original_shape=self.env_spec.action_shape)
+        if states.shape[0] != actions.shape[0]:
+            raise ValueError('got {} states but {} actions'.format(states.shape[0], actions.shape[0]))
+        if allow_clip is True:
+            states = _clip_batch(self.env_spec.obs_space, states)
+            actions = _clip_batch(self.env_spec.action_space, actions)
+        if _batch_contains(self.env_spec.action_space, actions) is False:
+            raise StateOrActionOutOfBoundError(
+                'actions out of bound of {}'.format(self.env_spec.action_space.bound()))
+        new_states = self._state_transit_batch(states=states,
+                                               actions=flatten_n(self.env_spec.action_space, actions),
+                                               **kwargs_for_transit)
+        if allow_clip is True:
+            new_states = _clip_batch(self.env_spec.obs_space, new_states)
+        if _batch_contains(self.env_spec.obs_space, new_states) is False:
+            raise StateOrActionOutOfBoundError(
+                'new states out of bound of {}'.format(self.env_spec.obs_space.bound()))
+        self._status.update_info(info_key='step_counter', increment=states.shape[0])
+        return new_states
+
+    def _state_transit_batch(self, states, actions, **kwargs) -> np.ndarray:
+        """
+        Batched version of _state_transit, by default _state_transit is called on every pair, models that can compute
+        a batch at once should override it.
+
+        :param states: batch of original states
+        :type states: np.ndarray
+        :param actions: batch of flat actions
+        :type actions: np.ndarray
+        :return: batch of new states
+        :rtype: np.ndarray
+        """
+        return np.array([self._state_transit(state=state, action=action, **kwargs)
+                         for state, action in zip(states, actions)])
+
+    def jacobian_batch(self, states: np.ndarray, actions: np.ndarray, **kwargs) -> np.ndarray:
+        """
+        Analytic jacobian of the state transition function with respect to the flat state and the flat action,
+        computed for a batch of (state, action) pairs. Models that are not differentiable raise NotImplementedError,
+        the caller (e.g., iLQR) should fall back to finite difference.
+
+        :param states: batch of states
+        :type states: np.ndarray
+        :param actions: batch of actions
+        :type actions: np.ndarray
+        :return: jacobian with shape [batch_size, flat_obs_dim, flat_obs_dim + flat_action_dim]
+        :rtype: np.ndarray
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def _state_transit(self, state, action, **kwargs) -> np.ndarray:
         """
@@ -234,6 +303,25 @@ class DynamicsEnvWrapper(Env):
         terminal = self._terminal_func(state=state, action=action, new_state=new_state)
         return new_state, re, terminal, ()
 
+    def step_batch(self, states: np.ndarray, actions: np.ndarray, **kwargs):
+        """
+        Batched version of step on the given states, used to roll out many imagined trajectories at once. The state
+        of the wrapped dynamics model is not changed.
+
+        :param states: batch of current states
+        :type states: np.ndarray
+        :param actions: batch of actions
+        :type actions: np.ndarray
+        :return: batch of new states, rewards and terminal signals
+        """
+        new_states = self._dynamics.step_batch(states=states, actions=actions, **kwargs)
+        re = self._reward_func.batch_call(state=states, action=actions, new_state=new_states)
+        terminal = self._terminal_func.batch_call(state=states, action=actions, new_state=new_states)
+        return new_states, re, terminal
+
+    def jacobian_batch(self, states: np.ndarray, actions: np.ndarray, **kwargs) -> np.ndarray:
+        return self._dynamics.jacobian_batch(states=states, actions=actions, **kwargs)
+
     def reset(self):
         super(DynamicsEnvWrapper, self).reset()
         self._dynamics.reset_state()
@@ -261,6 +349,22 @@ class DynamicsEnvWrapper(Env):
         self._reward_func = reward_func
 
 
+def _clip_batch(space, batch: np.ndarray) -> np.ndarray:
+    if isinstance(space, Box):
+        return np.clip(batch, space.low, space.high)
+    elif isinstance(space, Discrete):
+        return np.clip(batch, 0, space.n - 1)
+    return np.array([space.clip(x) for x in batch])
+
+
+def _batch_contains(space, batch: np.ndarray) -> bool:
+    if isinstance(space, Box):
+        return bool((batch >= space.low).all() and (batch <= space.high).all())
+    elif isinstance(space, Discrete):
+        return bool(np.equal(np.mod(batch, 1), 0).all() and (batch >= 0).all() and (batch < space.n).all())
+    return all(space.contains(x) for x in batch)
+
+
 class DynamicsPriorModel(Basic):
     def __init__(self, env_spec: EnvSpec, parameters: Parameters, name: str):
         super().__init__(name=name)
@@ -52,6 +52,17 @@ class GaussianProcessDyanmicsModel(LocalDyanmicsModel, TrainableDyanmicsModel):
         else:
             return np.squeeze(deltas) + state
 
+    def _state_transit_batch(self, states, actions, required_var=False, **kwargs):
+        states = np.reshape(states, [-1, self.env_spec.flat_obs_dim])
+        actions = np.reshape(actions, [-1, self.env_spec.flat_action_dim])
+        # the mean and variance returned by mgpr are in shape [state_dim, batch_size, 1]
+        deltas, vars = self.mgpr_model.predict(x=np.concatenate([states, actions], axis=1))
+        new_states = np.transpose(deltas[:, :, 0]) + states
+        if required_var is True:
+            return new_states, np.transpose(vars[:, :, 0])
+        else:
+            return new_states
+
     def copy_from(self, obj) -> bool:
         raise NotImplementedError
 
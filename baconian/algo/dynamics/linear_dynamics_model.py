@@ -29,6 +29,18 @@ class LinearDynamicsModel(GlobalDynamicsModel):
         new_state = np.dot(self.parameters('F'), np.concatenate((state, action))) + self.parameters('f')
         return self.env_spec.obs_space.clip(new_state)
 
+    def _state_transit_batch(self, states, actions, **kwargs) -> np.ndarray:
+        states = np.reshape(states, [-1, self.env_spec.flat_obs_dim])
+        actions = np.reshape(actions, [-1, self.env_spec.flat_action_dim])
+        new_states = np.dot(np.concatenate((states, actions), axis=1), self.parameters('F').T) + self.parameters('f')
+        new_states = np.clip(new_states, np.reshape(self.env_spec.obs_space.low, [-1]),
+                             np.reshape(self.env_spec.obs_space.high, [-1]))
+        return np.reshape(new_states, [-1] + list(self.env_spec.obs_shape))
+
+    def jacobian_batch(self, states: np.ndarray, actions: np.ndarray, **kwargs) -> np.ndarray:
+        # the clip on the observation space is ignored
+        return np.tile(self.parameters('F'), (len(states), 1, 1))
+
     def make_copy(self):
         return LinearDynamicsModel(env_spec=self.env_spec,
                                    state_transition_matrix=deepcopy(self.parameters('F')),
@@ -64,6 +76,15 @@ class LinearRegressionDynamicsModel(GlobalDynamicsModel, TrainableDyanmicsModel)
                             self.env_spec.obs_space.high).squeeze()
         return new_state
 
+    def _state_transit_batch(self, states, actions, **kwargs) -> np.ndarray:
+        states = self.state_input_scaler.process(np.reshape(states, [-1, self.env_spec.flat_obs_dim]))
+        actions = self.action_input_scaler.process(np.reshape(actions, [-1, self.env_spec.flat_action_dim]))
+        new_states = self._linear_model.predict(np.concatenate([states, actions], axis=-1))
+        new_states = np.clip(self.state_output_scaler.inverse_process(new_states),
+                             np.reshape(self.env_spec.obs_space.low, [-1]),
+                             np.reshape(self.env_spec.obs_space.high, [-1]))
+        return np.reshape(new_states, [-1] + list(self.env_spec.obs_shape))
+
     def train(self, batch_data: TransitionData = None, *kwargs):
         self.state_input_scaler.update_scaler(batch_data.state_set)
         self.action_input_scaler.update_scaler(batch_data.action_set)
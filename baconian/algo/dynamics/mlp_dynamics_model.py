@@ -15,6 +15,7 @@ from baconian.common.logging import record_return_decorator
 from baconian.core.status import register_counter_info_to_status_decorator, StatusWithSubInfo
 from baconian.common.spaces.box import Box
 from baconian.common.data_pre_processing import DataScaler, IdenticalDataScaler
+from tensorflow.python.ops.parallel_for.gradients import batch_jacobian as tf_batch_jacobian
 
 
 class ContinuousMLPGlobalDynamicsModel(GlobalDynamicsModel, DifferentiableDynamics, PlaceholderInput,
@@ -77,6 +78,7 @@ class ContinuousMLPGlobalDynamicsModel(GlobalDynamicsModel, DifferentiableDynami
         self.output_delta_state_scaler = output_delta_state_scaler if output_delta_state_scaler else IdenticalDataScaler(
             dims=self.env_spec.flat_obs_dim)
         self._status = StatusWithSubInfo(obj=self)
+        self._jacobian_op = None
 
         with tf.variable_scope(name_scope):
             with tf.variable_scope('train'):
@@ -91,12 +93,20 @@ class ContinuousMLPGlobalDynamicsModel(GlobalDynamicsModel, DifferentiableDynami
         self.parameters.init()
         if source_obj:
             self.copy_from(obj=source_obj)
+        if self._jacobian_op is None:
+            # built here so no op is added to the graph during planning
+            self._jacobian_op = tf_batch_jacobian(output=self.delta_state_output, inp=self.mlp_input_ph)
         GlobalDynamicsModel.init(self)
 
     @register_counter_info_to_status_decorator(increment=1, info_key='step')
     def step(self, action: np.ndarray, state=None, **kwargs_for_transit):
         return super().step(action, state, **kwargs_for_transit)
 
+    def step_batch(self, states: np.ndarray, actions: np.ndarray, **kwargs_for_transit):
+        res = super().step_batch(states, actions, **kwargs_for_transit)
+        self._status.update_info(info_key='step', increment=len(res))
+        return res
+
     @record_return_decorator(which_recorder='self')
     @register_counter_info_to_status_decorator(increment=1, info_key='train_counter', under_status='TRAIN')
     def train(self, batch_data: TransitionData, **kwargs) -> dict:
@@ -133,29 +143,53 @@ class ContinuousMLPGlobalDynamicsModel(GlobalDynamicsModel, DifferentiableDynami
     def copy_from(self, obj: PlaceholderInput) -> bool:
         return PlaceholderInput.copy_from(self, obj)
 
+    def jacobian_batch(self, states: np.ndarray, actions: np.ndarray, **kwargs) -> np.ndarray:
+        """
+        Jacobian of the new state with respect to the flat state and the flat action for a batch of pairs, computed
+        by one session run of the batch jacobian of the mlp output on its input. The data scalers are assumed to be
+        element-wise affine (e.g., standard or min-max scaler) and are chained into the result, the clip on the
+        observation space is ignored.
+        """
+        if self._jacobian_op is None:
+            self._jacobian_op = tf_batch_jacobian(output=self.delta_state_output, inp=self.mlp_input_ph)
+        tf_sess = kwargs['sess'] if ('sess' in kwargs and kwargs['sess']) else tf.get_default_session()
+        states = np.reshape(states, [-1, self.env_spec.flat_obs_dim])
+        actions = np.reshape(actions, [-1, self.env_spec.flat_action_dim])
+        # [batch_size, flat_obs_dim, flat_obs_dim + flat_action_dim] in the scaled space
+        jacobian = tf_sess.run(self._jacobian_op,
+                               feed_dict={
+                                   self.action_input: self.action_input_scaler.process(actions),
+                                   self.state_input: self.state_input_scaler.process(states)
+                               })
+        input_scale = np.concatenate([_affine_scale(self.state_input_scaler, self.env_spec.flat_obs_dim),
+                                      _affine_scale(self.action_input_scaler, self.env_spec.flat_action_dim)])
+        output_scale = _affine_scale(self.output_delta_state_scaler, self.env_spec.flat_obs_dim)
+        jacobian = jacobian * input_scale[np.newaxis, np.newaxis, :] / output_scale[np.newaxis, :, np.newaxis]
+        jacobian[:, :, :self.env_spec.flat_obs_dim] += np.eye(self.env_spec.flat_obs_dim)
+        return jacobian
+
     def _state_transit(self, state, action, **kwargs) -> np.ndarray:
-        state = self.state_input_scaler.process(
-            np.array(state).reshape(self.env_spec.obs_shape)) if state is not None else self.state
-        action = self.action_input_scaler.process(self.env_spec.flat_action(action))
+        state = np.array(state).reshape(self.env_spec.obs_shape) if state is not None else self.state
+        return self._state_transit_batch(states=np.expand_dims(state, 0),
+                                         actions=np.reshape(action, [1, -1]),
+                                         **kwargs)[0]
 
-        if 'sess' in kwargs:
+    def _state_transit_batch(self, states, actions, **kwargs) -> np.ndarray:
+        if 'sess' in kwargs and kwargs['sess']:
             tf_sess = kwargs['sess']
         else:
             tf_sess = tf.get_default_session()
-
-        if len(state.shape) < 2:
-            state = np.expand_dims(state, 0)
-        if len(action.shape) < 2:
-            action = np.expand_dims(action, 0)
+        states = np.reshape(states, [-1, self.env_spec.flat_obs_dim])
+        actions = np.reshape(actions, [-1, self.env_spec.flat_action_dim])
         delta_state = tf_sess.run(self.delta_state_output,
                                   feed_dict={
-                                      self.action_input: action,
-                                      self.state_input: state
+                                      self.action_input: self.action_input_scaler.process(actions),
+                                      self.state_input: self.state_input_scaler.process(states)
                                   })
-        new_state = np.clip(
-            np.squeeze(self.output_delta_state_scaler.inverse_process(data=np.squeeze(delta_state)) + state),
-            self.env_spec.obs_space.low, self.env_spec.obs_space.high)
-        return new_state
+        new_states = np.clip(self.output_delta_state_scaler.inverse_process(data=delta_state) + states,
+                             np.reshape(self.env_spec.obs_space.low, [-1]),
+                             np.reshape(self.env_spec.obs_space.high, [-1]))
+        return np.reshape(new_states, [-1] + list(self.env_spec.obs_shape))
 
     def _setup_loss(self):
         reg_loss = tf.get_collection(tf.GraphKeys.REGULARIZATION_LOSSES, scope=self.name_scope)
@@ -165,3 +199,8 @@ class ContinuousMLPGlobalDynamicsModel(GlobalDynamicsModel, DifferentiableDynami
         optimizer = tf.train.AdamOptimizer(learning_rate=self.parameters('learning_rate'))
         optimize_op = optimizer.minimize(loss=loss, var_list=self.parameters('tf_var_list'))
         return loss, optimizer, optimize_op
+
+
+def _affine_scale(scaler: DataScaler, dims: int) -> np.ndarray:
+    # slope of an element-wise affine scaler
+    return np.reshape(scaler.process(np.ones([1, dims])) - scaler.process(np.zeros([1, dims])), [dims])
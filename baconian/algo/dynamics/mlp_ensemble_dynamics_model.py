@@ -0,0 +1,294 @@
+from baconian.common.special import flatten_n
+from baconian.core.core import EnvSpec
+from baconian.algo.dynamics.dynamics_model import GlobalDynamicsModel, TrainableDyanmicsModel
+import tensorflow as tf
+from baconian.tf.tf_parameters import ParametersWithTensorflowVariable
+from baconian.tf.mlp import MLP
+from baconian.common.sampler.sample_data import TransitionData
+from typeguard import typechecked
+import numpy as np
+from baconian.tf.util import *
+from baconian.algo.misc.placeholder_input import PlaceholderInput
+from baconian.common.error import *
+from baconian.common.logging import record_return_decorator
+from baconian.core.status import register_counter_info_to_status_decorator, StatusWithSubInfo
+from baconian.common.spaces.box import Box
+from baconian.common.data_pre_processing import DataScaler, IdenticalDataScaler
+
+
+class ContinuousMLPEnsembleDynamicsModel(GlobalDynamicsModel, PlaceholderInput, TrainableDyanmicsModel):
+    """
+    An ensemble of n_models MLP dynamics models that predict the delta state (as ContinuousMLPGlobalDynamicsModel)
+    built in one graph. The inputs are stacked along a leading member axis, so the predictions of all the members are
+    fetched with one session run and all the members are trained jointly by one optimizer, each on its own bootstrapped
+    batch.
+
+    The prediction of step and step_batch is aggregated by prediction_type: 'mean' averages the members and 'random'
+    uses the prediction of a uniformly chosen member for every transition. The per-member predictions and their
+    disagreement are given by step_all_members and disagreement, and every member is given as a dynamics model by
+    model (as ModelEnsemble.model).
+    """
+    STATUS_LIST = GlobalDynamicsModel.STATUS_LIST + ('TRAIN',)
+    INIT_STATUS = 'CREATED'
+    PREDICTION_TYPE_LIST = ('mean', 'random')
+
+    @typechecked
+    def __init__(self, env_spec: EnvSpec,
+                 name_scope: str,
+                 name: str,
+                 mlp_config: list,
+                 learning_rate: float,
+                 n_models: int,
+                 prediction_type: str = 'random',
+                 bootstrap: bool = True,
+                 state_input_scaler: DataScaler = None,
+                 action_input_scaler: DataScaler = None,
+                 output_delta_state_scaler: DataScaler = None,
+                 init_state=None):
+        if not isinstance(env_spec.obs_space, Box):
+            raise TypeError('ContinuousMLPEnsembleDynamicsModel only support to predict state that hold space Box type')
+        if prediction_type not in self.PREDICTION_TYPE_LIST:
+            raise ValueError('prediction_type {} not in {}'.format(prediction_type, self.PREDICTION_TYPE_LIST))
+        if n_models < 1:
+            raise InappropriateParameterSetting('n_models should be at least 1, got {}'.format(n_models))
+        GlobalDynamicsModel.__init__(self,
+                                     env_spec=env_spec,
+                                     parameters=None,
+                                     name=name,
+                                     state_input_scaler=state_input_scaler,
+                                     action_input_scaler=action_input_scaler,
+                                     init_state=init_state)
+        with tf.variable_scope(name_scope):
+            state_input = tf.placeholder(shape=[n_models, None, env_spec.flat_obs_dim], dtype=tf.float32,
+                                         name='state_ph')
+            action_input = tf.placeholder(shape=[n_models, None, env_spec.flat_action_dim], dtype=tf.float32,
+                                          name='action_ph')
+            mlp_input_ph = tf.concat([state_input, action_input], axis=2, name='state_action_input')
+            delta_state_label_ph = tf.placeholder(shape=[n_models, None, env_spec.flat_obs_dim], dtype=tf.float32,
+                                                  name='delta_state_label_ph')
+        mlp_net_list = []
+        for i in range(n_models):
+            mlp_net = MLP(input_ph=mlp_input_ph[i],
+                          reuse=False,
+                          mlp_config=mlp_config,
+                          name_scope=name_scope,
+                          net_name='mlp_{}'.format(i))
+            if mlp_net.output.shape[1] != env_spec.flat_obs_dim:
+                raise InappropriateParameterSetting(
+                    "mlp output dims {} != env spec obs dim {}".format(mlp_net.output.shape[1],
+                                                                       env_spec.flat_obs_dim))
+            mlp_net_list.append(mlp_net)
+
+        parameters = ParametersWithTensorflowVariable(tf_var_list=[var for mlp_net in mlp_net_list
+                                                                   for var in mlp_net.var_list],
+                                                      name=name + '_''mlp_ensemble_dynamics_model',
+                                                      rest_parameters=dict(learning_rate=learning_rate))
+        PlaceholderInput.__init__(self, parameters=parameters)
+
+        self.n_models = n_models
+        self.prediction_type = prediction_type
+        self.bootstrap = bootstrap
+        self.mlp_config = mlp_config
+        self.name_scope = name_scope
+        self.action_input = action_input
+        self.state_input = state_input
+        self.mlp_input_ph = mlp_input_ph
+        self.delta_state_label_ph = delta_state_label_ph
+        self.mlp_net_list = mlp_net_list
+        self._member_model_list = None
+        # [n_models, batch_size, flat_obs_dim]
+        self.delta_state_output = tf.stack([mlp_net.output for mlp_net in mlp_net_list], axis=0)
+        self.output_delta_state_scaler = output_delta_state_scaler if output_delta_state_scaler else IdenticalDataScaler(
+            dims=self.env_spec.flat_obs_dim)
+        self._status = StatusWithSubInfo(obj=self)
+
+        with tf.variable_scope(name_scope):
+            with tf.variable_scope('train'):
+                self.member_loss, self.loss, self.optimizer, self.optimize_op = self._setup_loss()
+        train_var_list = get_tf_collection_var_list(key=tf.GraphKeys.GLOBAL_VARIABLES,
+                                                    scope='{}/train'.format(
+                                                        name_scope)) + self.optimizer.variables()
+
+        self.parameters.set_tf_var_list(sorted(list(set(train_var_list)), key=lambda x: x.name))
+
+    def init(self, source_obj=None):
+        self.parameters.init()
+        if source_obj:
+            self.copy_from(obj=source_obj)
+        GlobalDynamicsModel.init(self)
+
+    @register_counter_info_to_status_decorator(increment=1, info_key='step')
+    def step(self, action: np.ndarray, state=None, **kwargs_for_transit):
+        return super().step(action, state, **kwargs_for_transit)
+
+    def step_batch(self, states: np.ndarray, actions: np.ndarray, **kwargs_for_transit):
+        res = super().step_batch(states, actions, **kwargs_for_transit)
+        self._status.update_info(info_key='step', increment=len(res))
+        return res
+
+    def step_all_members(self, states: np.ndarray, actions: np.ndarray, sess=None) -> np.ndarray:
+        """
+        Predict the new states of a batch by every member.
+
+        :param states: batch of states
+        :type states: np.ndarray
+        :param actions: batch of actions
+        :type actions: np.ndarray
+        :param sess: tf session
+        :return: new states with shape [n_models, batch_size] + obs_shape
+        :rtype: np.ndarray
+        """
+        states = np.reshape(states, [-1, self.env_spec.flat_obs_dim])
+        actions = flatten_n(self.env_spec.action_space,
+                            np.reshape(actions, [states.shape[0]] + list(self.env_spec.action_shape)))
+        res = self._predict_all_members(states=states, actions=actions, sess=sess)
+        return np.reshape(res, [self.n_models, -1] + list(self.env_spec.obs_shape))
+
+    @property
+    def model(self) -> list:
+        """
+        The members as dynamics models, see EnsembleMemberDynamicsModel.
+
+        :return: list of EnsembleMemberDynamicsModel, one for each member
+        :rtype: list
+        """
+        if self._member_model_list is None:
+            self._member_model_list = [EnsembleMemberDynamicsModel(ensemble=self, member_index=i)
+                                       for i in range(self.n_models)]
+            for member_model in self._member_model_list:
+                member_model.init()
+        return self._member_model_list
+
+    def disagreement(self, states: np.ndarray, actions: np.ndarray, sess=None) -> np.ndarray:
+        """
+        Variance of the new states predicted by the members, which measures the uncertainty of the ensemble.
+
+        :return: variance with shape [batch_size] + obs_shape
+        :rtype: np.ndarray
+        """
+        return np.var(self.step_all_members(states=states, actions=actions, sess=sess), axis=0)
+
+    @record_return_decorator(which_recorder='self')
+    @register_counter_info_to_status_decorator(increment=1, info_key='train_counter', under_status='TRAIN')
+    def train(self, batch_data: TransitionData, **kwargs) -> dict:
+        self.set_status('TRAIN')
+
+        self.state_input_scaler.update_scaler(batch_data.state_set)
+        self.action_input_scaler.update_scaler(batch_data.action_set)
+        self.output_delta_state_scaler.update_scaler(batch_data.new_state_set - batch_data.state_set)
+
+        tf_sess = kwargs['sess'] if ('sess' in kwargs and kwargs['sess']) else tf.get_default_session()
+        train_iter = self.parameters('train_iter') if 'train_iter' not in kwargs else kwargs['train_iter']
+        data_count = len(batch_data)
+        if self.bootstrap is True:
+            # every member is trained on its own resampling of the batch
+            index = np.random.randint(low=0, high=data_count, size=(self.n_models, data_count))
+        else:
+            index = np.tile(np.arange(data_count), (self.n_models, 1))
+        feed_dict = {
+            self.state_input: self.state_input_scaler.process(batch_data.state_set)[index],
+            self.action_input: self.action_input_scaler.process(
+                flatten_n(self.env_spec.action_space, batch_data.action_set))[index],
+            self.delta_state_label_ph: self.output_delta_state_scaler.process(
+                batch_data.new_state_set - batch_data.state_set)[index],
+            **self.parameters.return_tf_parameter_feed_dict()
+        }
+        average_loss = 0.0
+        average_member_loss = np.zeros(self.n_models)
+        for i in range(train_iter):
+            member_loss, loss, _ = tf_sess.run([self.member_loss, self.loss, self.optimize_op],
+                                               feed_dict=feed_dict)
+            average_loss += loss
+            average_member_loss += member_loss
+        res = dict(average_loss=average_loss / train_iter)
+        for i in range(self.n_models):
+            res['model_{}_average_loss'.format(i)] = average_member_loss[i] / train_iter
+        return res
+
+    def save(self, *args, **kwargs):
+        return PlaceholderInput.save(self, *args, **kwargs)
+
+    def load(self, *args, **kwargs):
+        return PlaceholderInput.load(self, *args, **kwargs)
+
+    def copy_from(self, obj: PlaceholderInput) -> bool:
+        return PlaceholderInput.copy_from(self, obj)
+
+    def _state_transit(self, state, action, **kwargs) -> np.ndarray:
+        state = np.array(state).reshape(self.env_spec.obs_shape) if state is not None else self.state
+        return self._state_transit_batch(states=np.expand_dims(state, 0),
+                                         actions=np.reshape(action, [1, -1]),
+                                         **kwargs)[0]
+
+    def _state_transit_batch(self, states, actions, **kwargs) -> np.ndarray:
+        states = np.reshape(states, [-1, self.env_spec.flat_obs_dim])
+        actions = np.reshape(actions, [-1, self.env_spec.flat_action_dim])
+        res = self._predict_all_members(states=states, actions=actions,
+                                        sess=kwargs['sess'] if 'sess' in kwargs else None)
+        if self.prediction_type == 'mean':
+            new_states = np.mean(res, axis=0)
+        else:
+            new_states = res[np.random.randint(low=0, high=self.n_models, size=states.shape[0]),
+                             np.arange(states.shape[0])]
+        return np.reshape(new_states, [-1] + list(self.env_spec.obs_shape))
+
+    def _predict_all_members(self, states, actions, sess=None, member_index: int = None) -> np.ndarray:
+        """
+        :param member_index: only predict by this member if it is not None, the leading member axis is dropped then
+        """
+        tf_sess = sess if sess else tf.get_default_session()
+        scaled_states = self.state_input_scaler.process(states)
+        scaled_actions = self.action_input_scaler.process(actions)
+        delta_state = tf_sess.run(self.delta_state_output if member_index is None else
+                                  self.mlp_net_list[member_index].output,
+                                  feed_dict={
+                                      self.state_input: np.broadcast_to(scaled_states,
+                                                                        (self.n_models,) + scaled_states.shape),
+                                      self.action_input: np.broadcast_to(scaled_actions,
+                                                                         (self.n_models,) + scaled_actions.shape)
+                                  })
+        return np.clip(self.output_delta_state_scaler.inverse_process(data=delta_state) + states,
+                       np.reshape(self.env_spec.obs_space.low, [-1]),
+                       np.reshape(self.env_spec.obs_space.high, [-1]))
+
+    def _setup_loss(self):
+        reg_loss = tf.get_collection(tf.GraphKeys.REGULARIZATION_LOSSES, scope=self.name_scope)
+        member_loss = tf.reduce_sum((self.delta_state_output - self.delta_state_label_ph) ** 2, axis=[1, 2])
+        # the members do not share variables, so minimizing the sum trains every member on its own loss
+        loss = tf.reduce_sum(member_loss)
+        if len(reg_loss) > 0:
+            loss += tf.reduce_sum(reg_loss)
+        optimizer = tf.train.AdamOptimizer(learning_rate=self.parameters('learning_rate'))
+        optimize_op = optimizer.minimize(loss=loss, var_list=self.parameters('tf_var_list'))
+        return member_loss, loss, optimizer, optimize_op
+
+    def __len__(self):
+        return self.n_models
+
+
+class EnsembleMemberDynamicsModel(GlobalDynamicsModel):
+    """
+    One member of ContinuousMLPEnsembleDynamicsModel as a dynamics model, e.g., to roll out a policy on the member with
+    return_as_env. The weights and the scalers are the ones of the ensemble, only the state is held by the member.
+    """
+
+    def __init__(self, ensemble: ContinuousMLPEnsembleDynamicsModel, member_index: int):
+        super().__init__(env_spec=ensemble.env_spec,
+                         parameters=None,
+                         name='{}_member_{}'.format(ensemble.name, member_index))
+        self.ensemble = ensemble
+        self.member_index = member_index
+
+    def _state_transit(self, state, action, **kwargs) -> np.ndarray:
+        state = np.array(state).reshape(self.env_spec.obs_shape) if state is not None else self.state
+        return self._state_transit_batch(states=np.expand_dims(state, 0),
+                                         actions=np.reshape(action, [1, -1]),
+                                         **kwargs)[0]
+
+    def _state_transit_batch(self, states, actions, **kwargs) -> np.ndarray:
+        states = np.reshape(states, [-1, self.env_spec.flat_obs_dim])
+        actions = np.reshape(actions, [-1, self.env_spec.flat_action_dim])
+        new_states = self.ensemble._predict_all_members(states=states, actions=actions,
+                                                        sess=kwargs['sess'] if 'sess' in kwargs else None,
+                                                        member_index=self.member_index)
+        return np.reshape(new_states, [-1] + list(self.env_spec.obs_shape))
@@ -13,6 +13,26 @@ class RewardFunc(Basic):
     def __call__(self, state, action, new_state, **kwargs) -> float:
         raise NotImplementedError
 
+    def batch_call(self, state, action, new_state, **kwargs) -> np.ndarray:
+        """
+        Compute the rewards of a batch of transitions, by default __call__ is called on every transition, reward
+        functions that can be computed in vectorized form should override it.
+
+        :return: rewards with shape [batch_size]
+        """
+        return np.array([self.__call__(state=s, action=a, new_state=new_s, **kwargs)
+                         for s, a, new_s in zip(state, action, new_state)], dtype=np.float64)
+
+    def derivative_batch(self, state, action, **kwargs):
+        """
+        Analytic gradient and hessian of the reward with respect to the flat [state, action] for a batch, the reward
+        should not depend on the new state. Reward functions without analytic derivatives raise NotImplementedError,
+        the caller (e.g., iLQR) should fall back to finite difference.
+
+        :return: gradient with shape [batch_size, dim] and hessian with shape [batch_size, dim, dim]
+        """
+        raise NotImplementedError
+
     def init(self):
         pass
 
@@ -28,6 +48,9 @@ class RandomRewardFunc(RewardFunc):
     def __call__(self, state=None, action=None, new_state=None, **kwargs) -> float:
         return np.random.random()
 
+    def batch_call(self, state, action=None, new_state=None, **kwargs) -> np.ndarray:
+        return np.random.random(len(state))
+
 
 class CostFunc(RewardFunc):
     pass
@@ -44,6 +67,15 @@ class RewardFuncCostWrapper(CostFunc):
                                           action=action,
                                           new_state=new_state) * -1.0
 
+    def batch_call(self, state, action, new_state, **kwargs) -> np.ndarray:
+        return self._reward_func.batch_call(state=state,
+                                            action=action,
+                                            new_state=new_state) * -1.0
+
+    def derivative_batch(self, state, action, **kwargs):
+        grad, hessian = self._reward_func.derivative_batch(state=state, action=action)
+        return -grad, -hessian
+
     def init(self):
         self._reward_func.init()
 
@@ -73,3 +105,17 @@ class QuadraticCostFunc(CostFunc):
             self.state_action_flat_dim, 1)
         res = 0.5 * np.dot(np.dot(u_s.T, self.C), u_s) + np.dot(u_s.T, self.c).reshape(())
         return float(res)
+
+    def batch_call(self, state, action, new_state=None, **kwargs) -> np.ndarray:
+        batch_size = len(state)
+        u_s = np.concatenate((np.reshape(state, [batch_size, -1]), np.reshape(action, [batch_size, -1])), axis=1)
+        res = 0.5 * np.einsum('ni,ij,nj->n', u_s, self.C, u_s) + \
+              np.reshape(np.dot(u_s, np.reshape(self.c, [self.state_action_flat_dim, -1])), [batch_size])
+        return res
+
+    def derivative_batch(self, state, action, **kwargs):
+        batch_size = len(state)
+        u_s = np.concatenate((np.reshape(state, [batch_size, -1]), np.reshape(action, [batch_size, -1])), axis=1)
+        hessian = 0.5 * (self.C + self.C.T)
+        grad = np.dot(u_s, hessian) + np.reshape(self.c, [1, self.state_action_flat_dim])
+        return grad, np.tile(hessian, (batch_size, 1, 1))
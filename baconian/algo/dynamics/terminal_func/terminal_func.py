@@ -13,6 +13,16 @@ class TerminalFunc(Basic):
     def __call__(self, state, action, new_state, **kwargs) -> bool:
         raise NotImplementedError
 
+    def batch_call(self, state, action, new_state, **kwargs) -> np.ndarray:
+        """
+        Compute the terminal signals of a batch of transitions, by default __call__ is called on every transition,
+        terminal functions that can be computed in vectorized form should override it.
+
+        :return: terminal signals with shape [batch_size]
+        """
+        return np.array([self.__call__(state=s, action=a, new_state=new_s, **kwargs)
+                         for s, a, new_s in zip(state, action, new_state)], dtype=bool)
+
     def init(self):
         pass
 
@@ -28,6 +38,9 @@ class RandomTerminalFunc(TerminalFunc):
     def __call__(self, state=None, action=None, new_state=None, **kwargs) -> bool:
         return np.random.random() > 0.5
 
+    def batch_call(self, state, action=None, new_state=None, **kwargs) -> np.ndarray:
+        return np.random.random(len(state)) > 0.5
+
 
 class FixedEpisodeLengthTerminalFunc(Basic):
 
@@ -42,3 +55,7 @@ class FixedEpisodeLengthTerminalFunc(Basic):
             return True
         else:
             return False
+
+    def batch_call(self, state, action=None, new_state=None, **kwargs) -> np.ndarray:
+        # the step count is shared by all the transitions of the batch
+        return np.full(len(state), self.__call__(), dtype=bool)
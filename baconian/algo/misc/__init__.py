@@ -1,4 +1,5 @@
-from .replay_buffer import BaseReplayBuffer, UniformRandomReplayBuffer
+from .replay_buffer import BaseReplayBuffer, UniformRandomReplayBuffer, MemmapReplayBuffer
 from .epsilon_greedy import ExplorationStrategy, EpsilonGreedy
 from .placeholder_input import PlaceholderInput, MultiPlaceholderInput
 from .sample_processor import SampleProcessor
+from .finite_difference import BatchFiniteDifference
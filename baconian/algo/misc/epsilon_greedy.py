@@ -27,8 +27,18 @@ class EpsilonGreedy(ExplorationStrategy):
                                      name='eps_greedy_params')
 
     def predict(self, **kwargs):
+        if kwargs.get('batch_flag', False) is True:
+            return self._predict_batch(**kwargs)
         if np.random.random() < self.parameters('random_prob_func')():
             return self.action_space.sample()
         else:
             algo = kwargs.pop('algo')
             return algo.predict(**kwargs)
+
+    def _predict_batch(self, **kwargs):
+        algo = kwargs.pop('algo')
+        actions = algo.predict(**kwargs)
+        random_mask = np.random.random(len(actions)) < self.parameters('random_prob_func')()
+        for i in np.nonzero(random_mask)[0]:
+            actions[i] = self.action_space.sample()
+        return actions
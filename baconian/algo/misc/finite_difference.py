@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from typeguard import typechecked
+
+
+def _evaluate_perturbed_points(dyn_model, cost_fn, states, actions, base_new_states=None):
+    """
+    Evaluate the dynamics model and the cost function on a batch of (state, action) points with one batched call
+    each. The rows whose new state is already known (i.e., not nan in base_new_states) are not passed to the dynamics
+    model. Module level function so it can be sent to a process pool.
+    """
+    new_states = np.zeros_like(states) if base_new_states is None else np.array(base_new_states)
+    need = np.ones(len(states), dtype=bool) if base_new_states is None else np.isnan(new_states).any(axis=1)
+    if need.any():
+        new_states[need] = np.reshape(dyn_model.step_batch(states=states[need], actions=actions[need],
+                                                           allow_clip=True),
+                                      [int(np.sum(need)), -1])
+    costs = cost_fn.batch_call(state=states, action=actions, new_state=new_states)
+    return new_states, np.reshape(costs, [-1])
+
+
+class BatchFiniteDifference(object):
+    """
+    Finite difference approximation of the jacobian of a dynamics model and of the gradient and hessian of a cost
+    function along a whole trajectory. All the perturbed (state, action) points of all the time steps are stacked into
+    one batch and evaluated by DynamicsModel.step_batch and RewardFunc.batch_call, instead of one step call per point.
+
+    With the 'forward' scheme every time step needs 1 + D + D(D + 1) / 2 points and with the 'central' scheme
+    1 + 2D + 2D(D - 1) points, where D is the flat dim of [state, action]. When worker_num > 0, the time steps are
+    split into worker_num blocks that are evaluated in a thread or a process pool. The models are called directly in
+    the workers, so a thread pool should only be used with models that do not rely on thread local state (e.g., the
+    default tf session) and a process pool requires picklable models.
+    """
+    SCHEME_LIST = ('forward', 'central')
+    POOL_TYPE_LIST = ('thread', 'process')
+
+    @typechecked
+    def __init__(self, delta: float, scheme: str = 'forward', worker_num: int = 0, pool_type: str = 'thread'):
+        """
+
+        :param delta: perturbation size
+        :type delta: float
+        :param scheme: 'forward' or 'central' difference
+        :type scheme: str
+        :param worker_num: number of pool workers, 0 to evaluate the whole batch in the calling thread
+        :type worker_num: int
+        :param pool_type: 'thread' or 'process'
+        :type pool_type: str
+        """
+        if scheme not in self.SCHEME_LIST:
+            raise ValueError('scheme {} not in {}'.format(scheme, self.SCHEME_LIST))
+        if pool_type not in self.POOL_TYPE_LIST:
+            raise ValueError('pool_type {} not in {}'.format(pool_type, self.POOL_TYPE_LIST))
+        if worker_num < 0:
+            raise ValueError('worker_num should be non-negative, got {}'.format(worker_num))
+        self.delta = delta
+        self.scheme = scheme
+        self.worker_num = worker_num
+        self.pool_type = pool_type
+        self._pool = None
+        self._stencil_cache = dict()
+
+    def differentiate(self, dyn_model, cost_fn, x_seq, u_seq, new_x_seq=None):
+        """
+        Approximate the derivatives at every (x_seq[t], u_seq[t]).
+
+        :param dyn_model: DynamicsModel with step_batch
+        :param cost_fn: CostFunc with batch_call, called with the new state predicted by dyn_model
+        :param x_seq: states with shape [T, flat_obs_dim]
+        :param u_seq: actions with shape [T, flat_action_dim]
+        :param new_x_seq: optional known new states of the unperturbed points (e.g., from the base rollout) with
+                            shape [T', flat_obs_dim], T' <= T, these points are not evaluated again by the dynamics model
+        :return: cost hessian [T, D, D], dynamics jacobian [T, flat_obs_dim, D], cost gradient [T, D] and dynamics
+                    bias [T, flat_obs_dim]
+        """
+        x_seq = np.reshape(np.array(x_seq, dtype=np.float64), [len(x_seq), -1])
+        u_seq = np.reshape(np.array(u_seq, dtype=np.float64), [len(u_seq), -1])
+        T, n = x_seq.shape
+        xu = np.concatenate((x_seq, u_seq), axis=1)
+        dim = xu.shape[1]
+        offsets, grad_weight, hessian_weight = self._stencil(dim)
+        k = len(offsets)
+
+        # [T, k, D], all the perturbed points of all the time steps
+        points = xu[:, np.newaxis, :] + self.delta * offsets[np.newaxis, :, :]
+        base_new_states = None
+        if new_x_seq is not None:
+            new_x_seq = np.reshape(np.array(new_x_seq, dtype=np.float64), [len(new_x_seq), n])
+            base_new_states = np.full((T, k, n), np.nan)
+            # the first point of the stencil is the unperturbed one
+            base_new_states[:len(new_x_seq), 0] = new_x_seq[:T]
+
+        new_states, costs = self._evaluate(dyn_model=dyn_model, cost_fn=cost_fn, points=points, n=n,
+                                           base_new_states=base_new_states)
+        new_states = np.reshape(new_states, [T, k, n])
+        costs = np.reshape(costs, [T, k])
+
+        F = np.einsum('dk,tkn->tnd', grad_weight, new_states)
+        c = np.einsum('dk,tk->td', grad_weight, costs)
+        C = np.einsum('ijk,tk->tij', hessian_weight, costs)
+        f = np.zeros((T, n))
+        return C, F, c, f
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _evaluate(self, dyn_model, cost_fn, points, n, base_new_states=None):
+        T, k, dim = points.shape
+        if self.worker_num == 0 or T == 1:
+            return _evaluate_perturbed_points(dyn_model, cost_fn,
+                                              states=np.reshape(points[..., :n], [T * k, n]),
+                                              actions=np.reshape(points[..., n:], [T * k, dim - n]),
+                                              base_new_states=None if base_new_states is None else np.reshape(
+                                                  base_new_states, [T * k, n]))
+        if self._pool is None:
+            pool_class = ThreadPoolExecutor if self.pool_type == 'thread' else ProcessPoolExecutor
+            self._pool = pool_class(max_workers=self.worker_num)
+        future_list = []
+        for block in np.array_split(np.arange(T), min(self.worker_num, T)):
+            block_size = len(block) * k
+            future_list.append(self._pool.submit(_evaluate_perturbed_points, dyn_model, cost_fn,
+                                                 np.reshape(points[block, :, :n], [block_size, n]),
+                                                 np.reshape(points[block, :, n:], [block_size, dim - n]),
+                                                 None if base_new_states is None else np.reshape(
+                                                     base_new_states[block], [block_size, n])))
+        res = [future.result() for future in future_list]
+        return np.concatenate([r[0] for r in res], axis=0), np.concatenate([r[1] for r in res], axis=0)
+
+    def _stencil(self, dim):
+        """
+        Return the offsets of the perturbed points in unit of delta with shape [k, dim], and the linear weights that
+        map the k function values to the gradient [dim, k] and to the hessian [dim, dim, k].
+        """
+        if dim in self._stencil_cache:
+            return self._stencil_cache[dim]
+        eye = np.eye(dim)
+        h = self.delta
+        if self.scheme == 'forward':
+            # 0, e_i, e_i + e_j (i <= j)
+            pair_list = [(i, j) for i in range(dim) for j in range(i, dim)]
+            offsets = np.concatenate((np.zeros((1, dim)), eye,
+                                      np.array([eye[i] + eye[j] for i, j in pair_list]).reshape([-1, dim])), axis=0)
+            grad_weight = np.zeros((dim, len(offsets)))
+            grad_weight[np.arange(dim), 1 + np.arange(dim)] = 1.0 / h
+            grad_weight[:, 0] = -1.0 / h
+            hessian_weight = np.zeros((dim, dim, len(offsets)))
+            for p, (i, j) in enumerate(pair_list):
+                w = np.zeros(len(offsets))
+                w[1 + dim + p] += 1.0
+                w[1 + i] -= 1.0
+                w[1 + j] -= 1.0
+                w[0] += 1.0
+                hessian_weight[i, j] = hessian_weight[j, i] = w / h ** 2
+        else:
+            # 0, +e_i, -e_i, +-e_i +-e_j (i < j)
+            pair_list = [(i, j) for i in range(dim) for j in range(i + 1, dim)]
+            sign_list = [(1.0, 1.0), (1.0, -1.0), (-1.0, 1.0), (-1.0, -1.0)]
+            offsets = np.concatenate((np.zeros((1, dim)), eye, -eye,
+                                      np.array([si * eye[i] + sj * eye[j] for i, j in pair_list
+                                                for si, sj in sign_list]).reshape([-1, dim])), axis=0)
+            grad_weight = np.zeros((dim, len(offsets)))
+            grad_weight[np.arange(dim), 1 + np.arange(dim)] = 0.5 / h
+            grad_weight[np.arange(dim), 1 + dim + np.arange(dim)] = -0.5 / h
+            hessian_weight = np.zeros((dim, dim, len(offsets)))
+            for i in range(dim):
+                hessian_weight[i, i, 1 + i] = 1.0 / h ** 2
+                hessian_weight[i, i, 1 + dim + i] = 1.0 / h ** 2
+                hessian_weight[i, i, 0] = -2.0 / h ** 2
+            for p, (i, j) in enumerate(pair_list):
+                w = np.zeros(len(offsets))
+                w[1 + 2 * dim + 4 * p: 1 + 2 * dim + 4 * p + 4] = np.array([1.0, -1.0, -1.0, 1.0]) / (4.0 * h ** 2)
+                hessian_weight[i, j] = hessian_weight[j, i] = w
+        self._stencil_cache[dim] = (offsets, grad_weight, hessian_weight)
+        return self._stencil_cache[dim]
@@ -4,6 +4,7 @@ import os
 
 from baconian.common.logging import ConsoleLogger
 from baconian.tf.tf_parameters import ParametersWithTensorflowVariable
+from baconian.tf.util import CompiledRunner
 from baconian.core.core import Basic
 from baconian.config.global_config import GlobalConfig
 
@@ -15,6 +16,7 @@ class PlaceholderInput(object):
         self.parameters = parameters
         if name_scope:
             self.name_scope = name_scope
+        self._compiled_runner = CompiledRunner()
 
     def save(self, global_step, save_path=None, name=None, **kwargs):
         save_path = save_path if save_path else GlobalConfig().DEFAULT_MODEL_CHECKPOINT_PATH
@@ -42,6 +44,24 @@ class PlaceholderInput(object):
         self.parameters.copy_from(source_parameter=obj.parameters)
         return True
 
+    def _compiled_run(self, fetches, input_ph_list: list, input_value_list: list, feed_dict: dict = None,
+                      extra_parameters: list = None, sess=None):
+        """
+        Evaluate fetches by a cached callable of Session.make_callable, used by the compiled inference mode of
+        forward. Besides the inputs and the feed_dict, the registered placeholders of self.parameters and
+        extra_parameters (e.g., the parameters of the algorithm that calls forward) are fed.
+        """
+        if feed_dict:
+            extra_ph_list = [ph for ph in feed_dict.keys() if ph not in input_ph_list]
+            input_value_list = list(input_value_list) + [feed_dict[ph] for ph in extra_ph_list]
+            input_ph_list = list(input_ph_list) + extra_ph_list
+        return self._compiled_runner.run(fetches,
+                                         input_ph_list=input_ph_list,
+                                         input_value_list=input_value_list,
+                                         parameters_list=[self.parameters] + (extra_parameters if extra_parameters
+                                                                             else []),
+                                         sess=sess)
+
 
 class MultiPlaceholderInput(object):
     @tg.typechecked
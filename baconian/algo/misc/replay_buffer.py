@@ -1,7 +1,13 @@
+import json
+import os
+
 import numpy as np
 from typeguard import typechecked
+from baconian.config.global_config import GlobalConfig
 from baconian.common.sampler.sample_data import TransitionData, TrajectoryData, SampleData
 from baconian.common.error import *
+from baconian.algo.misc.segment_tree import SumSegmentTree, MinSegmentTree
+from baconian.common.profiler import profile_decorator
 
 
 class RingBuffer(object):
@@ -36,12 +42,65 @@ class RingBuffer(object):
         self.data[(self.start + self.length - 1) % self.maxlen] = v
 
     def append_batch(self, v):
-        v = np.array(v)
-        if len(v.shape) == 1 or len(v.shape) == 0:
-            v = np.reshape(v, [-1, 1])
-        assert len(v.shape) == 2
-        for i in range(len(v)):
-            self.append(v[i])
+        v = np.reshape(np.asarray(v), (-1,) + self.data.shape[1:])
+        n = len(v)
+        if n >= self.maxlen:
+            # only the last maxlen items will survive
+            self.data[:] = v[n - self.maxlen:]
+            self.start = 0
+            self.length = self.maxlen
+            return
+        end = (self.start + self.length) % self.maxlen
+        first_part = min(n, self.maxlen - end)
+        # write with at most two slice assignments, split where the ring wraps around
+        self.data[end:end + first_part] = v[:first_part]
+        self.data[:n - first_part] = v[first_part:]
+        overflow = self.length + n - self.maxlen
+        if overflow > 0:
+            self.start = (self.start + overflow) % self.maxlen
+            self.length = self.maxlen
+        else:
+            self.length += n
+
+
+class MemmapRingBuffer(RingBuffer):
+    """
+    RingBuffer stored in a np.memmap file, so the size of the buffer is bounded by the disk instead of the memory.
+    """
+
+    @typechecked
+    def __init__(self, file_path: str, maxlen: int, shape: (list, tuple), dtype='float32', mode='w+', start: int = 0,
+                 length: int = 0):
+        """
+
+        :param file_path: path of the file that holds the data
+        :type file_path: str
+        :param maxlen: capacity of the buffer
+        :type maxlen: int
+        :param shape: shape of one item
+        :param dtype: dtype of the data
+        :param mode: 'w+' to create (or overwrite) the file, 'r+' to reopen an existing one
+        :param start: start index of a reopened buffer
+        :type start: int
+        :param length: length of a reopened buffer
+        :type length: int
+        """
+        self.maxlen = maxlen
+        self.start = start
+        self.length = length
+        self.file_path = file_path
+        self.data = np.memmap(file_path, dtype=dtype, mode=mode, shape=(maxlen,) + tuple(shape))
+
+    def get_batch(self, idxs):
+        # read the slots in ascending order so the pages of the file are visited sequentially
+        slots = (self.start + np.asarray(idxs)) % self.maxlen
+        order = np.argsort(slots, kind='stable')
+        res = np.empty((len(slots),) + self.data.shape[1:], dtype=self.data.dtype)
+        res[order] = self.data[slots[order]]
+        return res
+
+    def flush(self):
+        self.data.flush()
 
 
 def array_min2d(x):
@@ -57,16 +116,24 @@ class BaseReplayBuffer(object):
         self.limit = limit
         self.action_shape = action_shape
         self.obs_shape = observation_shape
-
-        self.observations0 = RingBuffer(limit, shape=observation_shape)
-        self.actions = RingBuffer(limit, shape=action_shape)
-        self.rewards = RingBuffer(limit, shape=(1,))
-        self.terminals1 = RingBuffer(limit, shape=(1,))
-        self.observations1 = RingBuffer(limit, shape=observation_shape)
+        self._set_up_ring_buffers()
 
     def sample(self, batch_size):
         raise NotImplementedError
 
+    def _get_transition_batch(self, batch_idxs) -> TransitionData:
+        """
+        Gather the transitions at batch_idxs with one fancy indexing per field and pack them into a TransitionData
+        without appending row by row.
+        """
+        res = TransitionData(obs_shape=self.obs_shape, action_shape=self.action_shape)
+        res.append_batch(state=self.observations0.get_batch(batch_idxs),
+                         new_state=self.observations1.get_batch(batch_idxs),
+                         action=self.actions.get_batch(batch_idxs),
+                         reward=np.reshape(self.rewards.get_batch(batch_idxs), [-1]),
+                         done=np.reshape(self.terminals1.get_batch(batch_idxs), [-1]))
+        return res
+
     def append(self, obs0, obs1, action, reward, terminal1, training=True):
         if not training:
             return
@@ -90,47 +157,150 @@ class BaseReplayBuffer(object):
         return len(self.observations0)
 
     def reset(self):
-        self.observations0 = RingBuffer(self.limit, shape=self.obs_shape)
-        self.actions = RingBuffer(self.limit, shape=self.action_shape)
-        self.rewards = RingBuffer(self.limit, shape=(1,))
-        self.terminals1 = RingBuffer(self.limit, shape=(1,))
-        self.observations1 = RingBuffer(self.limit, shape=self.obs_shape)
+        self._set_up_ring_buffers()
+
+    def _set_up_ring_buffers(self):
+        self.observations0 = self._create_ring_buffer('observations0', shape=self.obs_shape)
+        self.actions = self._create_ring_buffer('actions', shape=self.action_shape)
+        self.rewards = self._create_ring_buffer('rewards', shape=(1,))
+        self.terminals1 = self._create_ring_buffer('terminals1', shape=(1,), dtype='bool')
+        self.observations1 = self._create_ring_buffer('observations1', shape=self.obs_shape)
+
+    def _create_ring_buffer(self, name, shape, dtype='float32') -> RingBuffer:
+        return RingBuffer(self.limit, shape=tuple(shape), dtype=dtype)
 
 
 class UniformRandomReplayBuffer(BaseReplayBuffer):
     def __init__(self, limit, action_shape, observation_shape):
         super().__init__(limit, action_shape, observation_shape)
 
+    @profile_decorator('replay_buffer_sample')
     def sample(self, batch_size) -> SampleData:
         if self.nb_entries < batch_size:
             raise MemoryBufferLessThanBatchSizeError()
 
         batch_idxs = np.random.randint(self.nb_entries - 2, size=batch_size)
-        pass
-
-        obs0_batch = self.observations0.get_batch(batch_idxs)
-        obs1_batch = self.observations1.get_batch(batch_idxs)
-        action_batch = self.actions.get_batch(batch_idxs)
-        reward_batch = self.rewards.get_batch(batch_idxs)
-        terminal1_batch = self.terminals1.get_batch(batch_idxs)
-
-        result = {
-            'obs0': array_min2d(obs0_batch),
-            'obs1': array_min2d(obs1_batch),
-            'rewards': array_min2d(reward_batch),
-            'actions': array_min2d(action_batch),
-            'terminals1': array_min2d(terminal1_batch),
-        }
+        return self._get_transition_batch(batch_idxs)
 
-        res = TransitionData(obs_shape=self.obs_shape, action_shape=self.action_shape)
-        for obs0, obs1, action, terminal, re in zip(result['obs0'], result['obs1'], result['actions'],
-                                                    result['terminals1'], result['rewards']):
-            res.append(state=obs0, new_state=obs1, action=action, done=terminal, reward=re)
-        return res
-        pass
+
+class MemmapReplayBuffer(UniformRandomReplayBuffer):
+    """
+    Uniform replay buffer whose fields are stored in np.memmap files (one per field) under path, which defaults to
+    the replay_buffer directory in the log path of the experiment. Only the pages touched by append and sample are
+    loaded into memory, so the capacity is bounded by the disk.
+
+    The start and length of the ring buffers are kept in a small json file next to the data, so a buffer created with
+    the same path, limit and shapes is reopened with its content when resume is True, e.g., to resume a training. The
+    json file is only written together with a flush of the memmap files, by flush, close and every flush_every
+    appended transitions, so it never refers to data that is not on the disk. After a crash, the buffer is reopened
+    as it was at the last flush.
+    """
+    META_FILE_NAME = 'replay_buffer_meta.json'
+    RING_BUFFER_NAMES = ('observations0', 'actions', 'rewards', 'terminals1', 'observations1')
+
+    @typechecked
+    def __init__(self, limit: int, action_shape: (list, tuple), observation_shape: (list, tuple), path: str = None,
+                 resume: bool = True, flush_every: int = 10000):
+        """
+
+        :param limit: capacity of the buffer
+        :type limit: int
+        :param action_shape: shape of the action
+        :param observation_shape: shape of the observation
+        :param path: directory of the memmap files
+        :type path: str
+        :param resume: reopen the existing buffer under path if there is one, otherwise the files are overwritten
+        :type resume: bool
+        :param flush_every: flush every flush_every appended transitions, 0 to only flush by flush and close
+        :type flush_every: int
+        """
+        self.path = path if path else os.path.join(GlobalConfig().DEFAULT_LOG_PATH, 'replay_buffer')
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        self._resume_meta = self._load_meta(limit, action_shape, observation_shape) if resume else None
+        super().__init__(limit, action_shape, observation_shape)
+        self._resume_meta = None
+        self.flush_every = flush_every
+        self._appended_count_since_flush = 0
+        self._dump_meta()
+
+    def append(self, obs0, obs1, action, reward, terminal1, training=True):
+        super().append(obs0, obs1, action, reward, terminal1, training)
+        if training:
+            self._count_appended(1)
+
+    def append_batch(self, obs0, obs1, action, reward, terminal1, training=True):
+        super().append_batch(obs0, obs1, action, reward, terminal1, training)
+        if training:
+            self._count_appended(len(np.reshape(reward, [-1])))
+
+    def reset(self):
+        super().reset()
+        self._dump_meta()
+
+    def flush(self):
+        """
+        Write the dirty pages of all memmap files to the disk, then the start and length of the ring buffers.
+        """
+        for name in self.RING_BUFFER_NAMES:
+            getattr(self, name).flush()
+        self._dump_meta()
+        self._appended_count_since_flush = 0
+
+    def close(self):
+        self.flush()
+
+    def _count_appended(self, count: int):
+        self._appended_count_since_flush += count
+        if 0 < self.flush_every <= self._appended_count_since_flush:
+            self.flush()
+
+    def _create_ring_buffer(self, name, shape, dtype='float32') -> RingBuffer:
+        file_path = os.path.join(self.path, '{}.dat'.format(name))
+        if self._resume_meta:
+            return MemmapRingBuffer(file_path, self.limit, shape=tuple(shape), dtype=dtype, mode='r+',
+                                    start=self._resume_meta['ring_buffers'][name]['start'],
+                                    length=self._resume_meta['ring_buffers'][name]['length'])
+        return MemmapRingBuffer(file_path, self.limit, shape=tuple(shape), dtype=dtype, mode='w+')
+
+    def _load_meta(self, limit, action_shape, observation_shape):
+        meta_path = os.path.join(self.path, self.META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta['limit'] != limit or meta['action_shape'] != [int(i) for i in action_shape] or \
+                meta['observation_shape'] != [int(i) for i in observation_shape]:
+            raise ValueError('replay buffer under {} has limit {}, action shape {} and observation shape {}, which '
+                             'do not match the given ones'.format(self.path, meta['limit'], meta['action_shape'],
+                                                                  meta['observation_shape']))
+        return meta
+
+    def _dump_meta(self):
+        meta = dict(limit=self.limit,
+                    action_shape=[int(i) for i in self.action_shape],
+                    observation_shape=[int(i) for i in self.obs_shape],
+                    ring_buffers={name: dict(start=int(getattr(self, name).start),
+                                             length=int(getattr(self, name).length))
+                                  for name in self.RING_BUFFER_NAMES})
+        meta_path = os.path.join(self.path, self.META_FILE_NAME)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        # replace the old file atomically so a crash never leaves a half written meta file
+        os.replace(meta_path + '.tmp', meta_path)
 
 
 class PrioritisedReplayBuffer(BaseReplayBuffer):
+    """
+    Proportional prioritized experience replay (Schaul et al., 2015). Priorities are kept in a sum segment tree and a
+    min segment tree indexed by the slot of the transition in the ring buffers, so sampling a batch and updating
+    priorities cost O(batch_size * log(limit)).
+
+    The sampled TransitionData carries two extra sets: 'importance_weight_set' with the normalized importance
+    sampling weights and 'buffer_index_set' with the slots to pass into update_priorities.
+    """
+    MIN_PRIORITY = 1e-6
+
     def __init__(self, limit, action_shape, observation_shape, alpha, beta, beta_increment):
         super().__init__(limit, action_shape, observation_shape)
 
@@ -143,40 +313,64 @@ class PrioritisedReplayBuffer(BaseReplayBuffer):
         self.beta = beta
         self.beta_increment = beta_increment
         self.max_priority = 1.0
+        self._it_capacity = it_capacity
+        self.it_sum = SumSegmentTree(it_capacity)
+        self.it_min = MinSegmentTree(it_capacity)
+
+    def append(self, obs0, obs1, action, reward, terminal1, training=True):
+        if not training:
+            return
+        idx = self._next_slots(1)
+        super().append(obs0, obs1, action, reward, terminal1, training)
+        self._set_priorities(idx, self.max_priority ** self.alpha)
+
+    def append_batch(self, obs0, obs1, action, reward, terminal1, training=True):
+        if not training:
+            return
+        idx = self._next_slots(len(np.reshape(reward, [-1])))
+        super().append_batch(obs0, obs1, action, reward, terminal1, training)
+        self._set_priorities(idx, self.max_priority ** self.alpha)
 
     def update_priorities(self, idxes, priorities):
+        idxes = np.reshape(np.asarray(idxes, dtype=np.int64), [-1])
+        priorities = np.reshape(np.asarray(priorities, dtype=np.float64), [-1])
         assert len(idxes) == len(priorities)
-        for idx, priority in zip(idxes, priorities):
-            assert priority > 0
-            assert 0 <= idx < len(self.observations0)
-            self.it_sum[idx] = priority ** self.alpha
-            self.it_min[idx] = priority ** self.alpha
-
-            self.max_priority = max(self.max_priority, priority)
+        assert np.all(priorities > 0)
+        assert np.all(idxes >= 0) and np.all(idxes < self.nb_entries)
+        self._set_priorities(idxes, priorities ** self.alpha)
+        self.max_priority = max(self.max_priority, float(np.max(priorities)))
 
+    @profile_decorator('replay_buffer_sample')
     def sample(self, batch_size) -> SampleData:
         if self.nb_entries < batch_size:
             raise MemoryBufferLessThanBatchSizeError()
+        total = self.it_sum.sum()
+        # stratified sampling, one uniform draw in each of batch_size equal segments of the total priority mass
+        mass = (np.arange(batch_size) + np.random.random(batch_size)) * (total / batch_size)
+        slots = np.minimum(self.it_sum.find_prefixsum_idx(mass), self.nb_entries - 1)
+
+        p_min = self.it_min.min() / total
+        max_weight = (p_min * self.nb_entries) ** (-self.beta)
+        p_sample = self.it_sum[slots] / total
+        weights = (p_sample * self.nb_entries) ** (-self.beta) / max_weight
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        # the ring buffers are indexed from their start, the trees by the slot
+        res = self._get_transition_batch((slots - self.observations0.start) % self.limit)
+        res.append_new_set(name='importance_weight_set', data_set=weights, shape=[])
+        res.append_new_set(name='buffer_index_set', data_set=slots, shape=[])
+        return res
 
-        # todo This will be changed to prioritised
-        batch_idxs = np.random.randint(self.nb_entries - 2, size=batch_size)
-
-        obs0_batch = self.observations0.get_batch(batch_idxs)
-        obs1_batch = self.observations1.get_batch(batch_idxs)
-        action_batch = self.actions.get_batch(batch_idxs)
-        reward_batch = self.rewards.get_batch(batch_idxs)
-        terminal1_batch = self.terminals1.get_batch(batch_idxs)
+    def reset(self):
+        super().reset()
+        self.max_priority = 1.0
+        self.it_sum = SumSegmentTree(self._it_capacity)
+        self.it_min = MinSegmentTree(self._it_capacity)
 
-        result = {
-            'obs0': array_min2d(obs0_batch),
-            'obs1': array_min2d(obs1_batch),
-            'rewards': array_min2d(reward_batch),
-            'actions': array_min2d(action_batch),
-            'terminals1': array_min2d(terminal1_batch),
-        }
+    def _next_slots(self, n):
+        n = min(n, self.limit)
+        return (self.observations0.start + self.observations0.length + np.arange(n)) % self.limit
 
-        res = TransitionData(obs_shape=self.obs_shape, action_shape=self.action_shape)
-        for obs0, obs1, action, terminal, re in zip(result['obs0'], result['obs1'], result['actions'],
-                                                    result['terminals1'], result['rewards']):
-            res.append(state=obs0, new_state=obs1, action=action, done=terminal, reward=re)
-        return res
+    def _set_priorities(self, idxes, val):
+        self.it_sum[idxes] = val
+        self.it_min[idxes] = val
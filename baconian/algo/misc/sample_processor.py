@@ -1,4 +1,4 @@
-from baconian.common.sampler.sample_data import TransitionData, TrajectoryData
+from baconian.common.sampler.sample_data import TransitionData, TrajectoryData, PackedTrajectoryData
 from baconian.algo.value_func import ValueFunction
 import scipy.signal
 from baconian.common.special import *
@@ -10,43 +10,69 @@ def discount(x, gamma):
     return scipy.signal.lfilter([1.0], [1.0, -gamma], x[::-1])[::-1]
 
 
+def segmented_discount(x, gamma, episode_offsets):
+    """
+    Discounted forward sum of every segment [episode_offsets[i], episode_offsets[i + 1]) of x, computed for all the
+    segments at once: the discounted sum over the whole array is scanned once in reverse, then the part that comes from
+    the following segments, gamma ** (end - t) * sum[end], is subtracted.
+
+    :param x: 1-d array
+    :param gamma: discount factor
+    :param episode_offsets: segment boundaries, starts with 0 and ends with len(x)
+    :return: 1-d array with the same length as x
+    """
+    x = np.reshape(np.asarray(x, dtype=np.float64), [-1])
+    if len(x) == 0:
+        return x
+    total = np.append(discount(x, gamma), 0.0)
+    lengths = np.diff(episode_offsets)
+    end = np.repeat(episode_offsets[1:], lengths)
+    return total[:-1] - np.power(gamma, end - np.arange(len(x))) * total[end]
+
+
 class SampleProcessor(object):
+    """
+    The processors accept a TrajectoryData, whose trajectories are packed and processed as a whole and the results
+    are added to every trajectory, or a PackedTrajectoryData, where the results are added as new data sets directly.
+    """
 
     @staticmethod
-    def add_gae(data: TrajectoryData, gamma, lam, value_func: ValueFunction = None, name='advantage_set'):
-        for traj in data.trajectories:
-            # scale if gamma less than 1
-            rewards = traj('reward_set') * (1 - gamma) if gamma < 0.999 else traj('reward_set')
-            try:
-                traj('v_value_set')
-            except ValueError:
-                if value_func is None:
-                    raise ValueError('v_value_set did not existed, pass in value_func parameter to compute v_value_set')
-                SampleProcessor.add_estimated_v_value(
-                    data=traj,
-                    value_func=value_func
-                )
-            finally:
-                values = traj('v_value_set')
-            # todo better way to handle shape error (no squeeze)
-            tds = np.squeeze(rewards) - np.squeeze(values) + np.append(values[1:] * gamma, 0)
-            advantages = discount(tds, gamma * lam)
-            traj.append_new_set(name=name, data_set=make_batch(advantages, original_shape=[]), shape=[])
+    def add_gae(data: (TrajectoryData, PackedTrajectoryData), gamma, lam, value_func: ValueFunction = None,
+                name='advantage_set'):
+        packed = SampleProcessor._as_packed_data(data)
+        try:
+            packed('v_value_set')
+        except ValueError:
+            if value_func is None:
+                raise ValueError('v_value_set did not existed, pass in value_func parameter to compute v_value_set')
+            SampleProcessor._add_estimated_v_value(packed, value_func, name='v_value_set')
+            if packed is not data:
+                SampleProcessor._add_new_set(data, packed, name='v_value_set', data_set=packed('v_value_set'))
+        # scale if gamma less than 1
+        rewards = np.reshape(packed('reward_set'), [-1]) * (1 - gamma) if gamma < 0.999 else np.reshape(
+            packed('reward_set'), [-1])
+        values = np.reshape(packed('v_value_set'), [-1])
+        next_values = np.append(values[1:] * gamma, 0.0)
+        # the value after the last step of every trajectory is 0
+        next_values[packed.episode_offsets[1:] - 1] = 0.0
+        advantages = segmented_discount(rewards - values + next_values, gamma * lam, packed.episode_offsets)
+        SampleProcessor._add_new_set(data, packed, name=name, data_set=advantages)
 
     @staticmethod
-    def add_discount_sum_reward(data: TrajectoryData, gamma, name='discount_set'):
-        for traj in data.trajectories:
-            # scale if gamma less than 1
-            dis_set = traj('reward_set') * (1 - gamma) if gamma < 0.999 else traj('reward_set')
-            # TODO add a unit test
-            dis_reward_set = discount(np.reshape(dis_set, [-1, ]), gamma)
-            traj.append_new_set(name=name, data_set=make_batch(dis_reward_set, original_shape=[]), shape=[])
+    def add_discount_sum_reward(data: (TrajectoryData, PackedTrajectoryData), gamma, name='discount_set'):
+        packed = SampleProcessor._as_packed_data(data)
+        # scale if gamma less than 1
+        dis_set = packed('reward_set') * (1 - gamma) if gamma < 0.999 else packed('reward_set')
+        dis_reward_set = segmented_discount(np.reshape(dis_set, [-1, ]), gamma, packed.episode_offsets)
+        SampleProcessor._add_new_set(data, packed, name=name, data_set=dis_reward_set)
 
     @staticmethod
     def add_estimated_v_value(data: (TrajectoryData, TransitionData), value_func: ValueFunction, name='v_value_set'):
         if isinstance(data, TrajectoryData):
-            for path in data.trajectories:
-                SampleProcessor._add_estimated_v_value(path, value_func, name)
+            # one forward pass for the states of all the trajectories
+            packed = data.return_as_packed_data()
+            SampleProcessor._add_estimated_v_value(packed, value_func, name)
+            SampleProcessor._add_new_set(data, packed, name=name, data_set=packed(name))
         else:
             SampleProcessor._add_estimated_v_value(data, value_func, name)
 
@@ -55,6 +81,24 @@ class SampleProcessor(object):
         v_set = value_func.forward(data.state_set)
         data.append_new_set(name=name, data_set=make_batch(np.array(v_set), original_shape=[]), shape=[])
 
+    @staticmethod
+    def _as_packed_data(data: (TrajectoryData, PackedTrajectoryData)) -> PackedTrajectoryData:
+        if isinstance(data, PackedTrajectoryData):
+            return data
+        elif isinstance(data, TrajectoryData):
+            return data.return_as_packed_data()
+        else:
+            raise TypeError('not supported sample data type')
+
+    @staticmethod
+    def _add_new_set(data: (TrajectoryData, PackedTrajectoryData), packed: PackedTrajectoryData, name, data_set):
+        data_set = make_batch(np.reshape(data_set, [-1]), original_shape=[])
+        if isinstance(data, PackedTrajectoryData):
+            data.append_new_set(name=name, data_set=data_set, shape=[])
+        else:
+            for traj, traj_data_set in zip(data.trajectories, np.split(data_set, packed.episode_offsets[1:-1])):
+                traj.append_new_set(name=name, data_set=traj_data_set, shape=[])
+
     @staticmethod
     def normalization(data: (TransitionData, TrajectoryData), key, mean: np.ndarray = None, std_dev: np.ndarray = None):
         if isinstance(data, TransitionData):
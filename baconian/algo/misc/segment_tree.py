@@ -0,0 +1,97 @@
+import numpy as np
+from typeguard import typechecked
+
+
+class SegmentTree(object):
+    """
+    Array backed segment tree, the leaves are stored at [capacity, 2 * capacity) and node i holds the reduction of its
+    children 2i and 2i + 1. Both the update and the query accept a batch of indexes and run level by level in numpy.
+    """
+
+    @typechecked
+    def __init__(self, capacity: int, operation, neutral_element: float):
+        """
+
+        :param capacity: number of leaves, must be a power of 2
+        :type capacity: int
+        :param operation: a numpy binary ufunc used to reduce two children, e.g., np.add, np.minimum
+        :param neutral_element: neutral element of the operation, e.g., 0.0 for np.add and inf for np.minimum
+        :type neutral_element: float
+        """
+        if capacity <= 0 or capacity & (capacity - 1) != 0:
+            raise ValueError('capacity should be a positive power of 2, got {}'.format(capacity))
+        self.capacity = capacity
+        self.operation = operation
+        self.neutral_element = neutral_element
+        self._value = np.full(2 * capacity, neutral_element, dtype=np.float64)
+
+    def __setitem__(self, idx, val):
+        idx = np.reshape(np.asarray(idx, dtype=np.int64), [-1])
+        if len(idx) == 0:
+            return
+        if np.any(idx < 0) or np.any(idx >= self.capacity):
+            raise IndexError('index out of range [0, {})'.format(self.capacity))
+        node = idx + self.capacity
+        self._value[node] = val
+        node = np.unique(node // 2)
+        while node[0] >= 1:
+            self._value[node] = self.operation(self._value[2 * node], self._value[2 * node + 1])
+            node = np.unique(node // 2)
+
+    def __getitem__(self, idx):
+        return self._value[self.capacity + np.asarray(idx, dtype=np.int64)]
+
+    def reduce(self, start=0, end=None):
+        """
+        Return operation(tree[start], ..., tree[end - 1]).
+        """
+        if end is None:
+            end = self.capacity
+        if start == 0 and end == self.capacity:
+            return self._value[1]
+        res = self.neutral_element
+        start += self.capacity
+        end += self.capacity
+        while start < end:
+            if start & 1:
+                res = self.operation(res, self._value[start])
+                start += 1
+            if end & 1:
+                end -= 1
+                res = self.operation(res, self._value[end])
+            start //= 2
+            end //= 2
+        return res
+
+
+class SumSegmentTree(SegmentTree):
+    def __init__(self, capacity: int):
+        super(SumSegmentTree, self).__init__(capacity=capacity, operation=np.add, neutral_element=0.0)
+
+    def sum(self, start=0, end=None):
+        return self.reduce(start, end)
+
+    def find_prefixsum_idx(self, prefixsum):
+        """
+        For every value in prefixsum, find the smallest index i such that sum(tree[0], ..., tree[i]) >= value. All the
+        values are searched together by descending the tree one level at a time.
+
+        :param prefixsum: array of upper bounds on the prefix sums
+        :return: array of leaf indexes
+        """
+        prefixsum = np.array(prefixsum, dtype=np.float64).reshape([-1])
+        node = np.ones(len(prefixsum), dtype=np.int64)
+        while node[0] < self.capacity:
+            left = self._value[2 * node]
+            go_right = prefixsum > left
+            prefixsum -= left * go_right
+            node = 2 * node + go_right
+        return node - self.capacity
+
+
+class MinSegmentTree(SegmentTree):
+    def __init__(self, capacity: int):
+        super(MinSegmentTree, self).__init__(capacity=capacity, operation=np.minimum, neutral_element=float('inf'))
+
+    def min(self, start=0, end=None):
+        return self.reduce(start, end)
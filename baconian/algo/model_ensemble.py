@@ -1,7 +1,9 @@
 from baconian.algo.dynamics.dynamics_model import DynamicsModel
 from typeguard import typechecked
+import numpy as np
 
 from baconian.algo.dynamics.mlp_dynamics_model import ContinuousMLPGlobalDynamicsModel
+from baconian.algo.dynamics.mlp_ensemble_dynamics_model import ContinuousMLPEnsembleDynamicsModel
 from baconian.config.dict_config import DictConfig
 from baconian.common.sampler.sample_data import TransitionData
 from baconian.core.ensemble import ModelEnsemble
@@ -27,12 +29,13 @@ class ModelEnsembleAlgo(ModelBasedAlgo):
 
     @init_func_arg_record_decorator()
     @typechecked
-    def __init__(self, env_spec, dynamics_model: ModelEnsemble,
+    def __init__(self, env_spec, dynamics_model: (ModelEnsemble, ContinuousMLPEnsembleDynamicsModel),
                  model_free_algo: ModelFreeAlgo,
                  config_or_config_dict: (DictConfig, dict),
                  name='model_ensemble'
                  ):
-        if not isinstance(dynamics_model.model[0], ContinuousMLPGlobalDynamicsModel):
+        if isinstance(dynamics_model, ModelEnsemble) and \
+                not isinstance(dynamics_model.model[0], ContinuousMLPGlobalDynamicsModel):
             raise TypeError("Model ensemble elements should be of type ContinuousMLPGlobalDynamicsModel")
         super().__init__(env_spec, dynamics_model, name)
         config = construct_dict_config(config_or_config_dict, self)
@@ -49,9 +52,12 @@ class ModelEnsembleAlgo(ModelBasedAlgo):
         self.model_free_algo = model_free_algo
         self.config = config
         self.parameters = parameters
-        self.result = list()
-        self.validation_result = [0] * len(dynamics_model)
-        self._dynamics_model.__class__ = ModelEnsemble
+        self.result = [-np.inf] * len(dynamics_model)
+        self.validation_result = 0
+        # envs of the models of the ensemble to validate the policy on, built at the first validation
+        self._validation_env_list = None
+        if isinstance(dynamics_model, ModelEnsemble):
+            self._dynamics_model.__class__ = ModelEnsemble
 
     @register_counter_info_to_status_decorator(increment=1, info_key='init', under_status='INITED')
     def init(self):
@@ -93,17 +99,27 @@ class ModelEnsembleAlgo(ModelBasedAlgo):
         return super().test(*arg, **kwargs)
 
     def validate(self, agent: Agent, *args, **kwargs):
-        old_result = self.result
+        """
+        Sample trajectories by the agent on every model of the ensemble, with the reward and terminal functions of
+        dynamics_env.
+
+        :return: fraction of the models on which the mean reward is improved since the last validation
+        :rtype: float
+        """
+        if self._validation_env_list is None:
+            self._validation_env_list = [individual_model.return_as_env() for individual_model in
+                                         self._dynamics_model.model]
+        old_result = list(self.result)
         self.validation_result = 0
-        for a in range(len(self._dynamics_model)):
-            individual_model = self._dynamics_model.model[a]
-            env = individual_model.return_as_env()
+        for a, env in enumerate(self._validation_env_list):
+            env.set_terminal_reward_func(terminal_func=self.dynamics_env._terminal_func,
+                                         reward_func=self.dynamics_env._reward_func)
             batch_data = agent.sample(env=env,
                                       sample_count=self.parameters('validation_trajectory_count'),
                                       sample_type='trajectory',
                                       store_flag=False)
 
-            self.result[a] = batch_data.get_mean_of('reward')
+            self.result[a] = batch_data.get_mean_of('reward_set')
             if self.result[a] > old_result[a]:
                 self.validation_result += 1
 
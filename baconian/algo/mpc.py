@@ -1,7 +1,6 @@
 from baconian.algo.rl_algo import ModelBasedAlgo
 from baconian.algo.dynamics.dynamics_model import DynamicsModel
 from baconian.config.dict_config import DictConfig
-from baconian.common.sampler.sample_data import TrajectoryData
 from baconian.core.parameters import Parameters
 from baconian.config.global_config import GlobalConfig
 from baconian.common.misc import *
@@ -9,10 +8,26 @@ from baconian.algo.policy.policy import Policy
 from baconian.common.logging import ConsoleLogger
 from baconian.common.sampler.sample_data import TransitionData
 from baconian.common.logging import record_return_decorator
+from baconian.algo.policy.random_policy import UniformRandomPolicy
+from baconian.common.spaces import Box, Discrete
+from baconian.common.special import make_batch
+import numpy as np
 
 
 class ModelPredictiveControl(ModelBasedAlgo):
+    """
+    Model predictive control that plans on the dynamics model. All the candidate paths are rolled out together, one
+    DynamicsEnvWrapper.step_batch call per horizon step, and the first action of the path with the highest cumulative
+    reward is taken. The planner is selected by the optional config key PLANNER:
+
+    'random_shooting' (default): SAMPLED_PATH_NUM paths of SAMPLED_HORIZON steps with the actions given by the policy.
+
+    'cem': cross entropy method on the action sequences (Box action space only), CEM_ITERATION rounds (5 by default)
+    of SAMPLED_PATH_NUM sequences, the sampling distribution is refitted on the best CEM_ELITE_NUM ones (10% of
+    SAMPLED_PATH_NUM by default) after each round.
+    """
     required_key_dict = DictConfig.load_json(file_path=GlobalConfig().DEFAULT_MPC_REQUIRED_KEY_LIST)
+    PLANNER_LIST = ('random_shooting', 'cem')
 
     def __init__(self, env_spec, dynamics_model: DynamicsModel,
                  config_or_config_dict: (DictConfig, dict),
@@ -26,6 +41,18 @@ class ModelPredictiveControl(ModelBasedAlgo):
                                      source_config=self.config,
                                      name=name + '_' + 'mpc_param')
         self.memory = TransitionData(env_spec=env_spec)
+        config_dict = self.config.config_dict
+        self.planner = config_dict['PLANNER'] if 'PLANNER' in config_dict else 'random_shooting'
+        if self.planner not in self.PLANNER_LIST:
+            raise ValueError('planner {} not in {}'.format(self.planner, self.PLANNER_LIST))
+        if self.planner == 'cem':
+            if not isinstance(env_spec.action_space, Box):
+                raise TypeError('cem planner only support Box action space')
+            if not (np.isfinite(env_spec.action_space.low).all() and np.isfinite(env_spec.action_space.high).all()):
+                raise ValueError('cem planner requires a bounded action space')
+        self.cem_iteration = config_dict['CEM_ITERATION'] if 'CEM_ITERATION' in config_dict else 5
+        self.cem_elite_num = config_dict['CEM_ELITE_NUM'] if 'CEM_ELITE_NUM' in config_dict else \
+            max(1, self.config('SAMPLED_PATH_NUM') // 10)
 
     def init(self, source_obj=None):
         super().init()
@@ -57,22 +84,79 @@ class ModelPredictiveControl(ModelBasedAlgo):
     def predict(self, obs, **kwargs):
         if self.is_training is True:
             return self.env_spec.action_space.sample()
-        rollout = TrajectoryData(env_spec=self.env_spec)
-        state = obs
-        for i in range(self.parameters('SAMPLED_PATH_NUM')):
-            path = TransitionData(env_spec=self.env_spec)
-            # todo terminal_func signal problem to be consider?
-            for _ in range(self.parameters('SAMPLED_HORIZON')):
-                ac = self.policy.forward(obs=state)
-                new_state, re, done, _ = self.dynamics_env.step(action=ac, state=state)
-                path.append(state=state, action=ac, new_state=new_state, reward=re, done=done)
-                state = new_state
-            rollout.append(path)
-        rollout.trajectories.sort(key=lambda x: x.cumulative_reward, reverse=True)
-        ac = rollout.trajectories[0].action_set[0]
+        obs = np.array(obs).reshape(self.env_spec.obs_shape)
+        if self.planner == 'cem':
+            ac = self._cem_plan(obs)
+        else:
+            ac = self._random_shooting_plan(obs)
         assert self.env_spec.action_space.contains(ac)
         return ac
 
+    def _random_shooting_plan(self, obs):
+        first_actions, returns = self._batch_rollout(obs=obs,
+                                                     action_fn=lambda t, states: self._policy_batch_forward(states))
+        return first_actions[np.argmax(returns)]
+
+    def _cem_plan(self, obs):
+        space = self.env_spec.action_space
+        horizon = self.parameters('SAMPLED_HORIZON')
+        low = np.broadcast_to(space.low, (horizon,) + space.shape)
+        high = np.broadcast_to(space.high, (horizon,) + space.shape)
+        mean = (low + high) / 2.0
+        std = (high - low) / 2.0
+        best_action = None
+        best_return = -np.inf
+        for _ in range(self.cem_iteration):
+            action_seq = np.clip(mean + std * np.random.randn(self.parameters('SAMPLED_PATH_NUM'), *mean.shape),
+                                 low, high)
+            _, returns = self._batch_rollout(obs=obs, action_fn=lambda t, states: action_seq[:, t])
+            best_index = np.argmax(returns)
+            if returns[best_index] > best_return:
+                best_return = returns[best_index]
+                best_action = action_seq[best_index, 0]
+            elite = action_seq[np.argsort(returns)[-self.cem_elite_num:]]
+            mean = np.mean(elite, axis=0)
+            std = np.std(elite, axis=0)
+        return best_action
+
+    def _batch_rollout(self, obs, action_fn):
+        """
+        Roll out SAMPLED_PATH_NUM paths from obs on the dynamics env, the rewards after a path is terminated are not
+        counted.
+
+        :param obs: the start state
+        :param action_fn: a callable (step, states) -> batch of actions
+        :return: the batch of the first actions and the cumulative rewards of all the paths
+        """
+        path_num = self.parameters('SAMPLED_PATH_NUM')
+        states = np.repeat(np.expand_dims(obs, 0), path_num, axis=0)
+        returns = np.zeros(path_num)
+        alive = np.ones(path_num, dtype=bool)
+        first_actions = None
+        for t in range(self.parameters('SAMPLED_HORIZON')):
+            actions = action_fn(t, states)
+            if first_actions is None:
+                first_actions = actions
+            states, re, done = self.dynamics_env.step_batch(states=states, actions=actions)
+            returns += np.where(alive, re, 0.0)
+            alive = np.logical_and(alive, np.logical_not(done))
+        return first_actions, returns
+
+    def _policy_batch_forward(self, states):
+        n = states.shape[0]
+        if isinstance(self.policy, UniformRandomPolicy):
+            space = self.env_spec.action_space
+            if isinstance(space, Box):
+                return np.random.uniform(low=space.low, high=space.high, size=(n,) + space.shape)
+            elif isinstance(space, Discrete):
+                return np.random.randint(space.n, size=n)
+            return np.array([space.sample() for _ in range(n)])
+        actions = make_batch(self.policy.forward(obs=states), original_shape=self.env_spec.action_shape)
+        if actions.shape[0] != n:
+            # policies that ignore the observation, e.g., ConstantActionPolicy, return one action only
+            actions = np.repeat(actions[:1], n, axis=0)
+        return actions
+
     def append_to_memory(self, samples: TransitionData):
         self.memory.union(samples)
 
@@ -58,22 +58,40 @@ class DeterministicMLPPolicy(DeterministicPolicy, PlaceholderInput):
         self.output_high = output_high
         self.name_scope = name_scope
 
-    def forward(self, obs: (np.ndarray, list), sess=None, feed_dict=None, **kwargs):
+    def forward(self, obs: (np.ndarray, list), sess=None, feed_dict=None, compiled_flag=False,
+                extra_parameters: list = None, **kwargs):
+        """
+        :param compiled_flag: use the compiled inference mode, see PlaceholderInput._compiled_run
+        :param extra_parameters: parameters whose registered placeholders are also fed in the compiled inference mode
+        """
         obs = make_batch(obs, original_shape=self.env_spec.obs_shape)
-        feed_dict = {} if feed_dict is None else feed_dict
-        feed_dict = {
-            **feed_dict,
-            self.state_input: obs,
-            **self.parameters.return_tf_parameter_feed_dict()
-        }
-        sess = sess if sess else tf.get_default_session()
-        res = sess.run(self.action_tensor, feed_dict=feed_dict)
+        if compiled_flag is True:
+            res = self._compiled_run(self.action_tensor, [self.state_input], [obs], feed_dict=feed_dict,
+                                     extra_parameters=extra_parameters, sess=sess)
+        else:
+            feed_dict = {} if feed_dict is None else feed_dict
+            feed_dict = {
+                **feed_dict,
+                self.state_input: obs,
+                **self.parameters.return_tf_parameter_feed_dict()
+            }
+            sess = sess if sess else tf.get_default_session()
+            res = sess.run(self.action_tensor, feed_dict=feed_dict)
         res = np.clip(res, a_min=self.env_spec.action_space.low, a_max=self.env_spec.action_space.high)
         return res
 
     def copy_from(self, obj) -> bool:
         return PlaceholderInput.copy_from(self, obj)
 
+    def export_numpy_state(self, sess=None, version=None, input_norm=None) -> dict:
+        """
+        Export the policy to be run by baconian.common.numpy_mlp.NumpyMLP without tensorflow, the actions are clipped
+        into the action space as forward does. See MLP.export_numpy_state for the parameters.
+        """
+        return self.mlp_net.export_numpy_state(sess=sess, version=version, input_norm=input_norm,
+                                               clip_low=self.env_spec.action_space.low,
+                                               clip_high=self.env_spec.action_space.high)
+
     def make_copy(self, *args, **kwargs):
         kwargs = _get_copy_arg_with_tf_reuse(obj=self, kwargs=kwargs)
 
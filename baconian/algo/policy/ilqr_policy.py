@@ -1,5 +1,5 @@
 # import numpy as np
-from scipy.linalg import inv
+from scipy.linalg import cho_factor, cho_solve, LinAlgError
 from scipy.optimize import approx_fprime
 
 from baconian.algo.policy.policy import DeterministicPolicy
@@ -13,32 +13,50 @@ from baconian.common.logging import record_return_decorator
 from baconian.core.status import register_counter_info_to_status_decorator
 from baconian.common.sampler.sample_data import TransitionData
 
-from baconian.algo.dynamics.dynamics_model import DynamicsEnvWrapper
+from baconian.algo.dynamics.dynamics_model import DynamicsEnvWrapper, DynamicsModel
+from baconian.algo.misc.finite_difference import BatchFiniteDifference
 
 """
-the gradient is computed approximated instead of analytically
+the derivatives are computed analytically when the dynamics model and the cost function provide them (see
+DynamicsModel.jacobian_batch and RewardFunc.derivative_batch), otherwise approximated by finite difference over the
+whole horizon in one batch (see BatchFiniteDifference)
 """
 
 
 class iLQR(object):
 
-    def __init__(self, env_spec: EnvSpec, delta, T, dyn_model: DynamicsEnvWrapper, cost_fn: CostFunc):
+    def __init__(self, env_spec: EnvSpec, delta, T, dyn_model: DynamicsModel, cost_fn: CostFunc,
+                 finite_difference_scheme='forward', finite_difference_worker_num=0,
+                 finite_difference_pool_type='thread', reuse_base_rollout=False, line_search_alphas=None):
 
         self.env_spec = env_spec
         self.min_factor = 2
         self.factor = self.min_factor
         self.min_mu = 1e-6
+        self.max_mu = 1e10
         self.mu = self.min_mu
+        # candidate step sizes of the line search, from the full newton step to a tiny one
+        self.alphas = np.array(line_search_alphas) if line_search_alphas is not None else \
+            10. ** np.linspace(0, -3, 11)
+        # minimal ratio between the actual and the expected cost reduction for a step to be accepted
+        self.min_improvement_ratio = 0.1
         self.delta = delta
         self.T = T
         self.dyn_model = dyn_model
         self.cost_fn = cost_fn
         self.control_low = self.env_spec.action_space.low
         self.control_high = self.env_spec.action_space.high
-        self.K, self.k, self.std = None, None, None
+        self.K, self.k = None, None
+        # the new state of (x_seq[t], u_seq[t]) is x_seq[t + 1] when the sequence is rolled out on a deterministic
+        # dynamics model, so these points are not evaluated again by the finite difference
+        self.reuse_base_rollout = reuse_base_rollout
+        self.batch_finite_difference = BatchFiniteDifference(delta=float(delta),
+                                                             scheme=finite_difference_scheme,
+                                                             worker_num=finite_difference_worker_num,
+                                                             pool_type=finite_difference_pool_type)
 
     def increase(self, mu):
-        self.factor = np.maximum(self.factor, self.factor * self.min_factor)
+        self.factor = np.maximum(self.min_factor, self.factor * self.min_factor)
         self.mu = np.maximum(self.min_mu, self.mu * self.factor)
 
     def decrease(self, mu):
@@ -71,6 +89,11 @@ class iLQR(object):
     def finite_difference(self, x, u):
 
         "calling finite difference for delta perturbation"
+        C, c = self.finite_difference_cost(x, u)
+        F, f = self.finite_difference_dynamics(x, u)
+        return C, F, c, f
+
+    def finite_difference_dynamics(self, x, u):
         xu = np.concatenate((x, u))
 
         F = np.zeros((x.shape[0], xu.shape[0]))
@@ -78,6 +101,13 @@ class iLQR(object):
         for i in range(x.shape[0]):
             F[i, :] = approx_fprime(xu, self.simulate_next_state, self.delta, i)
 
+        f = np.zeros((len(x)))
+
+        return F, f
+
+    def finite_difference_cost(self, x, u):
+        xu = np.concatenate((x, u))
+
         c = approx_fprime(xu, self.simulate_cost, self.delta)
 
         C = np.zeros((len(xu), len(xu)))
@@ -85,134 +115,166 @@ class iLQR(object):
         for i in range(xu.shape[0]):
             C[i, :] = approx_fprime(xu, self.approx_fdoubleprime, self.delta, i)
 
-        f = np.zeros((len(x)))
-
-        return C, F, c, f
+        return C, c
 
     def differentiate(self, x_seq, u_seq):
 
-        "get gradient values using finite difference"
-
-        C, F, c, f = [], [], [], []
-
-        for t in range(self.T - 1):
-            Ct, Ft, ct, ft = self.finite_difference(x_seq[t], u_seq[t])
-
-            C.append(Ct)
-            F.append(Ft)
-            c.append(ct)
-            f.append(ft)
-
+        "get gradient values, analytically for the whole horizon in one call if possible, else by finite difference"
         "TODO : C, F, c, f for time step T are different. Why ?"
-
-        u = np.zeros((u_seq[0].shape))
-
-        Ct, Ft, ct, ft = self.finite_difference(x_seq[-1], u)
-
-        C.append(Ct)
-        F.append(Ft)
-        c.append(ct)
-        f.append(ft)
+        # the derivatives at the last time step are taken with a zero action
+        x_seq = np.array(x_seq)[:self.T]
+        u_seq = np.concatenate((np.array(u_seq)[:self.T - 1], np.zeros((1,) + np.array(u_seq[0]).shape)), axis=0)
+
+        C, F, c, f = None, None, None, None
+        try:
+            F = list(self.dyn_model.jacobian_batch(states=x_seq, actions=u_seq))
+            f = [np.zeros((len(x_seq[0])))] * self.T
+        except NotImplementedError:
+            pass
+        try:
+            c, C = self.cost_fn.derivative_batch(state=x_seq, action=u_seq)
+            c, C = list(c), list(C)
+        except NotImplementedError:
+            pass
+        if F is None or C is None:
+            # all the time steps are approximated together by one batched evaluation
+            C_fd, F_fd, c_fd, f_fd = self.batch_finite_difference.differentiate(
+                dyn_model=self.dyn_model, cost_fn=self.cost_fn, x_seq=x_seq, u_seq=u_seq,
+                new_x_seq=x_seq[1:] if self.reuse_base_rollout is True else None)
+            if F is None:
+                F, f = list(F_fd), list(f_fd)
+            if C is None:
+                C, c = list(C_fd), list(c_fd)
 
         return C, F, c, f
 
     def backward(self, x_seq, u_seq):
-
-        "initialize F_t, C_t, f_t, c_t, V_t, v_t"
+        """
+        Backward pass with Levenberg-Marquardt regularization, the regularization mu is increased and the pass is
+        repeated until Q_uu is positive definite at every time step. mu is decreased by solve only after a step is
+        accepted by the line search.
+
+        :param x_seq: states of the nominal trajectory with shape [T, flat_obs_dim]
+        :param u_seq: actions of the nominal trajectory with shape [T - 1, flat_action_dim]
+        :return: the terms (k^T Q_u, 0.5 k^T Q_uu k) of the expected cost reduction summed over the time steps, or
+                    None if mu exceeds max_mu
+        """
         C, F, c, f = self.differentiate(x_seq, u_seq)
-
-        n = x_seq[0].shape[0]
-
-        "initialize V_t1 and v_t1"
-
-        c_x = c[-1][:n]
-        c_u = c[-1][n:]
-
-        C_xx = C[-1][:n, :n]
-        C_xu = C[-1][:n, n:]
-        C_ux = C[-1][n:, :n]
-        C_uu = C[-1][n:, n:]
-
-        # C_uu = C_uu + self.mu * np.eye(C_uu.shape[0])
-
-        K = np.zeros((self.T + 1, u_seq[0].shape[0], x_seq[0].shape[0]))
-        k = np.zeros((self.T + 1, u_seq[0].shape[0]))
-
-        V = np.zeros((self.T + 1, x_seq[0].shape[0], x_seq[0].shape[0]))
-        v = np.zeros((self.T + 1, x_seq[0].shape[0]))
-
-        # K[-1] = -np.dot(inv(C_uu), C_ux)
-        # k[-1] = -np.dot(inv(C_uu), c_u)
-
-        # V[-1] = C_xx + np.dot(C_xu, K[-1]) + np.dot(K[-1].T, C_ux) + np.dot(np.dot(K[-1].T, C_uu), K[-1])
-        # v[-1] = c_x + np.dot(C_xu, k[-1]) + np.dot(K[-1].T, c_u) + np.dot(np.dot(K[-1].T, C_uu), k[-1])
-        V[-1] = C_xx
-        v[-1] = c_x
-
-        "initialize Q_t1 and q_t1"
-
-        Q = list(np.zeros((self.T)))
-        q = list(np.zeros((self.T)))
-
-        self.std = []
-        "loop till horizon"
-
-        t = self.T - 1
-        while t >= 0:
-            # for t in range(self.T-1, -1, -1):
-            "update Q"
-            # todo remove mu here
-            # Q[t] = C[t] + np.dot(np.dot(F[t].T, V[t + 1] + self.mu * np.eye(V[t + 1].shape[0])),
-            #                      F[t])  # + 0.01 * np.eye(V[t+1].shape[0])),
-
-            Q[t] = C[t] + np.dot(np.dot(F[t].T, V[t + 1]), F[t])
-            q[t] = c[t] + np.dot(F[t].T, v[t + 1]) + np.dot(np.dot(F[t].T, V[t + 1]), f[t])
-
-            "differentiate Q to get Q_uu, Q_xx, Q_ux, Q_u, Q_x"
-
-            q_x = q[t][:n]
-            q_u = q[t][n:]
-
-            Q_xx = Q[t][:n, :n]
-            Q_xu = Q[t][:n, n:]
-            Q_ux = Q[t][n:, :n]
-            Q_uu = Q[t][n:, n:]
-
-            # Q_uu = Q_uu + 100 * np.eye(Q_uu.shape[0])
-            # try:
-            #     np.linalg.cholesky(Q_uu)
-            # except:
-            #     print(self.mu)
-            #     self.increase(self.mu)
-            #     continue
-
-            "update K, k, V, v"
-            # print("q_uu", Q_uu)
-
-            K[t] = -np.dot(inv(Q_uu), Q_ux)
-            k[t] = -np.dot(inv(Q_uu), q_u)
-
-            V[t] = Q_xx + np.dot(Q_xu, K[t]) + np.dot(K[t].T, Q_ux) + np.dot(np.dot(K[t].T, Q_uu), K[t])
-            v[t] = q_x + np.dot(Q_xu, k[t]) + np.dot(K[t].T, q_u) + np.dot(np.dot(K[t].T, Q_uu), k[t])
-
-            self.std.append(inv(Q_uu))
-            # self.decrease(self.mu)
-            t -= 1
+        while True:
+            dV = self._backward_pass(C, F, c, f, n=len(x_seq[0]))
+            if dV is not None:
+                return dV
+            self.increase(self.mu)
+            if self.mu > self.max_mu:
+                return None
+
+    def _backward_pass(self, C, F, c, f, n):
+        "the last time step is the terminal one, its cost is taken with a zero action"
+        V = C[-1][:n, :n]
+        v = c[-1][:n]
+        m = C[-1].shape[0] - n
+        K = np.zeros((self.T - 1, m, n))
+        k = np.zeros((self.T - 1, m))
+        dV = np.zeros(2)
+
+        for t in range(self.T - 2, -1, -1):
+            Q = C[t] + np.dot(np.dot(F[t].T, V), F[t])
+            q = c[t] + np.dot(F[t].T, v) + np.dot(np.dot(F[t].T, V), f[t])
+            # regularize the state of the next step, i.e., V + mu * I, which keeps the solution close to the
+            # nominal trajectory
+            Q_reg = Q + self.mu * np.dot(F[t].T, F[t])
+
+            q_x, q_u = q[:n], q[n:]
+            Q_xx = Q[:n, :n]
+            Q_ux = Q[n:, :n]
+            Q_uu = Q[n:, n:]
+            try:
+                factor = cho_factor(Q_reg[n:, n:])
+            except LinAlgError:
+                return None
+            # solve for the feed forward term and the feedback gain together
+            sol = cho_solve(factor, np.concatenate((q_u[:, np.newaxis], Q_reg[n:, :n]), axis=1))
+            k[t] = -sol[:, 0]
+            K[t] = -sol[:, 1:]
+
+            v = q_x + np.dot(np.dot(K[t].T, Q_uu), k[t]) + np.dot(K[t].T, q_u) + np.dot(Q_ux.T, k[t])
+            V = Q_xx + np.dot(np.dot(K[t].T, Q_uu), K[t]) + np.dot(K[t].T, Q_ux) + np.dot(Q_ux.T, K[t])
+            V = 0.5 * (V + V.T)
+            dV += np.array([np.dot(k[t], q_u), 0.5 * np.dot(np.dot(k[t], Q_uu), k[t])])
 
         self.K = K
         self.k = k
-
-    def get_action_one_step(self, state, t, x, u):
-
-        "TODO : Add delta U's to given action array"
-        # print("Q_uu ", self.std[t])
-        mean = np.dot(self.K[t], (state - x)) + self.k[t] + u
-        # return np.clip(mean, self.control_low, self.control_high)
-        # todo remove random here
-        if np.isclose(0.0, self.std[t]).all() is False:
-            return np.clip(np.random.normal(mean, self.std[t]), self.control_low, self.control_high)
-        else:
-            return np.clip(mean, self.control_low, self.control_high)
+        return dV
+
+    def rollout(self, x0, u_seq, x_seq=None, alphas=(0.0,)):
+        """
+        Roll out the dynamics model from x0. If x_seq is given, the actions follow the feedback policy of the last
+        backward pass u_seq[t] + alpha * k[t] + K[t] (x - x_seq[t]), the trajectories of all the alphas are rolled out
+        together with one batched dynamics call per time step.
+
+        :return: states [len(alphas), T, flat_obs_dim], actions [len(alphas), T - 1, flat_action_dim] and total costs
+                    [len(alphas)], including the terminal cost of the last state
+        """
+        alphas = np.array(alphas, dtype=np.float64)
+        u_seq = np.reshape(u_seq, [self.T - 1, -1])
+        x = np.tile(np.reshape(x0, [1, -1]), (len(alphas), 1))
+        X = np.zeros((len(alphas), self.T, x.shape[1]))
+        U = np.zeros((len(alphas), self.T - 1, u_seq.shape[1]))
+        cost = np.zeros(len(alphas))
+        for t in range(self.T - 1):
+            X[:, t] = x
+            if x_seq is not None:
+                u = u_seq[t] + alphas[:, np.newaxis] * self.k[t] + np.dot(x - x_seq[t], self.K[t].T)
+            else:
+                u = np.tile(u_seq[t], (len(alphas), 1))
+            U[:, t] = np.clip(u, self.control_low, self.control_high)
+            new_x = np.reshape(self.dyn_model.step_batch(states=x, actions=U[:, t], allow_clip=True), x.shape)
+            cost += self.cost_fn.batch_call(state=x, action=U[:, t], new_state=new_x)
+            x = new_x
+        X[:, -1] = x
+        u = np.zeros_like(U[:, -1])
+        new_x = np.reshape(self.dyn_model.step_batch(states=x, actions=u, allow_clip=True), x.shape)
+        cost += self.cost_fn.batch_call(state=x, action=u, new_state=new_x)
+        return X, U, cost
+
+    def solve(self, x0, u_seq, iteration, tolerance=0.0):
+        """
+        Optimize the action sequence from state x0 by iLQR.
+
+        :param x0: initial state
+        :param u_seq: initial guess of the actions with shape [T - 1, flat_action_dim]
+        :param iteration: max number of iterations
+        :param tolerance: stop when the relative cost reduction of an iteration is below it
+        :return: the optimized states, actions and total cost
+        """
+        X, U, cost = self.rollout(x0, u_seq)
+        X, U, cost = X[0], U[0], cost[0]
+        for i in range(iteration):
+            dV = self.backward(X, U)
+            if dV is None:
+                break
+            X_new, U_new, cost_new = self.rollout(x0, U, x_seq=X, alphas=self.alphas)
+            expected = -(self.alphas * dV[0] + self.alphas ** 2 * dV[1])
+            actual = cost - cost_new
+            ratio = np.where(expected > 0, actual / np.where(expected > 0, expected, 1.0), np.sign(actual))
+            accepted = np.nonzero(np.logical_and(actual > 0, ratio > self.min_improvement_ratio))[0]
+            if len(accepted) == 0:
+                # no step size reduces the cost, take a more conservative step in the next iteration
+                self.increase(self.mu)
+                if self.mu > self.max_mu:
+                    break
+                continue
+            # the alphas are tried in decreasing order, as a backtracking line search would do
+            best = accepted[0]
+            self.decrease(self.mu)
+            converged = actual[best] <= tolerance * np.abs(cost)
+            X, U, cost = X_new[best], U_new[best], cost_new[best]
+            if converged:
+                break
+        return X, U, cost
+
+    def get_action_one_step(self, state, t, x, u, alpha=1.0):
+        return np.clip(u + alpha * self.k[t] + np.dot(self.K[t], (state - x)), self.control_low, self.control_high)
 
 
 class iLQRPolicy(DeterministicPolicy):
@@ -220,9 +282,17 @@ class iLQRPolicy(DeterministicPolicy):
     @typechecked
     def __init__(self, env_spec: EnvSpec, T: int, delta: float, iteration: int, cost_fn: CostFunc,
                  dynamics_model_train_iter: int,
-                 dynamics: DynamicsEnvWrapper):
+                 dynamics: DynamicsEnvWrapper,
+                 finite_difference_scheme: str = 'forward',
+                 finite_difference_worker_num: int = 0,
+                 finite_difference_pool_type: str = 'thread',
+                 reuse_base_rollout: bool = False,
+                 tolerance: float = 1e-4,
+                 warm_start: bool = True):
         param = Parameters(parameters=dict(T=T, delta=delta,
                                            iteration=iteration,
+                                           tolerance=tolerance,
+                                           warm_start=warm_start,
                                            dynamics_model_train_iter=dynamics_model_train_iter))
         super().__init__(env_spec, param)
         self.dynamics = dynamics
@@ -232,7 +302,11 @@ class iLQRPolicy(DeterministicPolicy):
                                   delta=self.parameters('delta'),
                                   T=self.parameters('T'),
                                   dyn_model=dynamics._dynamics,
-                                  cost_fn=cost_fn)
+                                  cost_fn=cost_fn,
+                                  finite_difference_scheme=finite_difference_scheme,
+                                  finite_difference_worker_num=finite_difference_worker_num,
+                                  finite_difference_pool_type=finite_difference_pool_type,
+                                  reuse_base_rollout=reuse_base_rollout)
 
     def forward(self, obs, **kwargs):
         obs = make_batch(obs, original_shape=self.env_spec.obs_shape).tolist()
@@ -261,7 +335,13 @@ class iLQRPolicy(DeterministicPolicy):
                           iteration=self.parameters('iteration'),
                           cost_fn=self.iLqr_instance.cost_fn,
                           dynamics_model_train_iter=self.parameters('dynamics_model_train_iter'),
-                          dynamics=dynamics)
+                          dynamics=dynamics,
+                          finite_difference_scheme=self.iLqr_instance.batch_finite_difference.scheme,
+                          finite_difference_worker_num=self.iLqr_instance.batch_finite_difference.worker_num,
+                          finite_difference_pool_type=self.iLqr_instance.batch_finite_difference.pool_type,
+                          reuse_base_rollout=self.iLqr_instance.reuse_base_rollout,
+                          tolerance=self.parameters('tolerance'),
+                          warm_start=self.parameters('warm_start'))
 
     def init(self, source_obj=None):
         self.parameters.init()
@@ -272,33 +352,15 @@ class iLQRPolicy(DeterministicPolicy):
         return super().get_status()
 
     def _forward(self, obs, step: None):
-        if not step:
-            self.U_hat = np.reshape([np.zeros(self.action_space.sample().shape) for _ in range(self.T - 1)],
-                                    (self.T - 1, self.action_space.shape[0]))
-
-            self.X_hat = []
-            self.X_hat.append(obs)
-            x = obs
-            for i in range(self.T - 1):
-                next_obs, _, _, _ = self.dynamics.step(action=self.U_hat[i, :], state=x, allow_clip=True)
-                self.X_hat.append(next_obs)
-                x = next_obs
-            self.X_hat = np.array(self.X_hat)
-        for i in range(self.parameters('iteration')):
-            self.iLqr_instance.backward(self.X_hat, self.U_hat)
-            x = obs
-            U = np.zeros(self.U_hat.shape)
-            X = np.zeros(self.X_hat.shape)
-
-            for t in range(self.T - 1):
-                u = self.iLqr_instance.get_action_one_step(x, t, self.X_hat[t], self.U_hat[t])
-                X[t] = x
-                U[t] = u
-                x, _, _, _ = self.dynamics.step(state=x, action=u, allow_clip=True)
-
-            X[-1] = x
-            self.X_hat = X
-            self.U_hat = U
+        if self.U_hat is None or step == 0 or self.parameters('warm_start') is False:
+            U_init = np.zeros((self.T - 1, self.action_space.flat_dim))
+        else:
+            # receding horizon, shift the last plan by one step and repeat its last action
+            U_init = np.concatenate((self.U_hat[1:], self.U_hat[-1:]), axis=0)
+        self.X_hat, self.U_hat, _ = self.iLqr_instance.solve(x0=np.array(obs),
+                                                             u_seq=U_init,
+                                                             iteration=self.parameters('iteration'),
+                                                             tolerance=self.parameters('tolerance'))
         return self.U_hat[0]
 
     @property
@@ -1,5 +1,5 @@
 # import numpy as np
-from scipy.linalg import inv
+from scipy.linalg import cho_factor, cho_solve, solve, solve_discrete_are, LinAlgError
 
 from baconian.algo.policy.policy import DeterministicPolicy
 from baconian.core.parameters import Parameters
@@ -11,137 +11,154 @@ from baconian.algo.dynamics.reward_func.reward_func import CostFunc, QuadraticCo
 
 
 class LQR(object):
+    """
+    LQR controller of a LinearDynamicsModel and a QuadraticCostFunc. The gains only depend on F, f, C, c (and T), so
+    they are computed once and cached, the Riccati recursion is solved again only when one of them changes. With
+    infinite_horizon the stationary gain is given by the discrete algebraic Riccati equation.
+    """
 
-    def __init__(self, env_spec: EnvSpec, T, dyna_model: LinearDynamicsModel, cost_fn: QuadraticCostFunc):
+    def __init__(self, env_spec: EnvSpec, T, dyna_model: LinearDynamicsModel, cost_fn: QuadraticCostFunc,
+                 infinite_horizon=False):
 
         self.env_spec = env_spec
         self.T = T
         self.dyn_model = dyna_model
         self.cost_fn = cost_fn
+        self.infinite_horizon = infinite_horizon
         self.control_low = self.env_spec.action_space.low
         self.control_high = self.env_spec.action_space.high
-        self.K, self.k, self.std = None, None, None
-        self.C = np.repeat(np.expand_dims(self.cost_fn.C, axis=0), [self.T], axis=0)
-        self.F = np.repeat(np.expand_dims(self.dyn_model.F, axis=0), [self.T], axis=0)
-        self.c = np.repeat(np.expand_dims(self.cost_fn.c, axis=0), [self.T], axis=0)
-        self.f = np.repeat(np.expand_dims(self.dyn_model.f, axis=0), [self.T], axis=0)
+        self.K, self.k = None, None
+        self._cache_key = None
 
     def differentiate(self):
 
-        "get gradient values using finite difference"
+        "the derivatives of the linear dynamics and the quadratic cost are their parameters"
 
-        C = np.repeat(np.expand_dims(self.cost_fn.C, axis=0), [self.T, 1, 1])
-        F = np.repeat(np.expand_dims(self.dyn_model.F, axis=0), [self.T, 1, 1])
-        c = np.repeat(np.expand_dims(self.cost_fn.c, axis=0), (self.T, 1))
-        f = np.repeat(np.expand_dims(self.dyn_model.f, axis=0), (self.T, 1))
+        C = np.tile(self.cost_fn.C, (self.T, 1, 1))
+        F = np.tile(self.dyn_model.F, (self.T, 1, 1))
+        c = np.tile(self.cost_fn.c, (self.T, 1))
+        f = np.tile(self.dyn_model.f, (self.T, 1))
         return C, F, c, f
 
-    def backward(self, x_seq, u_seq):
-
-        "initialize F_t, C_t, f_t, c_t, V_t, v_t"
-        # todo C, F, c, f can be analytical set here
-        C, F, c, f = self.C, self.F, self.c, self.f
-
-        n = x_seq[0].shape[0]
-
-        "initialize V_t1 and v_t1"
-
-        c_x = c[-1][:n]
-        c_u = c[-1][n:]
-
-        C_xx = C[-1][:n, :n]
-        C_xu = C[-1][:n, n:]
-        C_ux = C[-1][n:, :n]
-        C_uu = C[-1][n:, n:]
-
-        # C_uu = C_uu + self.mu * np.eye(C_uu.shape[0])
+    def update_gain(self):
+        """
+        Compute the gains K, k if F, f, C, c or the horizon have changed since the last call.
+
+        :return: True if the gains were recomputed
+        """
+        key = (self.T, self.infinite_horizon) + tuple(np.ascontiguousarray(val, dtype=np.float64).tobytes()
+                                                       for val in (self.dyn_model.F, self.dyn_model.f,
+                                                                   self.cost_fn.C, self.cost_fn.c))
+        if key == self._cache_key:
+            return False
+        if self.infinite_horizon is True:
+            self.solve_infinite_horizon()
+        else:
+            self.backward()
+        self._cache_key = key
+        return True
 
-        K = np.zeros((self.T + 1, u_seq[0].shape[0], x_seq[0].shape[0]))
-        k = np.zeros((self.T + 1, u_seq[0].shape[0]))
+    def backward(self, x_seq=None, u_seq=None):
 
-        V = np.zeros((self.T + 1, x_seq[0].shape[0], x_seq[0].shape[0]))
-        v = np.zeros((self.T + 1, x_seq[0].shape[0]))
+        "Riccati recursion of the finite horizon problem, x_seq and u_seq are not needed as the problem is linear"
+        C, F, c, f = self.differentiate()
 
-        # K[-1] = -np.dot(inv(C_uu), C_ux)
-        # k[-1] = -np.dot(inv(C_uu), c_u)
+        n = self.env_spec.flat_obs_dim
+        m = C.shape[1] - n
 
-        # V[-1] = C_xx + np.dot(C_xu, K[-1]) + np.dot(K[-1].T, C_ux) + np.dot(np.dot(K[-1].T, C_uu), K[-1])
-        # v[-1] = c_x + np.dot(C_xu, k[-1]) + np.dot(K[-1].T, c_u) + np.dot(np.dot(K[-1].T, C_uu), k[-1])
-        V[-1] = C_xx
-        v[-1] = c_x
+        "initialize V_t1 and v_t1"
 
-        "initialize Q_t1 and q_t1"
+        V = C[-1][:n, :n]
+        v = c[-1][:n]
 
-        Q = list(np.zeros((self.T)))
-        q = list(np.zeros((self.T)))
+        K = np.zeros((self.T, m, n))
+        k = np.zeros((self.T, m))
 
-        self.std = []
         "loop till horizon"
 
-        t = self.T - 1
-        while t >= 0:
-            Q[t] = C[t] + np.dot(np.dot(F[t].T, V[t + 1]), F[t])
-            q[t] = c[t] + np.dot(F[t].T, v[t + 1]) + np.dot(np.dot(F[t].T, V[t + 1]), f[t])
+        for t in range(self.T - 1, -1, -1):
+            Q = C[t] + np.dot(np.dot(F[t].T, V), F[t])
+            q = c[t] + np.dot(F[t].T, v) + np.dot(np.dot(F[t].T, V), f[t])
 
             "differentiate Q to get Q_uu, Q_xx, Q_ux, Q_u, Q_x"
 
-            q_x = q[t][:n]
-            q_u = q[t][n:]
+            q_x = q[:n]
+            q_u = q[n:]
 
-            Q_xx = Q[t][:n, :n]
-            Q_xu = Q[t][:n, n:]
-            Q_ux = Q[t][n:, :n]
-            Q_uu = Q[t][n:, n:]
+            Q_xx = Q[:n, :n]
+            Q_xu = Q[:n, n:]
+            Q_ux = Q[n:, :n]
+            Q_uu = Q[n:, n:]
 
             "update K, k, V, v"
-            # print("q_uu", Q_uu)
-
-            K[t] = -np.dot(inv(Q_uu), Q_ux)
-            k[t] = -np.dot(inv(Q_uu), q_u)
 
-            V[t] = Q_xx + np.dot(Q_xu, K[t]) + np.dot(K[t].T, Q_ux) + np.dot(np.dot(K[t].T, Q_uu), K[t])
-            v[t] = q_x + np.dot(Q_xu, k[t]) + np.dot(K[t].T, q_u) + np.dot(np.dot(K[t].T, Q_uu), k[t])
+            sol = _solve_psd(Q_uu, np.concatenate((Q_ux, q_u[:, np.newaxis]), axis=1))
+            K[t] = -sol[:, :n]
+            k[t] = -sol[:, n]
 
-            self.std.append(inv(Q_uu))
-            t -= 1
+            V = Q_xx + np.dot(Q_xu, K[t]) + np.dot(K[t].T, Q_ux) + np.dot(np.dot(K[t].T, Q_uu), K[t])
+            V = 0.5 * (V + V.T)
+            v = q_x + np.dot(Q_xu, k[t]) + np.dot(K[t].T, q_u) + np.dot(np.dot(K[t].T, Q_uu), k[t])
 
         self.K = K
         self.k = k
 
+    def solve_infinite_horizon(self):
+        """
+        Stationary gains of the infinite horizon problem. The quadratic part of the value function P solves the discrete
+        algebraic Riccati equation, the linear part v is the fixed point of the backward recursion under the stationary
+        gain.
+        """
+        n = self.env_spec.flat_obs_dim
+        F, f = np.array(self.dyn_model.F), np.array(self.dyn_model.f)
+        C, c = np.array(self.cost_fn.C), np.array(self.cost_fn.c)
+        A, B = F[:, :n], F[:, n:]
+        P = solve_discrete_are(A, B, C[:n, :n], C[n:, n:], s=C[:n, n:])
+        M = C + np.dot(np.dot(F.T, P), F)
+        M_uu = M[n:, n:]
+        K = -_solve_psd(M_uu, M[n:, :n])
+        closed_loop = A + np.dot(B, K)
+        v = solve(np.eye(n) - closed_loop.T,
+                  c[:n] + np.dot(K.T, c[n:]) + np.dot(np.dot(closed_loop.T, P), f))
+        k = -_solve_psd(M_uu, c[n:] + np.dot(B.T, v + np.dot(P, f)))
+        self.K = K[np.newaxis]
+        self.k = k[np.newaxis]
+
     def get_action_one_step(self, state, t):
+        "state can be a single state or a batch of states, the actions are computed by one matrix multiply"
+        t = min(t, len(self.K) - 1)
+        return np.clip(np.dot(state, self.K[t].T) + self.k[t], self.control_low, self.control_high)
 
-        mean = np.dot(self.K[t], state) + self.k[t]
-        # todo remove random here
-        if np.isclose(0.0, self.std[t]).all() is False:
-            return np.clip(np.random.normal(mean, self.std[t]), self.control_low, self.control_high)
-        else:
-            return np.clip(mean, self.control_low, self.control_high)
+
+def _solve_psd(a, b):
+    "solve a x = b by Cholesky factorization, fall back to the general solver if a is not positive definite"
+    try:
+        return cho_solve(cho_factor(a), b)
+    except LinAlgError:
+        return solve(a, b)
 
 
 class LQRPolicy(DeterministicPolicy):
 
     @typechecked
     def __init__(self, env_spec: EnvSpec, T: int, cost_fn: CostFunc,
-                 dynamics: LinearDynamicsModel):
-        param = Parameters(parameters=dict(T=T))
+                 dynamics: LinearDynamicsModel, infinite_horizon: bool = False):
+        param = Parameters(parameters=dict(T=T, infinite_horizon=infinite_horizon))
         super().__init__(env_spec, param)
         self.dynamics = dynamics
         self.Lqr_instance = LQR(env_spec=env_spec,
                                 T=self.parameters('T'),
                                 dyna_model=dynamics,
-                                cost_fn=cost_fn)
+                                cost_fn=cost_fn,
+                                infinite_horizon=self.parameters('infinite_horizon'))
 
     def forward(self, obs, **kwargs):
-        obs = make_batch(obs, original_shape=self.env_spec.obs_shape).tolist()
-        action = []
+        obs = np.reshape(make_batch(obs, original_shape=self.env_spec.obs_shape), [-1, self.env_spec.flat_obs_dim])
         if 'step' in kwargs:
             step = kwargs['step']
         else:
             step = None
-        for obs_i in obs:
-            action_i = self._forward(obs_i, step=step)
-            action.append(action_i)
-        return np.array(action)
+        return self._forward(obs, step=step)
 
     def copy_from(self, obj) -> bool:
         super().copy_from(obj)
@@ -152,7 +169,8 @@ class LQRPolicy(DeterministicPolicy):
         return LQRPolicy(env_spec=self.env_spec,
                          T=self.parameters('T'),
                          cost_fn=self.Lqr_instance.cost_fn,
-                         dynamics=self.dynamics.make_copy())
+                         dynamics=self.dynamics.make_copy(),
+                         infinite_horizon=self.parameters('infinite_horizon'))
 
     def init(self, source_obj=None):
         self.parameters.init()
@@ -163,10 +181,8 @@ class LQRPolicy(DeterministicPolicy):
         return super().get_status()
 
     def _forward(self, obs, step: None):
-        self.Lqr_instance.backward(np.array([obs]), np.array([self.action_space.sample()]))
-        x = obs
-        u = self.Lqr_instance.get_action_one_step(x, t=step if step else 0)
-        return u
+        self.Lqr_instance.update_gain()
+        return self.Lqr_instance.get_action_one_step(obs, t=step if step else 0)
 
     @property
     def T(self):
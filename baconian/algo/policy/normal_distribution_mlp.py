@@ -9,6 +9,7 @@ from baconian.tf.util import *
 from baconian.algo.utils import _get_copy_arg_with_tf_reuse
 from baconian.algo.misc.placeholder_input import PlaceholderInput
 import baconian.algo.distribution.mvn as mvn
+from baconian.common.error import *
 
 """
 logvar and logvar_speed is referred from https://github.com/pat-coady/trpo
@@ -94,21 +95,29 @@ class NormalDistributionMLPPolicy(StochasticPolicy, PlaceholderInput):
                                                            ),
                                                            name='normal_distribution_mlp_tf_param')
         PlaceholderInput.__init__(self, parameters=self.parameters)
-        self._log_prob = None
-        self._prob = None
-        self._entropy = None
+        # the distribution tensors are built at the first call and cached by their purpose
+        self._op_cache = GraphOpCache()
 
     @overrides.overrides
-    def forward(self, obs: (np.ndarray, list), sess=None, feed_dict=None, **kwargs):
+    def forward(self, obs: (np.ndarray, list), sess=None, feed_dict=None, compiled_flag=False,
+                extra_parameters: list = None, **kwargs):
+        """
+        :param compiled_flag: use the compiled inference mode, see PlaceholderInput._compiled_run
+        :param extra_parameters: parameters whose registered placeholders are also fed in the compiled inference mode
+        """
         obs = make_batch(obs, original_shape=self.env_spec.obs_shape)
-        feed_dict = feed_dict if feed_dict is not None else dict()
-        feed_dict = {
-            **feed_dict,
-            self.state_input: obs,
-            **self.parameters.return_tf_parameter_feed_dict()
-        }
-        sess = sess if sess else tf.get_default_session()
-        res = sess.run(self.action_output, feed_dict=feed_dict)
+        if compiled_flag is True:
+            res = self._compiled_run(self.action_output, [self.state_input], [obs], feed_dict=feed_dict,
+                                     extra_parameters=extra_parameters, sess=sess)
+        else:
+            feed_dict = feed_dict if feed_dict is not None else dict()
+            feed_dict = {
+                **feed_dict,
+                self.state_input: obs,
+                **self.parameters.return_tf_parameter_feed_dict()
+            }
+            sess = sess if sess else tf.get_default_session()
+            res = sess.run(self.action_output, feed_dict=feed_dict)
         res = np.clip(res, a_min=self.env_spec.action_space.low, a_max=self.env_spec.action_space.high)
         return res
 
@@ -116,6 +125,21 @@ class NormalDistributionMLPPolicy(StochasticPolicy, PlaceholderInput):
     def copy_from(self, obj) -> bool:
         return PlaceholderInput.copy_from(self, obj)
 
+    def export_numpy_state(self, sess=None, version=None, input_norm=None) -> dict:
+        """
+        Export the policy to be run by baconian.common.numpy_mlp.NumpyMLP without tensorflow, the mean network is
+        exported with the current stddev as the output noise and the actions are clipped into the action space as
+        forward does. See MLP.export_numpy_state for the parameters.
+        """
+        if self.mlp_net is None:
+            raise InappropriateParameterSetting('policy built from distribution_tensors_tuple can not be exported')
+        sess = sess if sess else tf.get_default_session()
+        stddev = sess.run(self.stddev_output, feed_dict=self.parameters.return_tf_parameter_feed_dict())
+        return self.mlp_net.export_numpy_state(sess=sess, version=version, input_norm=input_norm,
+                                               noise_stddev=stddev,
+                                               clip_low=self.env_spec.action_space.low,
+                                               clip_high=self.env_spec.action_space.high)
+
     def make_copy(self, **kwargs):
         kwargs = _get_copy_arg_with_tf_reuse(obj=self, kwargs=kwargs)
         copy_mlp_policy = NormalDistributionMLPPolicy(env_spec=self.env_spec,
@@ -128,7 +152,6 @@ class NormalDistributionMLPPolicy(StochasticPolicy, PlaceholderInput):
         return copy_mlp_policy
 
     def compute_dist_info(self, name, sess=None, **kwargs) -> np.ndarray:
-        # todo to be optimized, every time call the function will add computing tensor into the graph
         dist_info_map = {
             'log_prob': self.log_prob,
             'prob': self.prob,
@@ -160,23 +183,25 @@ class NormalDistributionMLPPolicy(StochasticPolicy, PlaceholderInput):
     def kl(self, other, *args, **kwargs) -> tf.Tensor:
         if not isinstance(other, type(self)):
             raise TypeError()
-        return mvn.kl(mean_p=self.mean_output, var_p=self.var_output,
-                      mean_q=other.mean_output, var_q=other.var_output, dims=self.action_space.flat_dim)
+        return self._op_cache.get(('kl', other),
+                                  lambda: mvn.kl(mean_p=self.mean_output, var_p=self.var_output,
+                                                 mean_q=other.mean_output, var_q=other.var_output,
+                                                 dims=self.action_space.flat_dim))
 
     def log_prob(self, *args, **kwargs) -> tf.Tensor:
-        if self._log_prob is None:
-            self._log_prob = mvn.log_prob(variable_ph=self.action_input, mean_p=self.mean_output, var_p=self.var_output)
-        return self._log_prob
+        return self._op_cache.get('log_prob',
+                                  lambda: mvn.log_prob(variable_ph=self.action_input, mean_p=self.mean_output,
+                                                       var_p=self.var_output))
 
     def prob(self, *args, **kwargs) -> tf.Tensor:
-        if self._prob is None:
-            self._prob = mvn.prob(variable_ph=self.action_input, mean_p=self.mean_output, var_p=self.var_output)
-        return self._prob
+        return self._op_cache.get('prob',
+                                  lambda: mvn.prob(variable_ph=self.action_input, mean_p=self.mean_output,
+                                                   var_p=self.var_output))
 
     def entropy(self, *args, **kwargs) -> tf.Tensor:
-        if self._entropy is None:
-            self._entropy = mvn.entropy(self.mean_output, self.var_output, dims=self.action_space.flat_dim)
-        return self._entropy
+        return self._op_cache.get('entropy',
+                                  lambda: mvn.entropy(self.mean_output, self.var_output,
+                                                      dims=self.action_space.flat_dim))
 
     def get_dist_info(self) -> tuple:
         res = (
@@ -35,6 +35,9 @@ class PPO(ModelFreeAlgo, OnPolicyAlgo, MultiPlaceholderInput):
                                warm_up_trajectories_number=warm_up_trajectories_number)
         self.use_time_index_flag = use_time_index_flag
         self.config = construct_dict_config(config_or_config_dict, self)
+        # predict with the compiled inference mode of the policy
+        self.compiled_predict_flag = self.config('COMPILED_PREDICT') if 'COMPILED_PREDICT' in \
+                                                                        self.config.config_dict else False
         self.policy = stochastic_policy
         self.value_func = value_func
         to_ph_parameter_dict = dict()
@@ -121,39 +124,34 @@ class PPO(ModelFreeAlgo, OnPolicyAlgo, MultiPlaceholderInput):
             trajectory_data = self.trajectory_memory
         if len(trajectory_data) == 0:
             raise MemoryBufferLessThanBatchSizeError('not enough trajectory data')
-        for i, traj in enumerate(trajectory_data.trajectories):
-            trajectory_data.trajectories[i].append_new_set(name='state_set',
-                                                           shape=self.env_spec.obs_shape,
-                                                           data_set=np.reshape(
-                                                               np.array(self.scaler.process(np.array(traj.state_set))),
-                                                               [-1] + list(self.env_spec.obs_shape)))
-            trajectory_data.trajectories[i].append_new_set(name='new_state_set',
-                                                           shape=self.env_spec.obs_shape,
-                                                           data_set=np.reshape(
-                                                               np.array(
-                                                                   self.scaler.process(np.array(traj.new_state_set))),
-                                                               [-1] + list(self.env_spec.obs_shape)))
+        # all the trajectories are packed once and processed as whole arrays
+        packed_data = trajectory_data.return_as_packed_data()
+        for key in ('state_set', 'new_state_set'):
+            packed_data.append_new_set(name=key,
+                                       shape=self.env_spec.obs_shape,
+                                       data_set=np.reshape(np.array(self.scaler.process(np.array(packed_data(key)))),
+                                                           [-1] + list(self.env_spec.obs_shape)))
 
         tf_sess = sess if sess else tf.get_default_session()
-        SampleProcessor.add_estimated_v_value(trajectory_data, value_func=self.value_func)
-        SampleProcessor.add_discount_sum_reward(trajectory_data,
+        SampleProcessor.add_estimated_v_value(packed_data, value_func=self.value_func)
+        SampleProcessor.add_discount_sum_reward(packed_data,
                                                 gamma=self.parameters('gamma'))
-        SampleProcessor.add_gae(trajectory_data,
+        SampleProcessor.add_gae(packed_data,
                                 gamma=self.parameters('gamma'),
                                 name='advantage_set',
                                 lam=self.parameters('lam'),
                                 value_func=self.value_func)
-        trajectory_data = SampleProcessor.normalization(trajectory_data, key='advantage_set')
+        packed_data = SampleProcessor.normalization(packed_data, key='advantage_set')
         policy_res_dict = self._update_policy(
-            state_set=np.concatenate([t('state_set') for t in trajectory_data.trajectories], axis=0),
-            action_set=np.concatenate([t('action_set') for t in trajectory_data.trajectories], axis=0),
-            advantage_set=np.concatenate([t('advantage_set') for t in trajectory_data.trajectories], axis=0),
+            state_set=packed_data('state_set'),
+            action_set=packed_data('action_set'),
+            advantage_set=packed_data('advantage_set'),
             train_iter=train_iter if train_iter else self.parameters(
                 'policy_train_iter'),
             sess=tf_sess)
         value_func_res_dict = self._update_value_func(
-            state_set=np.concatenate([t('state_set') for t in trajectory_data.trajectories], axis=0),
-            discount_set=np.concatenate([t('discount_set') for t in trajectory_data.trajectories], axis=0),
+            state_set=packed_data('state_set'),
+            discount_set=packed_data('discount_set'),
             train_iter=train_iter if train_iter else self.parameters(
                 'value_func_train_iter'),
             sess=tf_sess)
@@ -171,18 +169,40 @@ class PPO(ModelFreeAlgo, OnPolicyAlgo, MultiPlaceholderInput):
     @register_counter_info_to_status_decorator(increment=1, info_key='predict')
     def predict(self, obs: np.ndarray, sess=None, batch_flag: bool = False):
         tf_sess = sess if sess else tf.get_default_session()
+        if self.compiled_predict_flag is True:
+            return self.policy.forward(
+                obs=self.scaler.process(data=make_batch(obs, original_shape=self.env_spec.obs_shape)),
+                sess=tf_sess,
+                compiled_flag=True,
+                extra_parameters=[self.parameters])
         ac = self.policy.forward(obs=self.scaler.process(data=make_batch(obs, original_shape=self.env_spec.obs_shape)),
                                  sess=tf_sess,
                                  feed_dict=self.parameters.return_tf_parameter_feed_dict())
         return ac
 
+    def export_numpy_actor_state(self, sess=None, version=None) -> dict:
+        """
+        Export the policy as a plain dict, with which baconian.common.numpy_mlp.NumpyMLP samples actions as predict
+        without tensorflow, e.g., in sampling worker processes. The observation scaler is folded into the input norm
+        of the exported network, so the raw observations are passed to NumpyMLP.forward.
+
+        :param sess: tf session
+        :param version: version of the exported weights, NumpyMLP.load_state skips a state of the loaded version
+        :return: dict of the state
+        :rtype: dict
+        """
+        mean = np.array(self.scaler._mean, dtype=np.float64)
+        std = np.sqrt(self.scaler._var) + self.scaler._epsilon
+        if self.policy.input_norm is not None:
+            mean = mean + np.array(self.policy.input_norm[0]) * std
+            std = std * np.array(self.policy.input_norm[1])
+        return self.policy.export_numpy_state(sess=sess, version=version, input_norm=(mean, std))
+
     def append_to_memory(self, samples: TrajectoryData):
         # todo how to make sure the data's time sequential
-        obs_list = samples.trajectories[0].state_set
-        for i in range(1, len(samples.trajectories)):
-            obs_list = np.array(np.concatenate([obs_list, samples.trajectories[i].state_set], axis=0))
+        obs_list = np.concatenate([traj.state_set for traj in samples.trajectories], axis=0)
         self.trajectory_memory.union(samples)
-        self.scaler.update_scaler(data=np.array(obs_list))
+        self.scaler.update_scaler(data=obs_list)
         if self.use_time_index_flag:
             scale_last_time_index_mean = self.scaler._mean
             scale_last_time_index_mean[-1] = 0
@@ -88,11 +88,18 @@ class MLPQValueFunction(QValueFunction, PlaceholderInput):
         return PlaceholderInput.copy_from(self, obj)
 
     def forward(self, obs: (np.ndarray, list), action: (np.ndarray, list), sess=None,
-                feed_dict=None, *args,
+                feed_dict=None, *args, compiled_flag=False, extra_parameters: list = None,
                 **kwargs):
+        """
+        :param compiled_flag: use the compiled inference mode, see PlaceholderInput._compiled_run
+        :param extra_parameters: parameters whose registered placeholders are also fed in the compiled inference mode
+        """
         sess = sess if sess else tf.get_default_session()
         obs = make_batch(obs, original_shape=self.env_spec.obs_shape)
         action = make_batch(action, original_shape=[self.env_spec.flat_action_dim])
+        if compiled_flag is True:
+            return self._compiled_run(self.q_tensor, [self.state_input, self.action_input], [obs, action],
+                                      feed_dict=feed_dict, extra_parameters=extra_parameters, sess=sess)
         feed_dict = {
             self.state_input: obs,
             self.action_input: action,
@@ -110,6 +117,13 @@ class MLPQValueFunction(QValueFunction, PlaceholderInput):
         if source_obj:
             self.copy_from(obj=source_obj)
 
+    def export_numpy_state(self, sess=None, version=None) -> dict:
+        """
+        Export the q value function to be run by baconian.common.numpy_mlp.NumpyMLP without tensorflow, its input is
+        the concatenation of the flat state and action. See MLP.export_numpy_state for the parameters.
+        """
+        return self.mlp_net.export_numpy_state(sess=sess, version=version)
+
     def make_copy(self, *args, **kwargs):
         kwargs = _get_copy_arg_with_tf_reuse(obj=self, kwargs=kwargs)
 
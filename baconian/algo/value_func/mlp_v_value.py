@@ -73,9 +73,16 @@ class MLPVValueFunc(VValueFunction, PlaceholderInput):
         return PlaceholderInput.copy_from(self, obj)
 
     def forward(self, obs: (np.ndarray, list), sess=None,
-                feed_dict=None, *args,
+                feed_dict=None, *args, compiled_flag=False, extra_parameters: list = None,
                 **kwargs):
+        """
+        :param compiled_flag: use the compiled inference mode, see PlaceholderInput._compiled_run
+        :param extra_parameters: parameters whose registered placeholders are also fed in the compiled inference mode
+        """
         obs = make_batch(obs, original_shape=self.env_spec.obs_shape)
+        if compiled_flag is True:
+            return self._compiled_run(self.v_tensor, [self.state_input], [obs], feed_dict=feed_dict,
+                                      extra_parameters=extra_parameters, sess=sess)
         feed_dict = feed_dict if feed_dict is not None else dict()
         sess = sess if sess else tf.get_default_session()
         feed_dict = {
@@ -46,7 +46,8 @@ PENDULUM_BENCHMARK_CONFIG_DICT = {
         T=10,
         delta=0.05,
         iteration=2,
-        dynamics_model_train_iter=10
+        dynamics_model_train_iter=10,
+        reuse_base_rollout=True
     ),
 
 }
@@ -0,0 +1,43 @@
+from baconian.benchmark.throughput_benchmark import BENCHMARK_CASE_DICT, run_throughput_benchmark, \
+    compare_with_baseline, save_result, load_result
+from baconian.common.logging import ConsoleLogger
+import argparse
+import os
+import sys
+import time
+
+arg = argparse.ArgumentParser()
+arg.add_argument('--case', type=str, nargs='*', choices=list(BENCHMARK_CASE_DICT.keys()), default=None)
+arg.add_argument('--repeat', type=int, default=5)
+arg.add_argument('--min_time', type=float, default=0.2)
+arg.add_argument('--output', type=str, default=None)
+arg.add_argument('--baseline', type=str, default=None)
+arg.add_argument('--tolerance', type=float, default=0.2)
+arg.add_argument('--save_as_baseline', action='store_true')
+args = arg.parse_args()
+
+if __name__ == '__main__':
+    CURRENT_PATH = os.path.dirname(os.path.realpath(__file__))
+    baseline_path = args.baseline if args.baseline else os.path.join(CURRENT_PATH, 'throughput_benchmark',
+                                                                     'baseline.json')
+    ConsoleLogger().init(to_file_flag=False, level='ERROR')
+    result = run_throughput_benchmark(case_list=args.case, repeat=args.repeat, min_time=args.min_time)
+    for case, val in result.items():
+        print('{:<32} {:>14.1f} items/s {:>12.1f} us/call'.format(case, val['items_per_sec'],
+                                                                  val['sec_per_call'] * 1e6))
+
+    output = args.output if args.output else os.path.join(CURRENT_PATH, 'benchmark_log', 'throughput',
+                                                          '{}.json'.format(time.strftime("%Y-%m-%d_%H-%M-%S")))
+    save_result(result, output)
+    print('result saved into {}'.format(output))
+    if args.save_as_baseline is True:
+        save_result(result, baseline_path)
+        print('baseline saved into {}'.format(baseline_path))
+    elif os.path.exists(baseline_path):
+        comparison = compare_with_baseline(result, load_result(baseline_path), tolerance=args.tolerance)
+        regressed_list = [case for case, val in comparison.items() if val['regressed'] is True]
+        for case, val in comparison.items():
+            print('{:<32} {:>8.2f}x of baseline{}'.format(case, val['ratio'],
+                                                          ' REGRESSED' if val['regressed'] is True else ''))
+        if len(regressed_list) > 0:
+            sys.exit(1)
@@ -0,0 +1,3 @@
+from baconian.benchmark.throughput_benchmark.benchmark_cases import BENCHMARK_CASE_DICT
+from baconian.benchmark.throughput_benchmark.throughput_benchmark import run_throughput_benchmark, \
+    measure_throughput, compare_with_baseline, save_result, load_result
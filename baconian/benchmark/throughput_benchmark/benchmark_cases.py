@@ -0,0 +1,345 @@
+"""
+Cases of the throughput benchmark. A case function builds its fixtures and returns (fn, item_count), where fn is the
+callable to be timed and item_count the number of items (transitions, rows, env steps...) it processes per call.
+"""
+import numpy as np
+import tensorflow as tf
+
+from baconian.algo.ddpg import DDPG
+from baconian.algo.dqn import DQN
+from baconian.algo.dynamics.linear_dynamics_model import LinearDynamicsModel
+from baconian.algo.misc.replay_buffer import RingBuffer, UniformRandomReplayBuffer
+from baconian.algo.misc.sample_processor import SampleProcessor
+from baconian.algo.policy import DeterministicMLPPolicy
+from baconian.algo.value_func import MLPQValueFunction
+from baconian.common.data_pre_processing import RunningStandardScaler
+from baconian.common.numpy_mlp import NumpyMLP
+from baconian.common.sampler.sample_data import TransitionData, TrajectoryData
+from baconian.common.sampler.sampler import Sampler
+from baconian.common.spaces import Box
+from baconian.core.agent import Agent
+from baconian.core.core import EnvSpec
+from baconian.core.global_var import reset_all
+from baconian.core.status import reset_global_status_collect
+from baconian.envs.gym_env import make
+from baconian.tf.util import create_new_tf_session
+
+OBS_DIM = 3
+ACTION_DIM = 1
+BATCH_SIZE = 256
+MLP_CONFIG = [
+    {
+        "ACT": "RELU",
+        "B_INIT_VALUE": 0.0,
+        "NAME": "1",
+        "N_UNITS": 64,
+        "TYPE": "DENSE",
+        "W_NORMAL_STDDEV": 0.03
+    },
+    {
+        "ACT": "RELU",
+        "B_INIT_VALUE": 0.0,
+        "NAME": "2",
+        "N_UNITS": 64,
+        "TYPE": "DENSE",
+        "W_NORMAL_STDDEV": 0.03
+    }
+]
+
+
+def _output_layer(n_units):
+    return dict(ACT="LINEAR", B_INIT_VALUE=0.0, NAME="OUTPUT", N_UNITS=n_units, TYPE="DENSE", W_NORMAL_STDDEV=0.03)
+
+
+def _random_transition_data(size, obs_dim=OBS_DIM, action_dim=ACTION_DIM) -> TransitionData:
+    data = TransitionData(obs_shape=(obs_dim,), action_shape=(action_dim,))
+    data.append_batch(state=np.random.randn(size, obs_dim),
+                      action=np.random.randn(size, action_dim),
+                      new_state=np.random.randn(size, obs_dim),
+                      done=np.random.rand(size) < 0.01,
+                      reward=np.random.randn(size))
+    return data
+
+
+def _reset_tf_and_global_state():
+    sess = tf.get_default_session()
+    if sess:
+        sess.__exit__(None, None, None)
+    tf.reset_default_graph()
+    reset_all()
+    reset_global_status_collect()
+    return create_new_tf_session()
+
+
+def transition_data_append(size=1000):
+    states = np.random.randn(size, OBS_DIM)
+    actions = np.random.randn(size, ACTION_DIM)
+    rewards = np.random.randn(size)
+
+    def fn():
+        data = TransitionData(obs_shape=(OBS_DIM,), action_shape=(ACTION_DIM,))
+        for i in range(size):
+            data.append(state=states[i], action=actions[i], new_state=states[i], done=False, reward=rewards[i])
+
+    return fn, size
+
+
+def transition_data_union(size=10000):
+    source = _random_transition_data(size)
+
+    def fn():
+        data = _random_transition_data(1)
+        data.union(source)
+
+    return fn, size
+
+
+def transition_data_sample_batch(size=100000):
+    data = _random_transition_data(size)
+
+    def fn():
+        data.sample_batch(batch_size=BATCH_SIZE)
+
+    return fn, BATCH_SIZE
+
+
+def ring_buffer_append(size=1000):
+    buffer = RingBuffer(maxlen=100000, shape=(OBS_DIM,))
+    states = np.random.randn(size, OBS_DIM)
+
+    def fn():
+        for i in range(size):
+            buffer.append(states[i])
+
+    return fn, size
+
+
+def replay_buffer_append_batch(size=1000):
+    buffer = UniformRandomReplayBuffer(limit=100000, action_shape=(ACTION_DIM,), observation_shape=(OBS_DIM,))
+    data = _random_transition_data(size)
+
+    def fn():
+        buffer.append_batch(obs0=data.state_set, obs1=data.new_state_set, action=data.action_set,
+                            reward=data.reward_set, terminal1=data.done_set)
+
+    return fn, size
+
+
+def replay_buffer_sample(size=100000):
+    buffer = UniformRandomReplayBuffer(limit=size, action_shape=(ACTION_DIM,), observation_shape=(OBS_DIM,))
+    data = _random_transition_data(size)
+    buffer.append_batch(obs0=data.state_set, obs1=data.new_state_set, action=data.action_set,
+                        reward=data.reward_set, terminal1=data.done_set)
+
+    def fn():
+        buffer.sample(batch_size=BATCH_SIZE)
+
+    return fn, BATCH_SIZE
+
+
+def sample_processor_add_gae(traj_num=10, traj_len=200):
+    data = TrajectoryData(obs_shape=(OBS_DIM,), action_shape=(ACTION_DIM,))
+    for _ in range(traj_num):
+        traj = _random_transition_data(traj_len)
+        traj.append_new_set(name='v_value_set', data_set=np.random.randn(traj_len), shape=[])
+        data.append(traj)
+
+    def fn():
+        SampleProcessor.add_gae(data, gamma=0.99, lam=0.95)
+
+    return fn, traj_num * traj_len
+
+
+def data_scaler_process(size=10000):
+    scaler = RunningStandardScaler(dims=OBS_DIM)
+    data = np.random.randn(size, OBS_DIM)
+    scaler.update_scaler(data)
+
+    def fn():
+        scaler.process(data)
+
+    return fn, size
+
+
+def data_scaler_update_scaler(size=10000):
+    scaler = RunningStandardScaler(dims=OBS_DIM)
+    data = np.random.randn(size, OBS_DIM)
+
+    def fn():
+        scaler.update_scaler(data)
+
+    return fn, size
+
+
+def dynamics_model_step(size=1000):
+    reset_all()
+    env_spec = EnvSpec(obs_space=Box(low=-np.ones(OBS_DIM), high=np.ones(OBS_DIM)),
+                       action_space=Box(low=-np.ones(ACTION_DIM), high=np.ones(ACTION_DIM)))
+    model = LinearDynamicsModel(env_spec=env_spec,
+                                state_transition_matrix=np.random.randn(OBS_DIM, OBS_DIM + ACTION_DIM) * 0.1,
+                                bias=np.zeros(OBS_DIM),
+                                name='benchmark_linear_dynamics')
+    model.init()
+    states = np.random.uniform(-1.0, 1.0, (size, OBS_DIM))
+    actions = np.random.uniform(-1.0, 1.0, (size, ACTION_DIM))
+
+    def fn():
+        for i in range(size):
+            model.step(action=actions[i], state=states[i])
+
+    return fn, size
+
+
+def dqn_train_iteration(batch_size=32):
+    _reset_tf_and_global_state()
+    env = make('Acrobot-v1')
+    env_spec = EnvSpec(obs_space=env.observation_space, action_space=env.action_space)
+    mlp_q = MLPQValueFunction(env_spec=env_spec, name_scope='benchmark_dqn_mlp_q', name='benchmark_dqn_mlp_q',
+                              mlp_config=MLP_CONFIG + [_output_layer(1)])
+    dqn = DQN(env_spec=env_spec,
+              config_or_config_dict=dict(REPLAY_BUFFER_SIZE=10000,
+                                         GAMMA=0.99,
+                                         BATCH_SIZE=batch_size,
+                                         LEARNING_RATE=0.001,
+                                         TRAIN_ITERATION=1,
+                                         DECAY=0.5),
+              name='benchmark_dqn',
+              value_func=mlp_q)
+    dqn.init()
+    data = TransitionData(env_spec)
+    for _ in range(1000):
+        data.append(state=env_spec.obs_space.sample(), action=env_spec.action_space.sample(),
+                    new_state=env_spec.obs_space.sample(), done=False, reward=np.random.randn())
+    dqn.append_to_memory(data)
+
+    def fn():
+        dqn.train(train_iter=1)
+
+    return fn, batch_size
+
+
+def ddpg_train_iteration(batch_size=64):
+    ddpg, env, env_spec = _create_ddpg(batch_size=batch_size)
+    _append_random_transitions(ddpg, env_spec)
+
+    def fn():
+        ddpg.train(train_iter=1)
+
+    return fn, batch_size
+
+
+def ddpg_fused_train_iteration(batch_size=64, minibatch_num=4):
+    ddpg, env, env_spec = _create_ddpg(batch_size=batch_size,
+                                       extra_config=dict(FUSED_TRAIN=True, FUSED_MINIBATCH_NUM=minibatch_num))
+    _append_random_transitions(ddpg, env_spec)
+
+    def fn():
+        ddpg.train(train_iter=minibatch_num)
+
+    return fn, batch_size * minibatch_num
+
+
+def ddpg_predict():
+    ddpg, env, env_spec = _create_ddpg(batch_size=64)
+    obs = env_spec.obs_space.sample()
+
+    def fn():
+        ddpg.predict(obs)
+
+    return fn, 1
+
+
+def ddpg_compiled_predict():
+    ddpg, env, env_spec = _create_ddpg(batch_size=64, extra_config=dict(COMPILED_PREDICT=True))
+    obs = env_spec.obs_space.sample()
+
+    def fn():
+        ddpg.predict(obs)
+
+    return fn, 1
+
+
+def ddpg_numpy_actor_predict():
+    ddpg, env, env_spec = _create_ddpg(batch_size=64)
+    actor = NumpyMLP(ddpg.export_numpy_actor_state())
+    obs = env_spec.obs_space.sample()
+
+    def fn():
+        actor.forward(obs)
+
+    return fn, 1
+
+
+def sampler_sample(sample_count=1000):
+    ddpg, env, env_spec = _create_ddpg(batch_size=64)
+    agent = Agent(env=env, env_spec=env_spec, algo=ddpg, name='benchmark_agent')
+    agent.set_status('TEST')
+    ddpg.set_status('TEST')
+    env.set_status('TEST')
+
+    def fn():
+        Sampler.sample(env=env, agent=agent, sample_count=sample_count, sample_type='transition',
+                       reset_at_start=True)
+
+    return fn, sample_count
+
+
+def _append_random_transitions(algo, env_spec, size=1000):
+    data = TransitionData(env_spec)
+    for _ in range(size):
+        data.append(state=env_spec.obs_space.sample(), action=env_spec.action_space.sample(),
+                    new_state=env_spec.obs_space.sample(), done=False, reward=np.random.randn())
+    algo.append_to_memory(data)
+
+
+def _create_ddpg(batch_size, extra_config: dict = None):
+    _reset_tf_and_global_state()
+    env = make('Pendulum-v0')
+    env.init()
+    env_spec = EnvSpec(obs_space=env.observation_space, action_space=env.action_space)
+    mlp_q = MLPQValueFunction(env_spec=env_spec, name_scope='benchmark_ddpg_mlp_q', name='benchmark_ddpg_mlp_q',
+                              mlp_config=MLP_CONFIG + [_output_layer(1)])
+    policy = DeterministicMLPPolicy(env_spec=env_spec, name_scope='benchmark_ddpg_policy',
+                                    name='benchmark_ddpg_policy',
+                                    mlp_config=MLP_CONFIG + [_output_layer(env_spec.flat_action_dim)],
+                                    reuse=False)
+    ddpg = DDPG(env_spec=env_spec,
+                config_or_config_dict={
+                    "REPLAY_BUFFER_SIZE": 10000,
+                    "GAMMA": 0.99,
+                    "CRITIC_LEARNING_RATE": 0.001,
+                    "ACTOR_LEARNING_RATE": 0.001,
+                    "DECAY": 0.5,
+                    "BATCH_SIZE": batch_size,
+                    "TRAIN_ITERATION": 1,
+                    "critic_clip_norm": 0.1,
+                    "actor_clip_norm": 0.1,
+                    **(extra_config if extra_config else dict())
+                },
+                value_func=mlp_q,
+                policy=policy,
+                name='benchmark_ddpg',
+                replay_buffer=None)
+    ddpg.init()
+    return ddpg, env, env_spec
+
+
+BENCHMARK_CASE_DICT = dict(
+    transition_data_append=transition_data_append,
+    transition_data_union=transition_data_union,
+    transition_data_sample_batch=transition_data_sample_batch,
+    ring_buffer_append=ring_buffer_append,
+    replay_buffer_append_batch=replay_buffer_append_batch,
+    replay_buffer_sample=replay_buffer_sample,
+    sample_processor_add_gae=sample_processor_add_gae,
+    data_scaler_process=data_scaler_process,
+    data_scaler_update_scaler=data_scaler_update_scaler,
+    dynamics_model_step=dynamics_model_step,
+    dqn_train_iteration=dqn_train_iteration,
+    ddpg_train_iteration=ddpg_train_iteration,
+    ddpg_fused_train_iteration=ddpg_fused_train_iteration,
+    ddpg_predict=ddpg_predict,
+    ddpg_compiled_predict=ddpg_compiled_predict,
+    ddpg_numpy_actor_predict=ddpg_numpy_actor_predict,
+    sampler_sample=sampler_sample,
+)
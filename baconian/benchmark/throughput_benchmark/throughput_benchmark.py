@@ -0,0 +1,88 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from baconian.benchmark.throughput_benchmark.benchmark_cases import BENCHMARK_CASE_DICT
+
+
+def measure_throughput(fn, item_count: int, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """
+    Time fn with a warm up call and repeat rounds, each round calls fn until min_time seconds passed. The fastest
+    round is used, as the slower ones are mostly disturbed by other processes.
+
+    :param fn: callable to time
+    :param item_count: number of items processed by one call
+    :param repeat: number of rounds
+    :param min_time: minimal duration of one round in seconds
+    :return: dict of items_per_sec, sec_per_call, item_count and the total call_count
+    :rtype: dict
+    """
+    fn()
+    sec_per_call_list = []
+    call_count = 0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        while True:
+            fn()
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        sec_per_call_list.append(elapsed / count)
+        call_count += count
+    sec_per_call = float(np.min(sec_per_call_list))
+    return dict(items_per_sec=item_count / sec_per_call, sec_per_call=sec_per_call, item_count=item_count,
+                call_count=call_count)
+
+
+def run_throughput_benchmark(case_list: list = None, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """
+    Run the benchmark cases.
+
+    :param case_list: names of the cases in BENCHMARK_CASE_DICT to run, all if None
+    :return: dict of {case name: result of measure_throughput}
+    :rtype: dict
+    """
+    case_list = case_list if case_list else list(BENCHMARK_CASE_DICT.keys())
+    res = dict()
+    for case in case_list:
+        if case not in BENCHMARK_CASE_DICT:
+            raise ValueError('benchmark case {} not in {}'.format(case, list(BENCHMARK_CASE_DICT.keys())))
+        fn, item_count = BENCHMARK_CASE_DICT[case]()
+        res[case] = measure_throughput(fn=fn, item_count=item_count, repeat=repeat, min_time=min_time)
+    return res
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float = 0.2) -> dict:
+    """
+    Compare the throughput of the cases that are in both the result and the baseline.
+
+    :param result: result of run_throughput_benchmark
+    :param baseline: a previous result of run_throughput_benchmark
+    :param tolerance: a case is regressed if its throughput is below (1 - tolerance) * baseline throughput
+    :return: dict of {case name: dict(ratio, regressed)}, where ratio is the throughput ratio of result to baseline
+    :rtype: dict
+    """
+    res = dict()
+    for case, val in result.items():
+        if case not in baseline:
+            continue
+        ratio = val['items_per_sec'] / baseline[case]['items_per_sec']
+        res[case] = dict(ratio=ratio, regressed=ratio < 1.0 - tolerance)
+    return res
+
+
+def save_result(result: dict, file_path: str):
+    path = os.path.dirname(file_path)
+    if path and not os.path.exists(path):
+        os.makedirs(path)
+    with open(file_path, 'w') as f:
+        json.dump(result, f, indent=4, sort_keys=True)
+
+
+def load_result(file_path: str) -> dict:
+    with open(file_path, 'r') as f:
+        return json.load(f)
@@ -1,8 +1,55 @@
 from baconian.common.plotter import Plotter
 import pandas as pd
 from baconian.common.files import *
+from baconian.common.log_writer import JSON_LINES_SUFFIX, NPZ_CHUNK_PREFIX
 from collections import OrderedDict
 from typing import Union
+import numpy as np
+
+
+def load_streamed_log(obj_log_dir: str, status: str = None) -> dict:
+    """
+    Load the records written by the streaming log writers (see baconian.common.log_writer) of one object, in the same
+    layout as the log.json written by default: {attr_name: [record dict]}.
+
+    :param obj_log_dir: the record directory of the object, e.g., <exp_root_dir>/record/<obj_name>
+    :type obj_log_dir: str
+    :param status: the status if the log is split by status, None for the log that is not
+    :type status: str
+    :return: dict of records
+    :rtype: dict
+    """
+    name = status if status else 'log'
+    jsonl_file = os.path.join(obj_log_dir, name + JSON_LINES_SUFFIX)
+    npz_dir = os.path.join(obj_log_dir, name)
+    res = OrderedDict()
+    if os.path.isfile(jsonl_file):
+        with open(jsonl_file, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                res.setdefault(record.pop('attr_name'), []).append(record)
+    elif os.path.isdir(npz_dir):
+        for attr_name in sorted(os.listdir(npz_dir)):
+            chunk_list = sorted(f for f in os.listdir(os.path.join(npz_dir, attr_name))
+                                if f.startswith(NPZ_CHUNK_PREFIX))
+            res[attr_name] = []
+            for chunk in chunk_list:
+                with np.load(os.path.join(npz_dir, attr_name, chunk)) as data:
+                    columns = {key: data[key].tolist() for key in data.files}
+                res[attr_name] += [{key: columns[key][i] for key in columns}
+                                   for i in range(len(next(iter(columns.values()))))]
+    else:
+        raise LogPathOrFileNotExistedError('no streamed log {} found under {}'.format(name, obj_log_dir))
+    return res
+
+
+def _load_log_dict(obj_log_dir: str) -> dict:
+    log_file = os.path.join(obj_log_dir, 'log.json')
+    if os.path.isfile(log_file):
+        return load_json(file_path=log_file)
+    return load_streamed_log(obj_log_dir)
 
 
 class SingleExpLogDataLoader(object):
@@ -24,9 +71,7 @@ class SingleExpLogDataLoader(object):
     def plot_res(self, sub_log_dir_name, key, index, save_path=None, mode=('line', 'hist', 'scatter'),
                  average_over=1, file_name=None, save_format='png', save_flag=False,
                  ):
-        log_name = os.path.join(self._root_dir, 'record', sub_log_dir_name, 'log.json')
-        f = open(log_name, 'r')
-        res_dict = json.load(f)
+        res_dict = _load_log_dict(os.path.join(self._root_dir, 'record', sub_log_dir_name))
         key_list = res_dict[key]
         key_value = OrderedDict()
         key_vector = []
@@ -97,8 +142,7 @@ class MultipleExpLogDataLoader(object):
                  save_format='png', file_name=None, save_flag=False):
         multiple_key_value = {}
         for exp in self.exp_list:
-            f = open(os.path.join(exp, 'record', sub_log_dir_name, 'log.json'), 'r')
-            res_dict = json.load(f)
+            res_dict = _load_log_dict(os.path.join(exp, 'record', sub_log_dir_name))
             key_list = res_dict[key]
             key_vector = []
             index_vector = []
@@ -0,0 +1,122 @@
+"""
+Streaming writers used by the Logger to persist the records of a Recorder. Different from the default 'json' output,
+which dumps a whole json document at every flush, the writers append the new records to the files, so each flush only
+writes the records collected since the last one and the in-memory log of the recorders can be cleared.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+JSON_LINES_SUFFIX = '.jsonl'
+NPZ_CHUNK_PREFIX = 'chunk_'
+
+
+def _to_jsonable(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+class BaseLogWriter(object):
+    """
+    A writer receives the records of one object (and one status if the recorder splits the log by status) as a dict
+    of {attr_name: [record dict]}, where each record dict holds the status info and the 'value'.
+    """
+
+    def __init__(self, log_dir: str):
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+
+    def write(self, obj_name: str, log_dict: dict, status: str = None):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class JsonLinesLogWriter(BaseLogWriter):
+    """
+    Append the records as json lines into <log_dir>/<obj_name>/<status>.jsonl (log.jsonl if no status is given), one
+    record per line with its attr_name. The file handles are kept open until close.
+    """
+
+    def __init__(self, log_dir: str):
+        super().__init__(log_dir)
+        self._file_dict = dict()
+
+    def write(self, obj_name: str, log_dict: dict, status: str = None):
+        lines = []
+        for attr_name, record_list in log_dict.items():
+            for record in record_list:
+                lines.append(json.dumps(dict(record, attr_name=attr_name), default=_to_jsonable, sort_keys=True))
+        if len(lines) == 0:
+            return
+        with self._lock:
+            f = self._get_file(os.path.join(self.log_dir, str(obj_name)),
+                               '{}{}'.format(status if status else 'log', JSON_LINES_SUFFIX))
+            f.write('\n'.join(lines) + '\n')
+
+    def flush(self):
+        with self._lock:
+            for f in self._file_dict.values():
+                f.flush()
+
+    def close(self):
+        with self._lock:
+            for f in self._file_dict.values():
+                f.close()
+            self._file_dict = dict()
+
+    def _get_file(self, path, file_name):
+        file_path = os.path.join(path, file_name)
+        if file_path not in self._file_dict:
+            if not os.path.exists(path):
+                os.makedirs(path)
+            self._file_dict[file_path] = open(file_path, 'a')
+        return self._file_dict[file_path]
+
+
+class NpzLogWriter(BaseLogWriter):
+    """
+    Columnar writer, the records of each attribute are stored as numbered npz chunks under
+    <log_dir>/<obj_name>/<status>/<attr_name>/ (status is 'log' if not given). Each chunk holds one array per key of the
+    records (the status info and 'value'), a new chunk is written per write call so the files are never rewritten.
+    """
+
+    def __init__(self, log_dir: str):
+        super().__init__(log_dir)
+        self._chunk_count = dict()
+
+    def write(self, obj_name: str, log_dict: dict, status: str = None):
+        for attr_name, record_list in log_dict.items():
+            if len(record_list) == 0:
+                continue
+            key_list = sorted(set(key for record in record_list for key in record.keys()))
+            columns = dict()
+            for key in key_list:
+                column = np.array([record[key] if key in record else None for record in record_list])
+                if column.dtype == object:
+                    column = np.array([str(val) for val in column])
+                columns[key] = column
+            path = os.path.join(self.log_dir, str(obj_name), status if status else 'log', str(attr_name))
+            with self._lock:
+                np.savez(os.path.join(path, '{}{:06d}.npz'.format(NPZ_CHUNK_PREFIX, self._next_chunk_id(path))),
+                         **columns)
+
+    def _next_chunk_id(self, path):
+        if path not in self._chunk_count:
+            if not os.path.exists(path):
+                os.makedirs(path)
+            self._chunk_count[path] = len([f for f in os.listdir(path) if f.startswith(NPZ_CHUNK_PREFIX)])
+        self._chunk_count[path] += 1
+        return self._chunk_count[path] - 1
+
+
+LOG_WRITER_DICT = dict(jsonl=JsonLinesLogWriter, npz=NpzLogWriter)
@@ -1,13 +1,49 @@
 import abc
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 
 from baconian.common.misc import construct_dict_config
 from baconian.common import files as files
+from baconian.common.log_writer import LOG_WRITER_DICT
 from baconian.core.global_var import get_all
 from baconian.config.global_config import GlobalConfig
 from functools import wraps
 from baconian.common.error import *
+from baconian.common.profiler import profile_decorator
+
+
+QUEUE_FULL_POLICY_LIST = ('block', 'drop')
+
+
+def _put_to_queue(q: queue.Queue, item, full_policy: str) -> bool:
+    """
+    Put an item into a bounded queue, with the 'block' policy the caller waits until the background thread makes room
+    for it, with the 'drop' policy the item is discarded if the queue is full.
+
+    :return: False if the item is dropped
+    """
+    if full_policy == 'block':
+        q.put(item)
+        return True
+    try:
+        q.put_nowait(item)
+        return True
+    except queue.Full:
+        return False
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: queue.Queue, full_policy: str):
+        super().__init__(q)
+        self.full_policy = full_policy
+        self.dropped_count = 0
+
+    def enqueue(self, record):
+        if _put_to_queue(self.queue, record, self.full_policy) is False:
+            self.dropped_count += 1
 
 
 class BaseLogger(object):
@@ -29,6 +65,10 @@ class _SingletonConsoleLogger(BaseLogger):
     """
     A private class that should never be instanced, it is used to implement the singleton design pattern for
     ConsoleLogger
+
+    In async mode the records are put into a bounded queue and emitted by the stream and file handlers in a background
+    thread (logging.handlers.QueueListener), so print never waits for the I/O. When the queue is full, the 'block'
+    policy makes print wait for the background thread and the 'drop' policy discards the record.
     """
     ALLOWED_LOG_LEVEL = ('CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG', 'NOTSET')
     ALLOWED_PRINT_TYPE = ('info', 'warning', 'debug', 'critical', 'log', 'critical', 'error')
@@ -37,13 +77,21 @@ class _SingletonConsoleLogger(BaseLogger):
         super(_SingletonConsoleLogger, self).__init__()
         self.name = None
         self.logger = None
-
-    def init(self, to_file_flag, level: str, to_file_name: str = None, logger_name: str = 'console_logger'):
+        self.async_flag = False
+        self._handler_list = []
+        self._queue_handler = None
+        self._queue_listener = None
+
+    def init(self, to_file_flag, level: str, to_file_name: str = None, logger_name: str = 'console_logger',
+             async_flag: bool = False, queue_size: int = GlobalConfig().DEFAULT_LOGGING_QUEUE_SIZE,
+             queue_full_policy: str = 'block'):
         if self.inited_flag is True:
             return
         self.name = logger_name
         if level not in self.ALLOWED_LOG_LEVEL:
             raise ValueError('Wrong log level use {} instead'.format(self.ALLOWED_LOG_LEVEL))
+        if queue_full_policy not in QUEUE_FULL_POLICY_LIST:
+            raise ValueError('queue_full_policy {} not in {}'.format(queue_full_policy, QUEUE_FULL_POLICY_LIST))
         self.logger = logging.getLogger(self.name)
         self.logger.setLevel(getattr(logging, level))
 
@@ -51,41 +99,79 @@ class _SingletonConsoleLogger(BaseLogger):
             self.logger.removeHandler(handler)
             self.logger.root.removeHandler(handler)
 
-        self.logger.addHandler(logging.StreamHandler())
+        self._handler_list = [logging.StreamHandler()]
         if to_file_flag is True:
-            self.logger.addHandler(logging.FileHandler(filename=to_file_name))
-        for handler in self.logger.root.handlers[:] + self.logger.handlers[:]:
+            self._handler_list.append(logging.FileHandler(filename=to_file_name))
+        for handler in self._handler_list:
             handler.setFormatter(fmt=logging.Formatter(fmt=GlobalConfig().DEFAULT_LOGGING_FORMAT))
             handler.setLevel(getattr(logging, level))
 
+        self.async_flag = async_flag
+        if async_flag is True:
+            self._queue_handler = _BoundedQueueHandler(q=queue.Queue(maxsize=queue_size),
+                                                       full_policy=queue_full_policy)
+            self._queue_listener = logging.handlers.QueueListener(self._queue_handler.queue, *self._handler_list,
+                                                                  respect_handler_level=True)
+            self._queue_listener.start()
+            self.logger.addHandler(self._queue_handler)
+        else:
+            for handler in self._handler_list:
+                self.logger.addHandler(handler)
+
         self.inited_flag = True
 
     def print(self, p_type: str, p_str: str, *arg, **kwargs):
         if p_type not in self.ALLOWED_PRINT_TYPE:
             raise ValueError('use print type from {}'.format(self.ALLOWED_PRINT_TYPE))
         getattr(self.logger, p_type)(p_str, *arg, **kwargs)
-        self.flush()
+        if self.async_flag is False:
+            self.flush()
 
     def close(self):
+        if self._queue_listener is not None:
+            # emit all the queued records before closing the handlers
+            self._queue_listener.stop()
+            if self._queue_handler.dropped_count > 0:
+                for handler in self._handler_list:
+                    handler.handle(self.logger.makeRecord(self.name, logging.WARNING, __file__, 0,
+                                                          '{} log records were dropped as the logging queue was '
+                                                          'full'.format(self._queue_handler.dropped_count),
+                                                          None, None))
+            self._queue_listener = None
+            self._queue_handler = None
         self.flush()
-        for handler in self.logger.root.handlers[:] + self.logger.handlers[:]:
+        for handler in self.logger.root.handlers[:] + self.logger.handlers[:] + self._handler_list:
             handler.close()
             self.logger.removeHandler(handler)
             self.logger.root.removeHandler(handler)
+        self._handler_list = []
+        self.async_flag = False
 
     def reset(self):
         self.close()
         self.inited_flag = False
 
     def flush(self):
-        for handler in self.logger.root.handlers[:] + self.logger.handlers[:]:
+        for handler in self.logger.root.handlers[:] + self.logger.handlers[:] + self._handler_list:
             handler.flush()
 
 
 class _SingletonLogger(BaseLogger):
     """
     A private class that should never be instanced, it is used to implement the singleton design pattern for Logger
+
+    The optional keys of the logger config are:
+    LOG_WRITER: 'json' (default) dumps the log of each flush as a json document, 'jsonl' and 'npz' stream the records
+    with the writers in baconian.common.log_writer, which can be read by baconian.common.log_data_loader.load_streamed_log
+    FLUSH_INTERVAL: if > 0, the recorders are flushed by a background thread every FLUSH_INTERVAL seconds
+    MAX_BUFFERED_RECORDS: if > 0, a recorder is flushed once it holds that many records in memory
+    The last two require a streaming LOG_WRITER.
+    ASYNC: if True, the collected records are handed to a bounded queue and written by a background thread
+    QUEUE_SIZE: size of the queue in async mode, in number of flushes
+    QUEUE_FULL_POLICY: 'block' (default) or 'drop', what to do when the queue is full in async mode
     """
+    required_key_dict = dict()
+    LOG_WRITER_LIST = ('json',) + tuple(LOG_WRITER_DICT.keys())
 
     def __init__(self):
         super(_SingletonLogger, self).__init__()
@@ -95,6 +181,15 @@ class _SingletonLogger(BaseLogger):
         self._record_file_log_dir = None
         self.logger_config = None
         self.log_level = None
+        self.log_writer = None
+        self.max_buffered_records = 0
+        self._flush_lock = threading.RLock()
+        self._flush_thread = None
+        self._stop_flush_event = None
+        self._write_queue = None
+        self._write_thread = None
+        self._queue_full_policy = 'block'
+        self.dropped_count = 0
 
     def init(self, config_or_config_dict,
              log_path, log_level=None, **kwargs):
@@ -108,6 +203,35 @@ class _SingletonLogger(BaseLogger):
 
         self.logger_config = construct_dict_config(config_or_config_dict, obj=self)
         self.log_level = log_level
+        config_dict = self.logger_config.config_dict
+        writer_type = config_dict['LOG_WRITER'] if 'LOG_WRITER' in config_dict else 'json'
+        if writer_type not in self.LOG_WRITER_LIST:
+            raise ValueError('LOG_WRITER {} not in {}'.format(writer_type, self.LOG_WRITER_LIST))
+        self.log_writer = LOG_WRITER_DICT[writer_type](self._record_file_log_dir) if writer_type != 'json' else None
+        self.max_buffered_records = config_dict['MAX_BUFFERED_RECORDS'] if 'MAX_BUFFERED_RECORDS' in config_dict else 0
+        flush_interval = config_dict['FLUSH_INTERVAL'] if 'FLUSH_INTERVAL' in config_dict else 0
+        if self.log_writer is None and (flush_interval > 0 or self.max_buffered_records > 0):
+            # every flush of the 'json' output writes a new json document, so it should only happen at the end
+            raise InappropriateParameterSetting('FLUSH_INTERVAL and MAX_BUFFERED_RECORDS require a streaming '
+                                                'LOG_WRITER in {}'.format(tuple(LOG_WRITER_DICT.keys())))
+        if 'ASYNC' in config_dict and config_dict['ASYNC'] is True:
+            self._queue_full_policy = config_dict['QUEUE_FULL_POLICY'] if 'QUEUE_FULL_POLICY' in config_dict \
+                else 'block'
+            if self._queue_full_policy not in QUEUE_FULL_POLICY_LIST:
+                raise ValueError('QUEUE_FULL_POLICY {} not in {}'.format(self._queue_full_policy,
+                                                                         QUEUE_FULL_POLICY_LIST))
+            self._write_queue = queue.Queue(maxsize=config_dict['QUEUE_SIZE'] if 'QUEUE_SIZE' in config_dict
+                                            else GlobalConfig().DEFAULT_LOGGING_QUEUE_SIZE)
+            self._write_thread = threading.Thread(target=self._write_from_queue, name='log_write_thread',
+                                                  daemon=True)
+            self._write_thread.start()
+        if flush_interval > 0:
+            self._stop_flush_event = threading.Event()
+            self._flush_thread = threading.Thread(target=self._flush_periodically,
+                                                  args=(flush_interval, self._stop_flush_event),
+                                                  name='log_flush_thread',
+                                                  daemon=True)
+            self._flush_thread.start()
         self.inited_flag = True
 
     @property
@@ -116,16 +240,25 @@ class _SingletonLogger(BaseLogger):
             os.makedirs(self._log_dir)
         return self._log_dir
 
+    @profile_decorator('logger_flush')
     def flush_recorder(self, recorder=None):
-        if not recorder:
-            for re in self._registered_recorders:
-                self._flush(re)
-        else:
-            self._flush(recorder)
+        with self._flush_lock:
+            if not recorder:
+                for re in self._registered_recorders:
+                    self._flush(re)
+            else:
+                self._flush(recorder)
+            if self.log_writer and self._write_queue is None:
+                self.log_writer.flush()
 
     def close(self):
+        self._stop_flush_thread()
         self._save_all_obj_final_status()
         self.flush_recorder()
+        self._stop_write_thread()
+        if self.log_writer:
+            self.log_writer.close()
+            self.log_writer = None
         self._registered_recorders = []
 
     def append_recorder(self, recorder):
@@ -138,10 +271,58 @@ class _SingletonLogger(BaseLogger):
         self._registered_recorders = []
         self.inited_flag = False
 
+    def _flush_periodically(self, interval, stop_event):
+        while not stop_event.wait(interval):
+            if self.inited_flag is True:
+                self.flush_recorder()
+
+    def _stop_flush_thread(self):
+        if self._flush_thread is not None:
+            self._stop_flush_event.set()
+            self._flush_thread.join()
+            self._flush_thread = None
+            self._stop_flush_event = None
+
+    def _write_from_queue(self):
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                break
+            self._write(*item)
+            if self.log_writer and self._write_queue.empty():
+                self.log_writer.flush()
+
+    def _stop_write_thread(self):
+        if self._write_thread is not None:
+            # the stop signal is queued after all the pending records, so they are written before the thread exits
+            self._write_queue.put(None)
+            self._write_thread.join()
+            self._write_thread = None
+            self._write_queue = None
+            if self.dropped_count > 0:
+                ConsoleLogger().print('warning', '{} log flushes were dropped as the log write queue was '
+                                                 'full'.format(self.dropped_count))
+                self.dropped_count = 0
+
     def _flush(self, recorder):
         if recorder.is_empty():
             return
         log_dict, by_status_flag = recorder.get_obj_log_to_flush(clear_obj_log_flag=True)
+        if self._write_queue is not None:
+            if _put_to_queue(self._write_queue, (log_dict, by_status_flag), self._queue_full_policy) is False:
+                self.dropped_count += 1
+        else:
+            self._write(log_dict, by_status_flag)
+
+    def _write(self, log_dict, by_status_flag):
+        if self.log_writer:
+            for obj_name, obj_log_dict in log_dict.items():
+                if by_status_flag is True:
+                    for status, status_log_dict in obj_log_dict.items():
+                        self.log_writer.write(obj_name=obj_name, log_dict=status_log_dict, status=str(status))
+                else:
+                    self.log_writer.write(obj_name=obj_name, log_dict=obj_log_dict)
+            return
         for obj_name, obj_log_dict in log_dict.items():
             if by_status_flag is True:
                 for status, status_log_dict in obj_log_dict.items():
@@ -231,14 +412,21 @@ class Recorder(object):
         Logger().append_recorder(self)
         self.flush_by_split_status = flush_by_split_status
         self._default_obj = default_obj
+        self._record_count = 0
+        # the log can be flushed by the background thread of Logger
+        self._lock = threading.RLock()
 
     def append_to_obj_log(self, obj, attr_name: str, status_info: dict, value):
         assert hasattr(obj, 'name')
-        if obj not in self._obj_log:
-            self._obj_log[obj] = {}
-        if attr_name not in self._obj_log[obj]:
-            self._obj_log[obj][attr_name] = []
-        self._obj_log[obj][attr_name].append(dict(**status_info, attr_name=attr_name, value=value))
+        with self._lock:
+            if obj not in self._obj_log:
+                self._obj_log[obj] = {}
+            if attr_name not in self._obj_log[obj]:
+                self._obj_log[obj][attr_name] = []
+            self._obj_log[obj][attr_name].append(dict(**status_info, attr_name=attr_name, value=value))
+            self._record_count += 1
+        if 0 < Logger().max_buffered_records <= self._record_count and Logger().inited_flag is True:
+            self.flush()
 
     def get_log(self, attr_name: str, filter_by_status: dict = None, obj=None):
         if obj is None:
@@ -309,6 +497,13 @@ class Recorder(object):
         return filtered_res
 
     def get_obj_log_to_flush(self, clear_obj_log_flag) -> (dict, bool):
+        with self._lock:
+            res = self._get_obj_log_to_flush(clear_obj_log_flag)
+            if clear_obj_log_flag is True:
+                self._record_count = 0
+            return res
+
+    def _get_obj_log_to_flush(self, clear_obj_log_flag) -> (dict, bool):
         if self.flush_by_split_status is True:
             return self._filter_by_main_status(clear_obj_log_flag), self.flush_by_split_status
         else:
@@ -325,7 +520,9 @@ class Recorder(object):
             return filtered_res, self.flush_by_split_status
 
     def reset(self):
-        self._obj_log = {}
+        with self._lock:
+            self._obj_log = {}
+            self._record_count = 0
         self._registered_log_attr_by_get_dict = {}
 
     def flush(self):
@@ -1,6 +1,8 @@
 """
 From openai baselines
 """
+import copy
+
 import numpy as np
 from typeguard import typechecked
 from baconian.common.schedules import Scheduler
@@ -108,10 +110,32 @@ class AgentActionNoiseWrapper(object):
         self.action_weight_scheduler = action_weight_scheduler
         self.noise_weight_scheduler = noise_weight_scheduler
         self.noise = noise
-
-    def __call__(self, action, **kwargs):
-        noise = self.noise()
+        # noise processes of the rows after the first one of a batch, copied from noise
+        self._batch_noise_list = []
+
+    def __call__(self, action, batch_flag: bool = False, **kwargs):
+        """
+        :param action: action, or a batch of actions if batch_flag is True
+        :param batch_flag: every row of the batch, e.g., the action of one environment copy of VectorizedSampler,
+                            gets the noise from its own noise process, so that the exploration is not correlated
+                            across the rows
+        """
+        if batch_flag is True:
+            noise = np.array([noise() for noise in self._get_batch_noise_list(batch_size=len(action))])
+            if noise.ndim == 1:
+                noise = noise[:, np.newaxis]
+        else:
+            noise = self.noise()
         return self.action_weight_scheduler.value() * action + self.noise_weight_scheduler.value() * noise
 
     def reset(self):
         self.noise.reset()
+        for noise in self._batch_noise_list:
+            noise.reset()
+
+    def _get_batch_noise_list(self, batch_size: int) -> list:
+        while len(self._batch_noise_list) < batch_size - 1:
+            noise = copy.deepcopy(self.noise)
+            noise.reset()
+            self._batch_noise_list.append(noise)
+        return [self.noise] + self._batch_noise_list[:batch_size - 1]
@@ -0,0 +1,180 @@
+"""
+A pure NumPy forward pass of the networks built by baconian.tf.util.MLPCreator. It is used to act without tensorflow,
+e.g., in sampling worker processes, so this module should only import numpy. The state of a network is exported by
+baconian.tf.mlp.MLP.export_numpy_state as a plain dict of numpy arrays that can be pickled and sent to other processes.
+"""
+import numpy as np
+
+
+def _relu(x):
+    np.maximum(x, 0.0, out=x)
+
+
+def _leaky_relu(x, alpha=0.2):
+    # same default alpha as tf.nn.leaky_relu
+    np.maximum(x, alpha * x, out=x)
+
+
+def _sigmoid(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1.0
+    np.reciprocal(x, out=x)
+
+
+def _softmax(x):
+    x -= np.max(x, axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    x /= np.sum(x, axis=-1, keepdims=True)
+
+
+def _tanh(x):
+    np.tanh(x, out=x)
+
+
+def _elu(x):
+    neg = x < 0.0
+    x[neg] = np.expm1(x[neg])
+
+
+def _identity(x):
+    pass
+
+
+class NumpyMLP(object):
+    """
+    Forward pass of a MLP with the weights of an exported state, all activations are computed in place on float32
+    buffers that are allocated once per batch size.
+
+    The state is a dict with keys:
+        version: version of the weights, load_state skips a state with the same version as the loaded one
+        mlp_config: the mlp_config list used to build the network
+        weight_list: list of (kernel, bias) of the DENSE layers in order, bias is None if the layer has no bias
+        input_norm, output_norm, output_low, output_high: same as the ones of MLPCreator, can be None
+        clip_low, clip_high: bounds to clip the output into, can be None
+        noise_stddev: stddev of the gaussian noise added to the output before clipping, can be None
+    """
+    act_dict = {
+        'LINEAR': _identity,
+        'RELU': _relu,
+        'LEAKY_RELU': _leaky_relu,
+        'SIGMOID': _sigmoid,
+        'SOFTMAX': _softmax,
+        'IDENTITY': _identity,
+        'TANH': _tanh,
+        'ELU': _elu
+    }
+
+    def __init__(self, state: dict, dtype=np.float32):
+        self.dtype = dtype
+        self.version = None
+        self._layer_list = []
+        self._buffer_dict = dict()
+        self.load_state(state)
+
+    def load_state(self, state: dict) -> bool:
+        """
+        Load the weights of an exported state.
+
+        :param state: state returned by MLP.export_numpy_state
+        :return: False if the state has the same version as the loaded one and is skipped, True otherwise
+        :rtype: bool
+        """
+        if self.version is not None and state['version'] == self.version:
+            return False
+        dense_config_list = [layer_config for layer_config in state['mlp_config'] if layer_config['TYPE'] == 'DENSE']
+        if len(dense_config_list) != len(state['weight_list']):
+            raise ValueError('{} dense layers in mlp_config but {} weights in the state'.format(
+                len(dense_config_list), len(state['weight_list'])))
+        layer_list = []
+        for layer_config, (kernel, bias) in zip(dense_config_list, state['weight_list']):
+            if layer_config['ACT'] not in self.act_dict:
+                raise ValueError('activation {} is not supported'.format(layer_config['ACT']))
+            layer_list.append((np.ascontiguousarray(kernel, dtype=self.dtype),
+                               None if bias is None else np.asarray(bias, dtype=self.dtype),
+                               self.act_dict[layer_config['ACT']]))
+        if [layer[0].shape for layer in layer_list] != [layer[0].shape for layer in self._layer_list]:
+            self._buffer_dict = dict()
+        self._layer_list = layer_list
+        self._input_norm = self._as_array_pair(state['input_norm'])
+        self._output_norm = self._as_array_pair(state['output_norm'])
+        self._output_scale = None
+        if state['output_low'] is not None and state['output_high'] is not None:
+            low = np.asarray(state['output_low'], dtype=self.dtype)
+            high = np.asarray(state['output_high'], dtype=self.dtype)
+            self._output_scale = ((high - low) / 2.0, low)
+        self._clip = None
+        if state['clip_low'] is not None and state['clip_high'] is not None:
+            self._clip = (np.asarray(state['clip_low'], dtype=self.dtype),
+                          np.asarray(state['clip_high'], dtype=self.dtype))
+        self._noise_stddev = None if state['noise_stddev'] is None else np.asarray(state['noise_stddev'],
+                                                                                    dtype=self.dtype)
+        self.version = state['version']
+        return True
+
+    def forward(self, input: (np.ndarray, list), deterministic: bool = False) -> np.ndarray:
+        """
+        :param input: a single input or a batch of inputs
+        :param deterministic: do not add the gaussian noise of noise_stddev
+        :return: the output, with the batch dimension if input is a batch
+        :rtype: np.ndarray
+        """
+        input = np.asarray(input, dtype=self.dtype)
+        single_flag = input.ndim == 1
+        net = input.reshape(1, -1) if single_flag else input
+        input_buffer, buffer_list = self._get_buffer(batch_size=net.shape[0], input_dim=net.shape[1])
+        if self._input_norm is not None:
+            np.subtract(net, self._input_norm[0], out=input_buffer)
+            input_buffer /= self._input_norm[1]
+            net = input_buffer
+        for (kernel, bias, act), out in zip(self._layer_list, buffer_list):
+            np.dot(net, kernel, out=out)
+            if bias is not None:
+                out += bias
+            act(out)
+            net = out
+        if self._output_norm is not None:
+            net *= self._output_norm[0]
+            net += self._output_norm[1]
+        if self._output_scale is not None:
+            np.tanh(net, out=net)
+            net += 1.0
+            net *= self._output_scale[0]
+            net += self._output_scale[1]
+        if self._noise_stddev is not None and deterministic is False:
+            # unlike the tf policy, which shares one noise vector across the batch, every row gets its own noise
+            net += np.random.standard_normal(net.shape).astype(self.dtype) * self._noise_stddev
+        if self._clip is not None:
+            np.clip(net, self._clip[0], self._clip[1], out=net)
+        return net[0].copy() if single_flag else net.copy()
+
+    def _get_buffer(self, batch_size: int, input_dim: int):
+        if batch_size not in self._buffer_dict:
+            self._buffer_dict[batch_size] = (np.empty((batch_size, input_dim), dtype=self.dtype),
+                                             [np.empty((batch_size, kernel.shape[1]), dtype=self.dtype)
+                                              for kernel, _, _ in self._layer_list])
+        return self._buffer_dict[batch_size]
+
+    def _as_array_pair(self, norm):
+        if norm is None:
+            return None
+        return np.asarray(norm[0], dtype=self.dtype), np.asarray(norm[1], dtype=self.dtype)
+
+
+def greedy_discrete_action(q_mlp: NumpyMLP, obs: np.ndarray, action_dim: int) -> np.ndarray:
+    """
+    Greedy action of a q value network whose input is the concatenation of the state and the one-hot action, as the
+    exported q value function of DQN.
+
+    :param q_mlp: NumpyMLP of the q value function
+    :param obs: a batch of flat observations
+    :param action_dim: number of discrete actions
+    :return: argmax action for each observation of the batch
+    :rtype: np.ndarray
+    """
+    obs = np.asarray(obs, dtype=q_mlp.dtype)
+    batch_size = obs.shape[0]
+    q_input = np.concatenate([np.repeat(obs, repeats=action_dim, axis=0),
+                              np.tile(np.eye(action_dim, dtype=q_mlp.dtype), (batch_size, 1))], axis=1)
+    q_val = q_mlp.forward(q_input, deterministic=True).reshape(batch_size, action_dim)
+    return np.argmax(q_val, axis=1)
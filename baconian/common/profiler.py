@@ -0,0 +1,196 @@
+"""
+Light-weight timing instrumentation of the hot paths of an experiment (sampling, prediction, env step, training,
+tf session run, replay buffer sampling and log flushing).
+
+The timings are aggregated per flow stage (the key of the function called by a Flow, e.g., 'train', 'test', 'sample')
+into counters and log2 histograms, and written through a Recorder at the end of the experiment. The Profiler is
+disabled by default, in which case a timer only costs one flag check.
+"""
+import math
+import threading
+import time
+import tracemalloc
+from functools import wraps
+
+DEFAULT_STAGE = 'default'
+
+
+class _Stat(object):
+    """
+    Aggregated statistics of one timer under one stage, the histogram counts the values by their power of 2 bucket,
+    i.e., key e holds the values in [2 ** (e - 1), 2 ** e).
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.histogram = dict()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bucket = math.frexp(value)[1]
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def to_dict(self) -> dict:
+        return dict(count=self.count, total=self.total, mean=self.total / self.count if self.count > 0 else 0.0,
+                    min=self.min, max=self.max,
+                    histogram={str(key): self.histogram[key] for key in sorted(self.histogram.keys())})
+
+
+class _Timer(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.profiler.enabled is True:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.start is not None:
+            self.profiler.add(name=self.name, value=time.perf_counter() - self.start)
+            self.start = None
+
+
+class _Stage(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.profiler.enabled is True:
+            self.profiler._stage_stack().append(self.name)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.start is not None:
+            self.profiler.add(name='stage_total', value=time.perf_counter() - self.start)
+            if tracemalloc.is_tracing():
+                self.profiler.add(name='traced_memory', value=float(tracemalloc.get_traced_memory()[0]))
+            self.profiler._stage_stack().pop()
+            self.start = None
+
+
+class _SingletonProfiler(object):
+    """
+    A private class that should never be instanced, it is used to implement the singleton design pattern for Profiler
+    """
+
+    def __init__(self):
+        self.name = 'profiler'
+        self.enabled = False
+        self._stat_dict = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.enabled = False
+        with self._lock:
+            self._stat_dict = dict()
+        self._local = threading.local()
+
+    def timer(self, name: str) -> _Timer:
+        """
+        Return a context manager that adds its elapsed time (in seconds) to the timer name under the current stage.
+        """
+        return _Timer(self, name)
+
+    def stage(self, name: str) -> _Stage:
+        """
+        Return a context manager that sets the stage of the timers called inside it. The whole stage is timed as
+        'stage_total', and if tracemalloc is tracing, the traced memory (in bytes) at its end is added as
+        'traced_memory'.
+        """
+        return _Stage(self, name)
+
+    @property
+    def current_stage(self) -> str:
+        stack = self._stage_stack()
+        return stack[-1] if len(stack) > 0 else DEFAULT_STAGE
+
+    def add(self, name: str, value: float):
+        key = (self.current_stage, name)
+        with self._lock:
+            if key not in self._stat_dict:
+                self._stat_dict[key] = _Stat()
+            self._stat_dict[key].add(value)
+
+    def summary(self) -> dict:
+        """
+        :return: the statistics as {stage: {timer name: dict(count, total, mean, min, max, histogram)}}
+        :rtype: dict
+        """
+        res = dict()
+        with self._lock:
+            for (stage, name), stat in self._stat_dict.items():
+                if stage not in res:
+                    res[stage] = dict()
+                res[stage][name] = stat.to_dict()
+        return res
+
+    def record(self, recorder=None):
+        """
+        Write the statistics through a Recorder, one record per timer with the stage as its status info.
+
+        :param recorder: Recorder to use, a new one that does not split the log by status if None
+        """
+        from baconian.common.logging import Recorder
+        if recorder is None:
+            recorder = Recorder(flush_by_split_status=False, default_obj=self)
+        for stage, stage_dict in self.summary().items():
+            for name, stat in stage_dict.items():
+                recorder.append_to_obj_log(obj=self, attr_name=name, status_info=dict(stage=stage), value=stat)
+        return recorder
+
+    def _stage_stack(self) -> list:
+        if not hasattr(self._local, 'stage_stack'):
+            self._local.stage_stack = []
+        return self._local.stage_stack
+
+
+class Profiler(object):
+    only_instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if Profiler.only_instance is None:
+            Profiler.only_instance = _SingletonProfiler()
+        return Profiler.only_instance
+
+
+def profile_decorator(name: str):
+    """
+    Time every call of the decorated function as the timer name of the Profiler.
+    """
+
+    def wrap(fn):
+        @wraps(fn)
+        def wrap_with_timer(*args, **kwargs):
+            profiler = Profiler()
+            if profiler.enabled is False:
+                return fn(*args, **kwargs)
+            with profiler.timer(name):
+                return fn(*args, **kwargs)
+
+        return wrap_with_timer
+
+    return wrap
@@ -0,0 +1,257 @@
+"""
+Process pool based sampler, each worker process holds its own environment replica and a copy of the algorithm so the
+trajectories of Agent.sample/Agent.test can be collected on several cores in parallel.
+"""
+import multiprocessing
+import pickle
+
+import numpy as np
+from typeguard import typechecked
+
+from baconian.common.sampler.sampler import Sampler
+from baconian.common.sampler.sample_data import TransitionData, TrajectoryData
+from baconian.common.data_pre_processing import DataScaler
+from baconian.common.logging import ConsoleLogger
+from baconian.common.profiler import profile_decorator
+from baconian.config.global_config import GlobalConfig
+from baconian.envs.gym_env import GymEnv, make
+from baconian.algo.misc.placeholder_input import PlaceholderInput, MultiPlaceholderInput
+from baconian.tf.util import create_new_tf_session
+
+_TRANSITION_SET_KEYS = ('state_set', 'action_set', 'new_state_set', 'done_set', 'reward_set')
+
+
+def collect_policy_parameters(algo) -> list:
+    """
+    Return the ParametersWithTensorflowVariable that are needed by the algorithm to act. For a MultiPlaceholderInput
+    algorithm (e.g., DDPG, PPO, DQN) only the parameters of its sub modules (policy, value functions) are collected,
+    the optimizer variables held by the algorithm itself are never used by predict.
+    """
+    if isinstance(algo, MultiPlaceholderInput):
+        res = []
+        for param in algo._placeholder_input_list:
+            res += collect_policy_parameters(param['obj'])
+        return res
+    elif isinstance(algo, PlaceholderInput) and len(algo.parameters('tf_var_list')) > 0:
+        return [algo.parameters]
+    else:
+        return []
+
+
+def collect_scaler_state(algo) -> dict:
+    """
+    Data scalers (e.g., the observation scaler of PPO) are updated outside tensorflow and are used by predict, so they
+    are shipped to the workers together with the weights.
+    """
+    return {key: val for key, val in vars(algo).items() if isinstance(val, DataScaler)}
+
+
+class _WorkerAgent(object):
+    """
+    Minimal agent used by the worker processes, the actions are predicted by the algorithm directly.
+    """
+
+    def __init__(self, algo):
+        self.algo = algo
+
+    def predict(self, **kwargs):
+        return self.algo.predict(**kwargs)
+
+    def reset_on_terminal_state(self):
+        pass
+
+
+def _transition_data_to_dict(data: TransitionData) -> dict:
+    return {key: data(key) for key in _TRANSITION_SET_KEYS}
+
+
+def _read_shared_weights(raw_array, layout) -> list:
+    buffer = np.frombuffer(raw_array, dtype=np.uint8)
+    res = []
+    for offset, size, dtype in layout:
+        nbytes = size * np.dtype(dtype).itemsize
+        res.append(np.frombuffer(buffer[offset:offset + nbytes].tobytes(), dtype=dtype))
+    return res
+
+
+def _rollout_worker(conn, env_id: str, algo_maker, raw_array, layout, seed: int):
+    ConsoleLogger().init(to_file_flag=False, level=GlobalConfig().DEFAULT_LOG_LEVEL,
+                         logger_name='rollout_worker_{}'.format(seed))
+    create_new_tf_session()
+    env = make(env_id)
+    env.init()
+    env.seed(seed)
+    np.random.seed(seed)
+    algo = algo_maker(env.env_spec)
+    algo.init()
+    param_list = collect_policy_parameters(algo)
+    agent = _WorkerAgent(algo)
+    while True:
+        cmd, data = conn.recv()
+        if cmd == 'sync':
+            for param, flat_values in zip(param_list, _read_shared_weights(raw_array, layout)):
+                param.set_flat_tf_var_values(flat_values)
+            for key, scaler in pickle.loads(data).items():
+                setattr(algo, key, scaler)
+        elif cmd == 'sample':
+            status, sample_type, sample_count, reset_at_start = data
+            algo.set_status(status)
+            env.set_status(status)
+            res = Sampler.sample(env=env,
+                                 agent=agent,
+                                 sample_count=sample_count,
+                                 sample_type=sample_type,
+                                 reset_at_start=reset_at_start)
+            if sample_type == 'trajectory':
+                conn.send([_transition_data_to_dict(traj) for traj in res.trajectories])
+            else:
+                conn.send([_transition_data_to_dict(res)])
+        elif cmd == 'close':
+            conn.close()
+            return
+        else:
+            raise ValueError('unknown command {}'.format(cmd))
+
+
+class ParallelSampler(Sampler):
+    """
+    Sampler that fans the sampling out to a pool of worker processes. Every worker builds its own environment with
+    baconian.envs.gym_env.make and its own algorithm by calling algo_maker(env_spec) in a new tensorflow session.
+
+    Before sampling, the weights of the agent's algorithm are exported from its ParametersWithTensorflowVariable into a
+    shared memory block which the workers read from. This only happens when the policy version, i.e., the agent's
+    update counter or the state of the data scalers, has changed since the last sync.
+
+    The workers act with algo.predict directly, so when the agent samples for training with an exploration strategy
+    or an action noise, the sampling falls back to the in-process Sampler to keep the exploration behaviour.
+    """
+
+    @typechecked
+    def __init__(self, worker_num: int, algo_maker, start_method: str = 'spawn'):
+        """
+
+        :param worker_num: number of worker processes
+        :type worker_num: int
+        :param algo_maker: a picklable callable (e.g., a module level function) that takes an EnvSpec and returns an
+                            algorithm with the same structure as the agent's algorithm, it is called in each worker
+        :param start_method: start method of multiprocessing, tensorflow is not fork-safe so 'spawn' is the default
+        :type start_method: str
+        """
+        if worker_num < 1:
+            raise ValueError('worker_num should be at least 1, got {}'.format(worker_num))
+        self.worker_num = worker_num
+        self.algo_maker = algo_maker
+        self._mp_context = multiprocessing.get_context(start_method)
+        self._process_list = []
+        self._conn_list = []
+        self._raw_array = None
+        self._layout = None
+        self._synced_version = None
+
+    @profile_decorator('sampler_sample')
+    @typechecked
+    def sample(self,
+               env: GymEnv,
+               agent,
+               sample_count: int,
+               sample_type='transition',
+               reset_at_start=None) -> (TransitionData, TrajectoryData):
+        """
+        sample function, see Sampler.sample for the meaning of the parameters.
+
+        :return: SampleData object.
+        """
+        if sample_type not in ('transition', 'trajectory'):
+            raise ValueError()
+        if agent.is_training and (agent.explorations_strategy or agent.noise_adder):
+            return Sampler.sample(env=env, agent=agent, sample_count=sample_count, sample_type=sample_type,
+                                  reset_at_start=reset_at_start)
+        if len(self._process_list) == 0:
+            self._start_workers(env=env, algo=agent.algo)
+        self._sync_policy(agent)
+
+        count_list = [sample_count // self.worker_num + (1 if i < sample_count % self.worker_num else 0)
+                      for i in range(self.worker_num)]
+        status = agent.algo.get_status()['status']
+        for conn, count in zip(self._conn_list, count_list):
+            if count > 0:
+                conn.send(('sample', (status, sample_type, count, reset_at_start)))
+        raw_list = []
+        for conn, count in zip(self._conn_list, count_list):
+            if count > 0:
+                raw_list += conn.recv()
+
+        if sample_type == 'trajectory':
+            sample_record = TrajectoryData(env.env_spec)
+            for raw in raw_list:
+                traj = TransitionData(env.env_spec)
+                traj.append_batch(state=raw['state_set'], action=raw['action_set'], new_state=raw['new_state_set'],
+                                  done=raw['done_set'], reward=raw['reward_set'])
+                sample_record.append(traj)
+            step_count = sum([len(traj) for traj in sample_record.trajectories])
+        else:
+            sample_record = TransitionData(env.env_spec)
+            for raw in raw_list:
+                sample_record.append_batch(state=raw['state_set'], action=raw['action_set'],
+                                           new_state=raw['new_state_set'], done=raw['done_set'],
+                                           reward=raw['reward_set'])
+            step_count = len(sample_record)
+        # one prediction is made for every env step by the workers
+        agent._status.update_info(info_key='predict_counter', increment=step_count)
+        env._status.update_info(info_key='step', increment=step_count)
+        return sample_record
+
+    def init(self, agent):
+        # the flat ops used to export the weights to the workers are built and cached here instead of at the first sync
+        for param in collect_policy_parameters(agent.algo):
+            param.return_flat_tf_var_values()
+
+    def close(self):
+        for conn in self._conn_list:
+            conn.send(('close', None))
+        for p in self._process_list:
+            p.join()
+        self._process_list = []
+        self._conn_list = []
+        self._raw_array = None
+        self._layout = None
+        self._synced_version = None
+
+    def _start_workers(self, env: GymEnv, algo):
+        layout = []
+        offset = 0
+        # the weights of each parameters are shipped as one flat vector
+        for param in collect_policy_parameters(algo):
+            size = param.flat_tf_var_size
+            dtype = np.dtype(param('tf_var_list')[0].dtype.base_dtype.as_numpy_dtype)
+            layout.append((offset, size, dtype.str))
+            offset += size * dtype.itemsize
+        self._layout = layout
+        self._raw_array = self._mp_context.RawArray('B', max(offset, 1))
+        seed_list = np.random.randint(low=0, high=2 ** 31 - 1, size=self.worker_num)
+        for i in range(self.worker_num):
+            parent_conn, child_conn = self._mp_context.Pipe()
+            p = self._mp_context.Process(target=_rollout_worker,
+                                         args=(child_conn, env.env_id, self.algo_maker, self._raw_array,
+                                               self._layout, int(seed_list[i])),
+                                         daemon=True)
+            p.start()
+            self._process_list.append(p)
+            self._conn_list.append(parent_conn)
+        ConsoleLogger().print('info', 'started {} rollout workers for env {}'.format(self.worker_num, env.env_id))
+
+    def _sync_policy(self, agent):
+        update_counter = agent._status._get_specific_info_key_status(info_key='update_counter',
+                                                                     under_status='TRAIN')
+        scaler_state = pickle.dumps(collect_scaler_state(agent.algo))
+        version = (update_counter, scaler_state)
+        if version == self._synced_version:
+            return
+        buffer = np.frombuffer(self._raw_array, dtype=np.uint8)
+        value_list = [param.return_flat_tf_var_values() for param in collect_policy_parameters(agent.algo)]
+        for (offset, size, dtype), val in zip(self._layout, value_list):
+            val = np.ascontiguousarray(val, dtype=dtype).reshape(-1)
+            buffer[offset:offset + val.nbytes] = val.view(np.uint8)
+        for conn in self._conn_list:
+            conn.send(('sync', scaler_state))
+        self._synced_version = version
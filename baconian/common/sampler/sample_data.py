@@ -1,6 +1,5 @@
 from baconian.common.special import *
 from baconian.core.core import EnvSpec
-from copy import deepcopy
 import typeguard as tg
 from baconian.common.error import *
 
@@ -41,6 +40,73 @@ class SampleData(object):
         raise NotImplementedError
 
 
+class DataColumn(object):
+    """
+    A typed, growable column used as the backing store of TransitionData. The underlying array doubles its capacity
+    when it is full, so appending a single sample is O(1) amortized instead of copying the whole column every time.
+    """
+    INIT_CAPACITY = 16
+
+    def __init__(self, shape: (list, tuple), dtype=np.float64, capacity: int = None):
+        self.shape = list(shape)
+        self.dtype = np.dtype(dtype)
+        self._length = 0
+        self._buffer = np.empty([max(int(capacity) if capacity else self.INIT_CAPACITY, 1)] + self.shape,
+                                dtype=self.dtype)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def capacity(self):
+        return self._buffer.shape[0]
+
+    @property
+    def data(self) -> np.ndarray:
+        """ A view on the valid part of the storage, no copy is performed."""
+        return self._buffer[:self._length]
+
+    def append(self, v):
+        if self._length == self.capacity:
+            self._grow(self._length + 1)
+        self._buffer[self._length] = np.reshape(v, self.shape)
+        self._length += 1
+
+    def extend(self, v):
+        v = np.reshape(v, [-1] + self.shape)
+        n = v.shape[0]
+        if self._length + n > self.capacity:
+            self._grow(self._length + n)
+        self._buffer[self._length:self._length + n] = v
+        self._length += n
+
+    def set(self, v):
+        """ Replace the whole content of the column, the dtype of the new data is kept."""
+        v = np.array(v)
+        self.dtype = v.dtype
+        self._buffer = np.reshape(v, [-1] + self.shape)
+        self._length = self._buffer.shape[0]
+
+    def reset(self):
+        # allocate a new buffer so the views returned before are not overwritten by the new samples
+        self._buffer = np.empty([self.INIT_CAPACITY] + self.shape, dtype=self.dtype)
+        self._length = 0
+
+    def get_copy(self):
+        obj = DataColumn(shape=self.shape, dtype=self.dtype, capacity=max(self._length, 1))
+        obj.extend(self.data)
+        return obj
+
+    def _grow(self, min_capacity):
+        # the buffer is empty after setting the column with an empty array
+        new_capacity = max(self.capacity, 1)
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+        new_buffer = np.empty([new_capacity] + self.shape, dtype=self.dtype)
+        new_buffer[:self._length] = self.data
+        self._buffer = new_buffer
+
+
 class TransitionData(SampleData):
     def __init__(self, env_spec: EnvSpec = None, obs_shape=None, action_shape=None):
         super(TransitionData, self).__init__(env_spec=env_spec, obs_shape=obs_shape, action_shape=action_shape)
@@ -53,55 +119,58 @@ class TransitionData(SampleData):
         self.action_shape = list(self.action_shape)
 
         self._internal_data_dict = {
-            'state_set': [np.empty([0] + self.obs_shape), self.obs_shape],
-            'new_state_set': [np.empty([0] + self.obs_shape), self.obs_shape],
-            'action_set': [np.empty([0] + self.action_shape), self.action_shape],
-            'reward_set': [np.empty([0]), []],
-            'done_set': [np.empty([0], dtype=bool), []]
+            'state_set': DataColumn(shape=self.obs_shape, dtype=np.float64),
+            'new_state_set': DataColumn(shape=self.obs_shape, dtype=np.float64),
+            'action_set': DataColumn(shape=self.action_shape, dtype=np.float64),
+            'reward_set': DataColumn(shape=[], dtype=np.float64),
+            'done_set': DataColumn(shape=[], dtype=bool)
         }
         self.current_index = 0
 
     def __len__(self):
-        return len(self._internal_data_dict['state_set'][0])
+        return len(self._internal_data_dict['state_set'])
 
     def __call__(self, set_name, **kwargs):
         if set_name not in self._allowed_data_set_keys:
             raise ValueError('pass in set_name within {} '.format(self._allowed_data_set_keys))
-        return make_batch(self._internal_data_dict[set_name][0],
-                          original_shape=self._internal_data_dict[set_name][1])
+        return make_batch(self._internal_data_dict[set_name].data,
+                          original_shape=self._internal_data_dict[set_name].shape)
 
     def reset(self):
-        for key, data_set in self._internal_data_dict.items():
-            self._internal_data_dict[key][0] = np.empty([0, *self._internal_data_dict[key][1]])
+        for data_set in self._internal_data_dict.values():
+            data_set.reset()
         self.cumulative_reward = 0.0
         self.step_count_per_episode = 0
 
     def append(self, state: np.ndarray, action: np.ndarray, new_state: np.ndarray, done: bool, reward: float):
-        self._internal_data_dict['state_set'][0] = np.concatenate(
-            (self._internal_data_dict['state_set'][0], np.reshape(state, [1] + self.obs_shape)), axis=0)
-        self._internal_data_dict['new_state_set'][0] = np.concatenate(
-            (self._internal_data_dict['new_state_set'][0], np.reshape(new_state, [1] + self.obs_shape)), axis=0)
-        self._internal_data_dict['reward_set'][0] = np.concatenate(
-            (self._internal_data_dict['reward_set'][0], np.reshape(reward, [1])), axis=0)
-        self._internal_data_dict['done_set'][0] = np.concatenate(
-            (self._internal_data_dict['done_set'][0], np.reshape(np.array(done, dtype=bool), [1])), axis=0)
-        self._internal_data_dict['action_set'][0] = np.concatenate(
-            (self._internal_data_dict['action_set'][0], np.reshape(action, [1] + self.action_shape)), axis=0)
+        self._internal_data_dict['state_set'].append(state)
+        self._internal_data_dict['new_state_set'].append(new_state)
+        self._internal_data_dict['reward_set'].append(reward)
+        self._internal_data_dict['done_set'].append(done)
+        self._internal_data_dict['action_set'].append(action)
         self.cumulative_reward += reward
 
+    def append_batch(self, state: np.ndarray, action: np.ndarray, new_state: np.ndarray, done: np.ndarray,
+                     reward: np.ndarray):
+        self._internal_data_dict['state_set'].extend(state)
+        self._internal_data_dict['new_state_set'].extend(new_state)
+        self._internal_data_dict['reward_set'].extend(reward)
+        self._internal_data_dict['done_set'].extend(done)
+        self._internal_data_dict['action_set'].extend(action)
+        self.cumulative_reward += float(np.sum(reward))
+
     def union(self, sample_data):
         assert isinstance(sample_data, type(self))
         self.cumulative_reward += sample_data.cumulative_reward
         self.step_count_per_episode += sample_data.step_count_per_episode
         for key, val in self._internal_data_dict.items():
-            assert self._internal_data_dict[key][1] == sample_data._internal_data_dict[key][1]
-            self._internal_data_dict[key][0] = np.concatenate(
-                (self._internal_data_dict[key][0], sample_data._internal_data_dict[key][0]), axis=0)
+            assert val.shape == sample_data._internal_data_dict[key].shape
+            val.extend(sample_data._internal_data_dict[key].data)
 
     def get_copy(self):
         obj = TransitionData(env_spec=self.env_spec, obs_shape=self.obs_shape, action_shape=self.action_shape)
         for key in self._internal_data_dict:
-            obj._internal_data_dict[key] = deepcopy(self._internal_data_dict[key])
+            obj._internal_data_dict[key] = self._internal_data_dict[key].get_copy()
         return obj
 
     def append_new_set(self, name, data_set: (list, np.ndarray), shape: (tuple, list)):
@@ -109,8 +178,10 @@ class TransitionData(SampleData):
         assert len(np.array(data_set).shape) - 1 == len(shape)
         if len(shape) > 0:
             assert np.equal(np.array(data_set).shape[1:], shape).all()
-        shape = tuple(shape)
-        self._internal_data_dict[name] = [np.array(data_set), shape]
+        data_set = np.array(data_set)
+        column = DataColumn(shape=shape, dtype=data_set.dtype, capacity=len(data_set))
+        column.set(data_set)
+        self._internal_data_dict[name] = column
 
     def sample_batch(self, batch_size, shuffle_flag=True, **kwargs) -> dict:
         if shuffle_flag is False:
@@ -129,28 +200,29 @@ class TransitionData(SampleData):
         return self.apply_op(set_name=set_name, func=np.sum)
 
     def apply_transformation(self, set_name, func, direct_apply=False, **func_kwargs):
-        data = make_batch(self._internal_data_dict[set_name][0],
-                          original_shape=self._internal_data_dict[set_name][1])
+        data = make_batch(self._internal_data_dict[set_name].data,
+                          original_shape=self._internal_data_dict[set_name].shape)
         transformed_data = make_batch(func(data, **func_kwargs),
-                                      original_shape=self._internal_data_dict[set_name][1])
+                                      original_shape=self._internal_data_dict[set_name].shape)
         if transformed_data.shape != data.shape:
             raise TransformationResultedToDifferentShapeError()
         elif direct_apply is True:
-            self._internal_data_dict[set_name][0] = transformed_data
+            self._internal_data_dict[set_name].set(transformed_data)
         return transformed_data
 
     def apply_op(self, set_name, func, **func_kwargs):
-        data = make_batch(self._internal_data_dict[set_name][0],
-                          original_shape=self._internal_data_dict[set_name][1])
+        data = make_batch(self._internal_data_dict[set_name].data,
+                          original_shape=self._internal_data_dict[set_name].shape)
         applied_op_data = np.array(func(data, **func_kwargs))
         return applied_op_data
 
     def shuffle(self, index: list = None):
         if not index:
-            index = np.arange(len(self._internal_data_dict['state_set'][0]))
+            index = np.arange(len(self))
             np.random.shuffle(index)
-        for key in self._internal_data_dict.keys():
-            self._internal_data_dict[key][0] = self._internal_data_dict[key][0][index]
+        for data_set in self._internal_data_dict.values():
+            data_set.set(data_set.data[index])
+
     @property
     def _allowed_data_set_keys(self):
         return list(self._internal_data_dict.keys())
@@ -176,6 +248,63 @@ class TransitionData(SampleData):
         return self('done_set')
 
 
+class PackedTrajectoryData(TransitionData):
+    """
+    The transitions of several trajectories stored back to back in the columns of one TransitionData, with an episode
+    offset index: the trajectory i holds the transitions [episode_offsets[i], episode_offsets[i + 1]). It lets the
+    per-trajectory computations (e.g., GAE) run on whole arrays instead of looping over the trajectories.
+    """
+
+    def __init__(self, env_spec: EnvSpec = None, obs_shape=None, action_shape=None):
+        super(PackedTrajectoryData, self).__init__(env_spec=env_spec, obs_shape=obs_shape, action_shape=action_shape)
+        self.episode_offsets = np.zeros(1, dtype=np.int64)
+
+    @property
+    def episode_num(self) -> int:
+        return len(self.episode_offsets) - 1
+
+    @property
+    def episode_index(self) -> np.ndarray:
+        """ The index of the trajectory each transition belongs to."""
+        return np.repeat(np.arange(self.episode_num), np.diff(self.episode_offsets))
+
+    def reset(self):
+        super(PackedTrajectoryData, self).reset()
+        self.episode_offsets = np.zeros(1, dtype=np.int64)
+
+    def append(self, *args, **kwargs):
+        raise TypeError('PackedTrajectoryData can only be extended by whole trajectories, use append_trajectory')
+
+    def append_batch(self, *args, **kwargs):
+        raise TypeError('PackedTrajectoryData can only be extended by whole trajectories, use append_trajectory')
+
+    def append_trajectory(self, transition_data: TransitionData):
+        for key, val in self._internal_data_dict.items():
+            val.extend(transition_data._internal_data_dict[key].data)
+        self.cumulative_reward += transition_data.cumulative_reward
+        self.episode_offsets = np.append(self.episode_offsets, self.episode_offsets[-1] + len(transition_data))
+
+    def union(self, sample_data):
+        offsets = sample_data.episode_offsets[1:] + len(self)
+        super(PackedTrajectoryData, self).union(sample_data)
+        self.episode_offsets = np.concatenate([self.episode_offsets, offsets])
+
+    def get_copy(self):
+        obj = PackedTrajectoryData(env_spec=self.env_spec, obs_shape=self.obs_shape, action_shape=self.action_shape)
+        for key in self._internal_data_dict:
+            obj._internal_data_dict[key] = self._internal_data_dict[key].get_copy()
+        obj.cumulative_reward = self.cumulative_reward
+        obj.episode_offsets = np.array(self.episode_offsets)
+        return obj
+
+    def shuffle(self, index: list = None):
+        raise TypeError('shuffling the transitions breaks the trajectories of PackedTrajectoryData')
+
+    def split(self, set_name) -> list:
+        """ Return the data set of each trajectory, as views on the packed data."""
+        return np.split(self(set_name), self.episode_offsets[1:-1])
+
+
 class TrajectoryData(SampleData):
     def __init__(self, env_spec=None, obs_shape=None, action_shape=None):
         super(TrajectoryData, self).__init__(env_spec=env_spec, obs_shape=obs_shape, action_shape=action_shape)
@@ -200,13 +329,32 @@ class TrajectoryData(SampleData):
             transition_set.shuffle()
         return transition_set
 
+    def return_as_packed_data(self) -> PackedTrajectoryData:
+        """
+        Pack all the trajectories into a PackedTrajectoryData, every data set held by all the trajectories is
+        concatenated once.
+        """
+        packed = PackedTrajectoryData(env_spec=self.env_spec, obs_shape=self.obs_shape, action_shape=self.action_shape)
+        if len(self.trajectories) == 0:
+            return packed
+        key_list = [key for key in self.trajectories[0]._internal_data_dict.keys()
+                    if all(key in traj._internal_data_dict for traj in self.trajectories)]
+        for key in key_list:
+            column = self.trajectories[0]._internal_data_dict[key]
+            packed_column = DataColumn(shape=column.shape, dtype=column.dtype, capacity=1)
+            packed_column.set(np.concatenate([traj._internal_data_dict[key].data for traj in self.trajectories],
+                                             axis=0))
+            packed._internal_data_dict[key] = packed_column
+        packed.cumulative_reward = sum([traj.cumulative_reward for traj in self.trajectories])
+        packed.episode_offsets = np.concatenate([[0], np.cumsum([len(traj) for traj in self.trajectories])]).astype(
+            np.int64)
+        return packed
+
     def get_mean_of(self, set_name):
-        tran = self.return_as_transition_data()
-        return tran.get_mean_of(set_name)
+        return self.return_as_packed_data().get_mean_of(set_name)
 
     def get_sum_of(self, set_name):
-        tran = self.return_as_transition_data()
-        return tran.get_sum_of(set_name)
+        return self.return_as_packed_data().get_sum_of(set_name)
 
     def __len__(self):
         return len(self.trajectories)
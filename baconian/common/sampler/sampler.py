@@ -1,5 +1,7 @@
 from baconian.core.core import Basic, Env
 from baconian.common.sampler.sample_data import TransitionData, TrajectoryData
+from baconian.envs.gym_env import GymEnv, make
+from baconian.common.profiler import Profiler, profile_decorator
 from typeguard import typechecked
 import numpy as np
 
@@ -10,6 +12,7 @@ class Sampler(object):
     """
 
     @staticmethod
+    @profile_decorator('sampler_sample')
     @typechecked
     def sample(env: Env,
                agent,
@@ -48,6 +51,21 @@ class Sampler(object):
         else:
             raise ValueError()
 
+    def init(self, agent):
+        """
+        Build what the sampler needs from the agent (e.g., tf ops) before the graph can be finalized, called by
+        Agent.init after the algorithm is initialized.
+
+        :param agent: agent that uses this sampler
+        """
+        pass
+
+    def close(self):
+        """
+        Release the resources (e.g., worker processes) held by the sampler, called when the experiment exits.
+        """
+        pass
+
     @staticmethod
     def _sample_transitions(env: Env, agent, sample_count, init_state):
         state = init_state
@@ -55,7 +73,8 @@ class Sampler(object):
 
         for i in range(sample_count):
             action = agent.predict(obs=state)
-            new_state, re, done, info = env.step(action)
+            with Profiler().timer('env_step'):
+                new_state, re, done, info = env.step(action)
             if not isinstance(done, bool):
                 raise TypeError()
             sample_record.append(state=state,
@@ -79,7 +98,8 @@ class Sampler(object):
             traj_record = TransitionData(env.env_spec)
             while done is not True:
                 action = agent.predict(obs=state)
-                new_state, re, done, info = env.step(action)
+                with Profiler().timer('env_step'):
+                    new_state, re, done, info = env.step(action)
                 if not isinstance(done, bool):
                     raise TypeError()
                 traj_record.append(state=state,
@@ -93,3 +113,138 @@ class Sampler(object):
             state = env.reset()
             sample_record.append(traj_record)
         return sample_record
+
+
+class VectorizedSampler(Sampler):
+    """
+    Sampler that steps several copies of a gym environment in lockstep. The observations of all the copies are stacked
+    into one batch and the agent is queried once per tick with batch_flag=True, so the cost of one prediction
+    (e.g., a tf.Session.run) is shared by all the copies.
+
+    The environment passed into sample() is used as the first copy, the other env_num - 1 copies are created by
+    baconian.envs.gym_env.make with the same gym env id at the first call. Their steps and the agent predictions are
+    credited to the status of the passed in env and the agent, so the global status counters stay correct.
+    """
+
+    @typechecked
+    def __init__(self, env_num: int):
+        """
+
+        :param env_num: number of environment copies stepped in lockstep, including the one passed into sample()
+        :type env_num: int
+        """
+        if env_num < 1:
+            raise ValueError('env_num should be at least 1, got {}'.format(env_num))
+        self.env_num = env_num
+        self.env_list = []
+        self._state_list = []
+
+    @profile_decorator('sampler_sample')
+    @typechecked
+    def sample(self,
+               env: GymEnv,
+               agent,
+               sample_count: int,
+               sample_type='transition',
+               reset_at_start=None) -> (TransitionData, TrajectoryData):
+        """
+        sample function, see Sampler.sample for the meaning of the parameters.
+
+        :return: SampleData object.
+        """
+        self._set_up_env_list(env)
+        if reset_at_start is True or (reset_at_start is None and sample_type == 'trajectory'):
+            self._state_list = [e.reset() for e in self.env_list]
+        elif reset_at_start is False or (reset_at_start is None and sample_type == 'transition'):
+            self._state_list = [env.get_state()] + [st if st is not None else e.reset() for e, st in
+                                                    zip(self.env_list[1:], self._state_list[1:])]
+        else:
+            raise ValueError()
+        if sample_type == 'transition':
+            return self._sample_transitions(env, agent, sample_count, self._state_list)
+        elif sample_type == 'trajectory':
+            return self._sample_trajectories(env, agent, sample_count, self._state_list)
+        else:
+            raise ValueError()
+
+    def _set_up_env_list(self, env: GymEnv):
+        if len(self.env_list) == 0 or self.env_list[0] is not env:
+            self.env_list = [env] + [make(env.env_id) for _ in range(self.env_num - 1)]
+            self._state_list = [None for _ in range(self.env_num)]
+        for e in self.env_list[1:]:
+            e.set_status(env.get_status()['status'])
+
+    def _sample_transitions(self, env: GymEnv, agent, sample_count, init_state_list):
+        state_list = init_state_list
+        sample_record = TransitionData(env_spec=env.env_spec)
+        replica_step_count = 0
+        while len(sample_record) < sample_count:
+            active_num = min(self.env_num, sample_count - len(sample_record))
+            action_list = self._batch_predict(agent, state_list[:active_num])
+            for i in range(active_num):
+                with Profiler().timer('env_step'):
+                    new_state, re, done, info = self.env_list[i].step(action_list[i])
+                if not isinstance(done, bool):
+                    raise TypeError()
+                sample_record.append(state=state_list[i],
+                                     action=action_list[i],
+                                     reward=re,
+                                     new_state=new_state,
+                                     done=done)
+                if done:
+                    state_list[i] = self.env_list[i].reset()
+                    agent.reset_on_terminal_state()
+                else:
+                    state_list[i] = new_state
+            replica_step_count += active_num - 1
+        self._credit_replica_steps(env, replica_step_count)
+        return sample_record
+
+    def _sample_trajectories(self, env: GymEnv, agent, sample_count, init_state_list):
+        state_list = init_state_list
+        sample_record = TrajectoryData(env.env_spec)
+        traj_record_list = [TransitionData(env.env_spec) for _ in range(self.env_num)]
+        # only start as many trajectories as requested
+        active_index = list(range(min(self.env_num, sample_count)))
+        started_count = len(active_index)
+        replica_step_count = 0
+        while len(active_index) > 0:
+            action_list = self._batch_predict(agent, [state_list[i] for i in active_index])
+            finished_index = []
+            for i, action in zip(active_index, action_list):
+                with Profiler().timer('env_step'):
+                    new_state, re, done, info = self.env_list[i].step(action)
+                if not isinstance(done, bool):
+                    raise TypeError()
+                traj_record_list[i].append(state=state_list[i],
+                                           action=action,
+                                           reward=re,
+                                           new_state=new_state,
+                                           done=done)
+                if i != 0:
+                    replica_step_count += 1
+                state_list[i] = new_state
+                if done:
+                    agent.reset_on_terminal_state()
+                    state_list[i] = self.env_list[i].reset()
+                    sample_record.append(traj_record_list[i])
+                    traj_record_list[i] = TransitionData(env.env_spec)
+                    if started_count < sample_count:
+                        started_count += 1
+                    else:
+                        finished_index.append(i)
+            active_index = [i for i in active_index if i not in finished_index]
+        self._credit_replica_steps(env, replica_step_count)
+        return sample_record
+
+    def _batch_predict(self, agent, state_list):
+        action_list = agent.predict(obs=np.array(state_list), batch_flag=True)
+        # one predict call was made for the whole batch, count the rest samples into agent's predict counter
+        if len(state_list) > 1 and hasattr(agent, '_status'):
+            agent._status.update_info(info_key='predict_counter', increment=len(state_list) - 1)
+        return action_list
+
+    @staticmethod
+    def _credit_replica_steps(env: GymEnv, replica_step_count):
+        if replica_step_count > 0:
+            env._status.update_info(info_key='step', increment=replica_step_count)
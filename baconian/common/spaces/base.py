@@ -47,7 +47,11 @@ class Space:
         """
         raise NotImplementedError
 
-    def clip(self, x):
+    def clip(self, x, batch_flag=False):
+        """
+        :param x: a point, or a batch of points if batch_flag is True
+        :param batch_flag: x is a batch, the batch dimension is kept
+        """
         raise NotImplementedError
 
     def bound(self):
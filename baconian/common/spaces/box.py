@@ -74,7 +74,9 @@ class Box(Space):
     def new_tensor_variable(self, name, extra_dims):
         raise NotImplementedError
 
-    def clip(self, x):
+    def clip(self, x, batch_flag=False):
+        if batch_flag is True:
+            return np.clip(x, self.low, self.high).reshape((-1,) + self.shape)
         return np.clip(x, self.low, self.high).reshape(self.shape)
 
     def bound(self):
@@ -70,7 +70,9 @@ class Discrete(Space):
     def new_tensor_variable(self, name, extra_dims):
         raise NotImplementedError
 
-    def clip(self, x):
+    def clip(self, x, batch_flag=False):
+        if batch_flag is True:
+            return np.array([self.clip(x_i) for x_i in np.reshape(x, [-1])])
         x = np.asarray(x).astype(np.int)
         assert x.shape == ()
         if self.contains(x):
@@ -59,11 +59,19 @@ class _SingletonDefaultGlobalConfig(object):
     DEFAULT_WRITE_CONSOLE_LOG_TO_FILE_FLAG = True
     DEFAULT_CONSOLE_LOG_FILE_NAME = 'console.log'
     DEFAULT_CONSOLE_LOGGER_NAME = 'console_logger'
+    DEFAULT_ASYNC_CONSOLE_LOG_FLAG = False
+    DEFAULT_LOGGING_QUEUE_SIZE = 10000
+    DEFAULT_LOGGING_QUEUE_FULL_POLICY = 'block'
+    DEFAULT_CPROFILE_FILE_NAME = 'profile.prof'
+    DEFAULT_TRACEMALLOC_FILE_NAME = 'tracemalloc.txt'
+    DEFAULT_TRACEMALLOC_FRAME_NUM = 25
     DEFAULT_EXPERIMENT_END_POINT = dict(TOTAL_AGENT_TRAIN_SAMPLE_COUNT=500,
                                         TOTAL_AGENT_TEST_SAMPLE_COUNT=None,
                                         TOTAL_AGENT_UPDATE_COUNT=None)
 
     DEFAULT_TURN_OFF_GLOBAL_NAME_FLAG = False
+    # debug mode, finalize the tf graph after the experiment is initialized so any op created during training raises
+    DEFAULT_FINALIZE_TF_GRAPH_FLAG = False
 
     # For internal use
     SAMPLE_TYPE_SAMPLE_TRANSITION_DATA = 'transition_data'
@@ -15,6 +15,7 @@ from baconian.common.sampler.sample_data import TransitionData, TrajectoryData
 from baconian.common.schedules import EventScheduler
 from baconian.common.noise import AgentActionNoiseWrapper
 from baconian.core.parameters import Parameters
+from baconian.common.profiler import Profiler, profile_decorator
 
 
 class Agent(Basic):
@@ -90,7 +91,8 @@ class Agent(Basic):
         self.algo.set_status('TRAIN')
         ConsoleLogger().print('info', 'train agent:')
         try:
-            res = self.algo.train(*args, **kwargs)
+            with Profiler().timer('algo_train'):
+                res = self.algo.train(*args, **kwargs)
         except MemoryBufferLessThanBatchSizeError as e:
             ConsoleLogger().print('warning', 'memory buffer did not have enough data to train, skip training')
             return False
@@ -122,6 +124,7 @@ class Agent(Basic):
         #print("Trajectory:", self.env._gym_env.env.trajectory_data)
         return res
 
+    @profile_decorator('agent_predict')
     @register_counter_info_to_status_decorator(increment=1, info_key='predict_counter', under_status=('TRAIN', 'TEST'),
                                                ignore_wrong_status=True)
     def predict(self, **kwargs):
@@ -137,7 +140,10 @@ class Agent(Basic):
             res = self.explorations_strategy.predict(**kwargs, algo=self.algo)
         else:
             if self.noise_adder and not self.is_testing:
-                res = self.env_spec.action_space.clip(self.noise_adder(self.algo.predict(**kwargs)))
+                batch_flag = kwargs['batch_flag'] if 'batch_flag' in kwargs else False
+                res = self.env_spec.action_space.clip(self.noise_adder(self.algo.predict(**kwargs),
+                                                                       batch_flag=batch_flag),
+                                                      batch_flag=batch_flag)
             else:
                 res = self.algo.predict(**kwargs)
         self.recorder.append_to_obj_log(obj=self, attr_name='action', status_info=self.get_status(), value=res)
@@ -192,6 +198,7 @@ class Agent(Basic):
         Initialize the algorithm, and set status to 'INITED'.
         """
         self.algo.init()
+        self.sampler.init(agent=self)
         self.set_status('INITED')
         self.algo.warm_up(trajectory_data=self.sampler.sample(env=self.env,
                                                               agent=self,
@@ -217,7 +224,7 @@ class Agent(Basic):
         :return: true if the agent is training
         :rtype: bool
         """
-        return self.get_status()['status'] == 'TRAIN'
+        return self._status.status_val == 'TRAIN'
 
     @property
     def is_testing(self):
@@ -227,4 +234,4 @@ class Agent(Basic):
         :return: true if the agent is testing
         :rtype: bool
         """
-        return self.get_status()['status'] == 'TEST'
+        return self._status.status_val == 'TEST'
@@ -22,6 +22,8 @@ from baconian.core.status import *
 from baconian.core.flow.train_test_flow import Flow
 from baconian.core.global_var import reset_all as reset_global_var
 from baconian.common.logging import reset_logging
+from baconian.common.profiler import Profiler
+import traceback
 
 
 class Experiment(Basic):
@@ -91,10 +93,13 @@ class Experiment(Basic):
                                                                  return_name='TOTAL_ENV_STEP_TRAIN_SAMPLE_COUNT')
 
     def init(self):
-        """ Create a new TensorFlow session, and set status to 'INITED'."""
+        """ Create a new TensorFlow session, and set status to 'INITED'. If GlobalConfig().DEFAULT_FINALIZE_TF_GRAPH_FLAG
+        is True, the graph is finalized after the initialization, every op should have been built by then."""
         create_new_tf_session()
         self.agent.init()
         self.env.init()
+        if GlobalConfig().DEFAULT_FINALIZE_TF_GRAPH_FLAG is True:
+            tf.get_default_graph().finalize()
         self.set_status('INITED')
 
 
@@ -106,7 +111,16 @@ class Experiment(Basic):
         if load_model:
             self.agent.algo.load(global_step=0, sess=tf.get_default_session(), path_to_model='/home/eia17mdw/HR_baconian_examples_S2/benchmark_log/arm-extrahard-v0/dyna/2021-04-20_00-10-17/exp_0/model_checkpoints/', model_name='Dyna_Test') ###
         self.set_status('RUNNING')
-        res = self.flow.launch()
+        try:
+            res = self.flow.launch()
+        except RuntimeError as e:
+            # only the error raised by tf when an op is added to the finalized graph is handled
+            if not tf.get_default_graph().finalized or 'Graph is finalized' not in str(e):
+                raise
+            # report where the graph grows during training
+            ConsoleLogger().print('error', 'op created after the tf graph was finalized:\n{}'.format(
+                traceback.format_exc()))
+            res = False
         if res is False:
             self.set_status('CORRUPTED')
         else:
@@ -118,11 +132,15 @@ class Experiment(Basic):
 
     def _exit(self):
         """ Exit the experiment, reset global configurations and logging module."""
+        self.agent.sampler.close()
         sess = tf.get_default_session()
         if sess:
             sess.__exit__(None, None, None)
         tf.reset_default_graph()
         reset_global_status_collect()
+        if Profiler().enabled is True:
+            # the timings are written out by the Logger together with the other records
+            Profiler().record()
         reset_logging()
         reset_global_var()
         GlobalConfig().unfreeze()
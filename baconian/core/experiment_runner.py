@@ -1,3 +1,4 @@
+import cProfile
 import os
 import random
 import time
@@ -9,6 +10,7 @@ from typeguard import typechecked
 
 from baconian.common import files as file
 from baconian.common.logging import Logger, ConsoleLogger
+from baconian.common.profiler import Profiler
 from baconian.config.global_config import GlobalConfig
 from copy import deepcopy
 import tracemalloc
@@ -30,8 +32,12 @@ def _reset_global_seed(seed):
     random.seed(seed)
 
 
+PROFILE_MODE_LIST = ('tracemalloc', 'cprofile')
+
+
 @typechecked
 def single_exp_runner(task_fn, auto_choose_gpu_flag=False, gpu_id: int = 0, seed=None, del_if_log_path_existed=False,
+                      profile_flag: bool = False, profile_mode: str = None,
                       **task_fn_kwargs):
 
     """
@@ -46,11 +52,19 @@ def single_exp_runner(task_fn, auto_choose_gpu_flag=False, gpu_id: int = 0, seed
     :type seed: int
     :param del_if_log_path_existed:delete obsolete log file path if existed, by default False
     :type del_if_log_path_existed: bool
+    :param profile_flag: time the hot paths of the experiment per flow stage, see baconian.common.profiler
+    :type profile_flag: bool
+    :param profile_mode: None, 'tracemalloc' to also trace the memory allocations (the traced memory at the end of
+                            every stage and the top allocation sites are saved) or 'cprofile' to run the whole task under
+                            cProfile (the stats are dumped into the log path)
+    :type profile_mode: str
     :param task_fn_kwargs:
     :type task_fn_kwargs:
     :return:
     :rtype:
     """
+    if profile_mode is not None and profile_mode not in PROFILE_MODE_LIST:
+        raise ValueError('profile_mode {} not in {}'.format(profile_mode, PROFILE_MODE_LIST))
     os.environ['CUDA_DEVICE_ORDER'] = "PCI_BUS_ID"
     if auto_choose_gpu_flag is True:
         DEVICE_ID_LIST = Gpu.getFirstAvailable()
@@ -64,16 +78,43 @@ def single_exp_runner(task_fn, auto_choose_gpu_flag=False, gpu_id: int = 0, seed
     print("create log path at {}".format(GlobalConfig().DEFAULT_LOG_PATH), flush=True)
 
     file.create_path(path=GlobalConfig().DEFAULT_LOG_PATH, del_if_existed=del_if_log_path_existed)
-    Logger().init(config_or_config_dict=dict(),
+    Logger().init(config_or_config_dict=GlobalConfig().DEFAULT_LOG_CONFIG_DICT,
                   log_path=GlobalConfig().DEFAULT_LOG_PATH,
                   log_level=GlobalConfig().DEFAULT_LOG_LEVEL)
     ConsoleLogger().init(to_file_flag=GlobalConfig().DEFAULT_WRITE_CONSOLE_LOG_TO_FILE_FLAG,
                          to_file_name=os.path.join(GlobalConfig().DEFAULT_LOG_PATH,
                                                    GlobalConfig().DEFAULT_CONSOLE_LOG_FILE_NAME),
                          level=GlobalConfig().DEFAULT_LOG_LEVEL,
-                         logger_name=GlobalConfig().DEFAULT_CONSOLE_LOGGER_NAME)
-
-    task_fn(**task_fn_kwargs)
+                         logger_name=GlobalConfig().DEFAULT_CONSOLE_LOGGER_NAME,
+                         async_flag=GlobalConfig().DEFAULT_ASYNC_CONSOLE_LOG_FLAG,
+                         queue_size=GlobalConfig().DEFAULT_LOGGING_QUEUE_SIZE,
+                         queue_full_policy=GlobalConfig().DEFAULT_LOGGING_QUEUE_FULL_POLICY)
+    if profile_flag is True or profile_mode is not None:
+        Profiler().enable()
+    log_path = GlobalConfig().DEFAULT_LOG_PATH
+    profile = None
+    if profile_mode == 'tracemalloc':
+        tracemalloc.start(GlobalConfig().DEFAULT_TRACEMALLOC_FRAME_NUM)
+    elif profile_mode == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        task_fn(**task_fn_kwargs)
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(os.path.join(log_path, GlobalConfig().DEFAULT_CPROFILE_FILE_NAME))
+        if tracemalloc.is_tracing():
+            _save_tracemalloc_top_stats(file_path=os.path.join(log_path, GlobalConfig().DEFAULT_TRACEMALLOC_FILE_NAME))
+            tracemalloc.stop()
+        Profiler().reset()
+
+
+def _save_tracemalloc_top_stats(file_path: str, top_num: int = 50):
+    snapshot = tracemalloc.take_snapshot()
+    with open(file_path, 'w') as f:
+        for stat in snapshot.statistics('lineno')[:top_num]:
+            f.write('{}\n'.format(stat))
 
 
 @typechecked
@@ -100,7 +141,6 @@ def duplicate_exp_runner(num, task_fn, auto_choose_gpu_flag=False, gpu_id: int =
     :return:
     :rtype:
     """
-    # tracemalloc.start(100)
     if seeds:
         assert len(seeds) == num
     base_log_path = deepcopy(GlobalConfig().DEFAULT_LOG_PATH)
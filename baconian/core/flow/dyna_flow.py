@@ -1,6 +1,4 @@
 from baconian.core.flow.train_test_flow import Flow
-from baconian.config.global_config import GlobalConfig
-from baconian.common.logging import ConsoleLogger
 from baconian.config.dict_config import DictConfig
 from baconian.common.misc import *
 from baconian.core.parameters import Parameters
@@ -100,30 +98,6 @@ class DynaFlow(Flow):
                 break
         return True
 
-    def _is_ended(self):
-        """
-
-        :return: True if an experiment is ended
-        :rtype: bool
-        """
-        key_founded_flag = False
-        finished_flag = False
-        for key in GlobalConfig().DEFAULT_EXPERIMENT_END_POINT:
-            if GlobalConfig().DEFAULT_EXPERIMENT_END_POINT[key] is not None:
-                key_founded_flag = True
-                if get_global_status_collect()(key) >= GlobalConfig().DEFAULT_EXPERIMENT_END_POINT[key]:
-                    ConsoleLogger().print('info',
-                                          'pipeline ended because {}: {} >= end point value {}'.
-                                          format(key, get_global_status_collect()(key),
-                                                 GlobalConfig().DEFAULT_EXPERIMENT_END_POINT[key]))
-                    finished_flag = True
-        if key_founded_flag is False:
-            ConsoleLogger().print(
-                'warning',
-                '{} in experiment_end_point is not registered with global status collector: {}, experiment may not end'.
-                    format(GlobalConfig().DEFAULT_EXPERIMENT_END_POINT, list(get_global_status_collect()().keys())))
-        return finished_flag
-
 
 def create_dyna_flow(train_algo_func, train_algo_from_synthesized_data_func,
                      train_dynamics_func, test_algo_func, test_dynamics_func, sample_from_real_env_func,
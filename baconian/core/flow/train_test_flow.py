@@ -6,6 +6,7 @@ from baconian.common.misc import *
 from baconian.core.parameters import Parameters
 from baconian.core.status import *
 from baconian.common.error import *
+from baconian.common.profiler import Profiler
 
 
 class Flow(object):
@@ -61,12 +62,41 @@ class Flow(object):
         """
 
         if self.func_dict[key]:
-            return self.func_dict[key]['func'](*self.func_dict[key]['args'],
-                                               **extra_kwargs,
-                                               **self.func_dict[key]['kwargs'])
+            with Profiler().stage(key):
+                return self.func_dict[key]['func'](*self.func_dict[key]['args'],
+                                                   **extra_kwargs,
+                                                   **self.func_dict[key]['kwargs'])
         else:
             return None
 
+    def _is_ended(self):
+        """
+
+        :return: True if an experiment is ended
+        :rtype: bool
+        """
+        end_point_dict = {key: val for key, val in GlobalConfig().DEFAULT_EXPERIMENT_END_POINT.items() if
+                          val is not None}
+        if len(end_point_dict) == 0:
+            ConsoleLogger().print(
+                'warning',
+                '{} in experiment_end_point is not registered with global status collector: {}, experiment may not end'.
+                    format(GlobalConfig().DEFAULT_EXPERIMENT_END_POINT, list(get_global_status_collect()().keys())))
+            return False
+        # read all the end point counters at once
+        status = get_global_status_collect().snapshot(keys=list(end_point_dict.keys()))
+        finished_flag = False
+        for key, end_point in end_point_dict.items():
+            if key not in status:
+                raise StatusInfoNotRegisteredError('end point {} is not registered with global status collector'.
+                                                   format(key))
+            if status[key] is not None and status[key] >= end_point:
+                ConsoleLogger().print('info',
+                                      'pipeline ended because {}: {} >= end point value {}'.
+                                      format(key, status[key], end_point))
+                finished_flag = True
+        return finished_flag
+
 
 class TrainTestFlow(Flow):
     """
@@ -115,43 +145,22 @@ class TrainTestFlow(Flow):
         """
         while True:
             self._call_func('sample')
-            if self.time_step_func() - self.parameters('TRAIN_EVERY_SAMPLE_COUNT') >= self.last_train_point and \
-                    self.time_step_func() > self.parameters('START_TRAIN_AFTER_SAMPLE_COUNT'):
-                self.last_train_point = self.time_step_func()
+            time_step = self.time_step_func()
+            if time_step - self.parameters('TRAIN_EVERY_SAMPLE_COUNT') >= self.last_train_point and \
+                    time_step > self.parameters('START_TRAIN_AFTER_SAMPLE_COUNT'):
+                self.last_train_point = time_step
                 self._call_func('train')
-            if self.time_step_func() - self.parameters('TEST_EVERY_SAMPLE_COUNT') >= self.last_test_point and \
-                    self.time_step_func() > self.parameters('START_TEST_AFTER_SAMPLE_COUNT'):
-                self.last_test_point = self.time_step_func()
+                # training may sample as well
+                time_step = self.time_step_func()
+            if time_step - self.parameters('TEST_EVERY_SAMPLE_COUNT') >= self.last_test_point and \
+                    time_step > self.parameters('START_TEST_AFTER_SAMPLE_COUNT'):
+                self.last_test_point = time_step
                 self._call_func('test')
 
             if self._is_ended() is True:
                 break
         return True
 
-    def _is_ended(self):
-        """
-
-        :return: True if an experiment is ended
-        :rtype: bool
-        """
-        key_founded_flag = False
-        finished_flag = False
-        for key in GlobalConfig().DEFAULT_EXPERIMENT_END_POINT:
-            if GlobalConfig().DEFAULT_EXPERIMENT_END_POINT[key] is not None:
-                key_founded_flag = True
-                if get_global_status_collect()(key) >= GlobalConfig().DEFAULT_EXPERIMENT_END_POINT[key]:
-                    ConsoleLogger().print('info',
-                                          'pipeline ended because {}: {} >= end point value {}'.
-                                          format(key, get_global_status_collect()(key),
-                                                 GlobalConfig().DEFAULT_EXPERIMENT_END_POINT[key]))
-                    finished_flag = True
-        if key_founded_flag is False:
-            ConsoleLogger().print(
-                'warning',
-                '{} in experiment_end_point is not registered with global status collector: {}, experiment may not end'.
-                    format(GlobalConfig().DEFAULT_EXPERIMENT_END_POINT, list(get_global_status_collect()().keys())))
-        return finished_flag
-
 
 def create_train_test_flow(test_every_sample_count, train_every_sample_count, start_train_after_sample_count,
                            start_test_after_sample_count, train_func_and_args, test_func_and_args, sample_func_and_args,
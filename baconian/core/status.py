@@ -48,6 +48,13 @@ class Status(object):
     def get_status(self) -> dict:
         return self()
 
+    @property
+    def status_val(self) -> str:
+        """
+        The current status, same as get_status()['status'] without building the status dict.
+        """
+        return self._status_val
+
 
 class StatusWithInfo(Status):
     @abc.abstractmethod
@@ -70,6 +77,10 @@ class StatusWithInfo(Status):
     def get_specific_info_key_status(self, info_key, *args, **kwargs):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
 
 class StatusWithSingleInfo(StatusWithInfo):
     def __init__(self, obj):
@@ -107,10 +118,16 @@ class StatusWithSingleInfo(StatusWithInfo):
         return info_key in self._info_dict
 
     def update_info(self, info_key, increment, under_status=None):
-        if not self.has_info(info_key=info_key):
+        if info_key not in self._info_dict:
             self.append_new_info(info_key=info_key, init_value=0)
         self._info_dict[info_key] += increment
 
+    def snapshot(self) -> dict:
+        """
+        Return a copy of all the info, without the status.
+        """
+        return dict(self._info_dict)
+
     def reset(self):
         self._info_dict = {}
 
@@ -183,11 +200,16 @@ class StatusWithSubInfo(StatusWithInfo):
         return info_key in self._info_dict_with_sub_info[under_status]
 
     def update_info(self, info_key, increment, under_status=None):
-        if not under_status:
-            under_status = self._status_val
-        if not self.has_info(info_key=info_key, under_status=under_status):
+        info_dict = self._info_dict_with_sub_info[under_status if under_status else self._status_val]
+        if info_key not in info_dict:
             self.append_new_info(info_key=info_key, init_value=0, under_status=under_status)
-        self._info_dict_with_sub_info[under_status][info_key] += increment
+        info_dict[info_key] += increment
+
+    def snapshot(self) -> dict:
+        """
+        Return a copy of the info under every status, as {status: {info_key: value}}.
+        """
+        return {key: dict(val) for key, val in self._info_dict_with_sub_info.items()}
 
     def reset(self):
         for key in self._status_list:
@@ -195,55 +217,62 @@ class StatusWithSubInfo(StatusWithInfo):
 
 
 class StatusCollector(object):
+    """
+    Collect the info of several objects' status under global names (return_name), e.g., the total train samples of an
+    agent. The registered entries are indexed by their return_name, so a lookup does not scan the other entries.
+    """
 
     def __init__(self):
-        self._register_status_dict = []
+        self._register_status_dict = dict()
 
     def __call__(self, key: str = None, *args, **kwargs):
         if key:
-            for val in self._register_status_dict:
-                if val['return_name'] == key:
-                    obj = val['obj']
-                    assert hasattr(obj, '_status')
-                    assert isinstance(getattr(obj, '_status'), StatusWithInfo)
-                    if getattr(obj, '_status').has_info(info_key=val['info_key'],
-                                                        under_status=val['under_status']) is False:
-                        raise StatusInfoNotRegisteredError(
-                            '{} do not have {} under {}'.format(obj, val['info_key'], val['under_status']))
-
-                    res = obj._status.get_specific_info_key_status(under_status=val['under_status'],
-                                                                   info_key=val['info_key'])
-                    return res
+            if key not in self._register_status_dict:
+                return None
+            return self._get_registered_info(self._register_status_dict[key])
         else:
-            stat_dict = dict()
-            for val in self._register_status_dict:
-                obj = val['obj']
-                assert hasattr(obj, '_status')
-                assert isinstance(getattr(obj, '_status'), StatusWithInfo)
-                if getattr(obj, '_status').has_info(info_key=val['info_key'],
-                                                    under_status=val['under_status']) is False:
-                    raise StatusInfoNotRegisteredError(
-                        '{} do not have {} under {}'.format(obj, val['info_key'], val['under_status']))
-
-                res = obj._status.get_specific_info_key_status(under_status=val['under_status'],
-                                                               info_key=val['info_key'])
-                stat_dict[val['return_name']] = res
-            return stat_dict
+            return {return_name: self._get_registered_info(val) for return_name, val in
+                    self._register_status_dict.items()}
 
     def get_status(self) -> dict:
         return self()
 
+    def snapshot(self, keys: (list, tuple) = None) -> dict:
+        """
+        Return the current value of the given return names (all the registered ones if None) in one pass. Different
+        from __call__, an info that has not been created yet by its object is returned as None instead of raising
+        StatusInfoNotRegisteredError, and a name that is not registered is skipped.
+
+        :param keys: return names to read
+        :type keys: list or tuple
+        :return: dict of {return_name: value}
+        :rtype: dict
+        """
+        if keys is None:
+            keys = self._register_status_dict.keys()
+        res = dict()
+        for key in keys:
+            if key in self._register_status_dict:
+                val = self._register_status_dict[key]
+                status = val['obj']._status
+                res[key] = status.get_specific_info_key_status(under_status=val['under_status'],
+                                                               info_key=val['info_key']) \
+                    if status.has_info(info_key=val['info_key'], under_status=val['under_status']) else None
+        return res
+
     def register_info_key_status(self, obj, info_key: str, return_name: str, under_status=None):
         ConsoleLogger().print('info',
                               'registered obj: {}, key: {}, return name: {}, under status: {}'.format(obj, info_key,
                                                                                                       return_name,
                                                                                                       under_status))
-        for val in self._register_status_dict:
-            assert return_name != val['return_name']
-        self._register_status_dict.append(
-            dict(obj=obj, info_key=info_key, under_status=under_status, return_name=return_name))
+        if not isinstance(getattr(obj, '_status', None), StatusWithInfo):
+            raise TypeError('obj {} should hold a StatusWithInfo instance as _status'.format(obj))
+        if return_name in self._register_status_dict:
+            raise ValueError('return name {} is already registered'.format(return_name))
+        self._register_status_dict[return_name] = dict(obj=obj, info_key=info_key, under_status=under_status,
+                                                       return_name=return_name)
         try:
-            self(info_key)
+            self(return_name)
         except StatusInfoNotRegisteredError as e:
             ConsoleLogger().print('warning',
                                   'new registred info: obj: {}, key: {}, return name: {}, under status: {} can not be detected now'.format(
@@ -252,7 +281,15 @@ class StatusCollector(object):
                                       under_status))
 
     def reset(self):
-        self._register_status_dict = []
+        self._register_status_dict = dict()
+
+    @staticmethod
+    def _get_registered_info(val: dict):
+        obj_status = val['obj']._status
+        if obj_status.has_info(info_key=val['info_key'], under_status=val['under_status']) is False:
+            raise StatusInfoNotRegisteredError(
+                '{} do not have {} under {}'.format(val['obj'], val['info_key'], val['under_status']))
+        return obj_status.get_specific_info_key_status(under_status=val['under_status'], info_key=val['info_key'])
 
 
 def register_counter_info_to_status_decorator(increment, info_key, under_status: (str, tuple) = None,
@@ -277,18 +314,19 @@ def register_counter_info_to_status_decorator(increment, info_key, under_status:
                     ' the object {} does not not have attribute StatusWithInfo instance or hold wrong type of Status'.format(
                         obj))
 
-            assert isinstance(getattr(obj, '_status'), StatusWithInfo)
             obj_status = getattr(obj, '_status')
             for st in final_st:
-                obj_status.append_new_info(info_key=info_key, init_value=0, under_status=st)
+                if not obj_status.has_info(info_key=info_key, under_status=st):
+                    obj_status.append_new_info(info_key=info_key, init_value=0, under_status=st)
             res = fn(self, *args, **kwargs)
-            for st in final_st:
-                if st and st != obj.get_status()['status'] and not ignore_wrong_status:
-                    raise ValueError('register counter info under status: {} but got status {}'.format(st,
-                                                                                                       obj.get_status()[
-                                                                                                           'status']))
-            obj_status.update_info(info_key=info_key, increment=increment,
-                                   under_status=obj.get_status()['status'])
+            # read the status value directly, get_status() builds a new dict with all the info on every call
+            status_val = obj_status.status_val
+            if not ignore_wrong_status:
+                for st in final_st:
+                    if st and st != status_val:
+                        raise ValueError('register counter info under status: {} but got status {}'.format(st,
+                                                                                                           status_val))
+            obj_status.update_info(info_key=info_key, increment=increment, under_status=status_val)
             return res
 
         return wrap_with_self
@@ -31,6 +31,14 @@ class PendulumRewardFunc(RewardFunc):
         costs = angle_normalize(th) ** 2 + .1 * thdot ** 2 + .001 * (u ** 2)
         return float(-costs)
 
+    def batch_call(self, state, action, new_state, **kwargs) -> np.ndarray:
+        state = np.reshape(state, [len(state), -1])
+        th = state[:, 0]
+        thdot = state[:, 1]
+        u = np.clip(np.reshape(action, [len(state), -1]), -self.max_torque, self.max_torque)[:, 0]
+        costs = angle_normalize(th) ** 2 + .1 * thdot ** 2 + .001 * (u ** 2)
+        return -costs
+
     def init(self):
         super().init()
 
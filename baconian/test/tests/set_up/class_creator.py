@@ -15,6 +15,7 @@ from baconian.algo.policy.normal_distribution_mlp import NormalDistributionMLPPo
 from baconian.algo.ppo import PPO
 from baconian.core.parameters import Parameters, DictConfig
 from baconian.algo.mpc import ModelPredictiveControl
+from baconian.algo.dynamics.mlp_ensemble_dynamics_model import ContinuousMLPEnsembleDynamicsModel
 from baconian.algo.dynamics.terminal_func.terminal_func import RandomTerminalFunc
 from baconian.algo.dynamics.reward_func.reward_func import RandomRewardFunc, CostFunc
 from baconian.algo.policy import UniformRandomPolicy
@@ -128,7 +129,7 @@ class ClassCreatorSetup(unittest.TestCase):
 
         return a, locals()
 
-    def create_ddpg(self, env_id='Pendulum-v0', name='ddpg'):
+    def create_ddpg(self, env_id='Pendulum-v0', name='ddpg', extra_config: dict = None):
         env = make(env_id)
         env_spec = EnvSpec(obs_space=env.observation_space,
                            action_space=env.action_space)
@@ -191,6 +192,7 @@ class ClassCreatorSetup(unittest.TestCase):
                 "TRAIN_ITERATION": 1,
                 "critic_clip_norm": 0.1,
                 "actor_clip_norm": 0.1,
+                **(extra_config if extra_config else dict())
             },
             value_func=mlp_q,
             policy=policy,
@@ -496,6 +498,38 @@ class ClassCreatorSetup(unittest.TestCase):
             ])
         return mlp_dyna, locals()
 
+    def create_continuous_mlp_ensemble_dynamics_model(self, env_spec, n_models=3, prediction_type='random',
+                                                      name='continuous_mlp_ensemble_dynamics_model'):
+        mlp_dyna = ContinuousMLPEnsembleDynamicsModel(
+            env_spec=env_spec,
+            name_scope=name,
+            name=name,
+            n_models=n_models,
+            prediction_type=prediction_type,
+            state_input_scaler=RunningStandardScaler(dims=env_spec.flat_obs_dim),
+            action_input_scaler=RunningStandardScaler(dims=env_spec.flat_action_dim),
+            output_delta_state_scaler=RunningStandardScaler(dims=env_spec.flat_obs_dim),
+            learning_rate=0.01,
+            mlp_config=[
+                {
+                    "ACT": "RELU",
+                    "B_INIT_VALUE": 0.0,
+                    "NAME": "1",
+                    "N_UNITS": 16,
+                    "TYPE": "DENSE",
+                    "W_NORMAL_STDDEV": 0.03
+                },
+                {
+                    "ACT": "LINEAR",
+                    "B_INIT_VALUE": 0.0,
+                    "NAME": "OUPTUT",
+                    "N_UNITS": env_spec.flat_obs_dim,
+                    "TYPE": "DENSE",
+                    "W_NORMAL_STDDEV": 0.03
+                }
+            ])
+        return mlp_dyna, locals()
+
     def create_mlp_deterministic_policy(self, env_spec, name='mlp_policy'):
         policy = DeterministicMLPPolicy(env_spec=env_spec,
                                         name=name,
@@ -1,5 +1,14 @@
+import numpy as np
 from baconian.test.tests.set_up.setup import TestWithAll
-from baconian.common.sampler.sample_data import SampleData
+from baconian.common.sampler.sample_data import SampleData, TransitionData, TrajectoryData
+from baconian.common.sampler.sampler import VectorizedSampler
+from baconian.common.sampler.parallel_sampler import ParallelSampler
+from baconian.test.tests.set_up.class_creator import ClassCreatorSetup
+from baconian.core.status import get_global_status_collect
+
+
+def _make_dqn(env_spec):
+    return ClassCreatorSetup().create_dqn(name='worker_dqn')[0]
 
 
 class TestAgent(TestWithAll):
@@ -31,3 +40,70 @@ class TestAgent(TestWithAll):
         agent.init()
         env.reset()
         agent.test(sample_count=2)
+
+    def test_vectorized_sampler(self):
+        algo, local = self.create_dqn()
+        env = local['env']
+        env_spec = local['env_spec']
+        agent, _ = self.create_agent(algo=algo, env=env,
+                                     env_spec=env_spec,
+                                     eps=self.create_eps(env_spec=env_spec)[0])
+        agent.sampler = VectorizedSampler(env_num=4)
+        self.register_global_status_when_test(agent, env)
+        agent.init()
+        env.reset()
+        data = agent.sample(env=env, sample_count=10, store_flag=True, in_which_status='TRAIN')
+        self.assertTrue(isinstance(data, TransitionData))
+        self.assertEqual(len(data), 10)
+        self.assertEqual(len(agent.sampler.env_list), 4)
+        self.assertEqual(agent.algo.replay_buffer.nb_entries, 10)
+        self.assertEqual(get_global_status_collect()('TOTAL_AGENT_TRAIN_SAMPLE_COUNT'), 10)
+        self.assertEqual(get_global_status_collect()('TOTAL_ENV_STEP_TRAIN_SAMPLE_COUNT'), 10)
+        data = agent.sample(env=env, sample_count=3, in_which_status='TEST', sample_type='trajectory')
+        self.assertTrue(isinstance(data, TrajectoryData))
+        self.assertEqual(len(data), 3)
+        for traj in data.trajectories:
+            self.assertTrue(traj.done_set[-1])
+
+    def test_vectorized_sampler_with_noise(self):
+        algo, local = self.create_ddpg()
+        env = local['env']
+        env_spec = local['env_spec']
+        agent, _ = self.create_agent(algo=algo, env=env, env_spec=env_spec)
+        agent.sampler = VectorizedSampler(env_num=4)
+        self.register_global_status_when_test(agent, env)
+        agent.init()
+        env.reset()
+        data = agent.sample(env=env, sample_count=10, store_flag=True, in_which_status='TRAIN')
+        self.assertTrue(isinstance(data, TransitionData))
+        self.assertEqual(len(data), 10)
+        for action in data.action_set:
+            self.assertTrue(env_spec.action_space.contains(action))
+        # every environment copy gets the noise of its own process
+        noisy_action = agent.noise_adder(np.zeros((4, env_spec.flat_action_dim)), batch_flag=True)
+        self.assertEqual(noisy_action.shape, (4, env_spec.flat_action_dim))
+        self.assertEqual(len(np.unique(noisy_action[:, 0])), 4)
+        self.assertEqual(env_spec.action_space.clip(noisy_action, batch_flag=True).shape,
+                         (4, env_spec.flat_action_dim))
+
+    def test_parallel_sampler(self):
+        algo, local = self.create_dqn()
+        env = local['env']
+        env_spec = local['env_spec']
+        agent, _ = self.create_agent(algo=algo, env=env,
+                                     env_spec=env_spec,
+                                     eps=self.create_eps(env_spec=env_spec)[0])
+        agent.sampler = ParallelSampler(worker_num=2, algo_maker=_make_dqn)
+        self.register_global_status_when_test(agent, env)
+        agent.init()
+        env.reset()
+        data = agent.test(sample_count=3)
+        self.assertTrue(isinstance(data, TrajectoryData))
+        self.assertEqual(len(data), 3)
+        step_count = sum([len(traj) for traj in data.trajectories])
+        self.assertEqual(get_global_status_collect()('TOTAL_AGENT_TEST_SAMPLE_COUNT'), step_count)
+        self.assertEqual(get_global_status_collect()('TOTAL_ENV_STEP_TEST_SAMPLE_COUNT'), step_count)
+        # training samples with exploration are collected in process
+        data = agent.sample(env=env, sample_count=10, store_flag=True, in_which_status='TRAIN')
+        self.assertEqual(len(data), 10)
+        agent.sampler.close()
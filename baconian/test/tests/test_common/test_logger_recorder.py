@@ -6,6 +6,9 @@ from baconian.algo.dqn import DQN
 from baconian.envs.gym_env import make
 from baconian.algo.value_func.mlp_q_value import MLPQValueFunction
 from baconian.core.agent import Agent
+from baconian.common.log_data_loader import load_streamed_log
+from baconian.config.global_config import GlobalConfig
+import os
 
 
 class Foo(Basic):
@@ -94,6 +97,44 @@ class TestLogger(TestWithAll):
         self.assertTrue(obj.recorder._obj_log[obj]['val2'][1]['value'] == 1)
         self.assertTrue(obj.recorder._obj_log[obj]['val2'][2]['value'] == 2)
 
+    def test_streamed_log(self):
+        for writer in ('jsonl', 'npz'):
+            Logger().reset()
+            Logger().init(config_or_config_dict=dict(LOG_WRITER=writer, MAX_BUFFERED_RECORDS=2),
+                          log_path=os.path.join(GlobalConfig().DEFAULT_LOG_PATH, writer),
+                          log_level=GlobalConfig().DEFAULT_LOG_LEVEL)
+            obj = Foo(name='foo')
+            obj.get_by_return(res=10, num=2)
+            # the buffered records reach the bound and are written out
+            self.assertTrue(obj.recorder.is_empty())
+            obj.get_by_return(res=1, num=2)
+            obj.get_by_return(res=2, num=4)
+            Logger().flush_recorder()
+            res = load_streamed_log(os.path.join(Logger()._record_file_log_dir, 'foo'))
+            self.assertEqual([r['value'] for r in res['val']], [20, 2, 8])
+            self.assertEqual([r['value'] for r in res['val2']], [10, 1, 2])
+            self.assertEqual(res['val'][0]['x'], 1)
+
+    def test_async_log(self):
+        Logger().reset()
+        Logger().init(config_or_config_dict=dict(LOG_WRITER='jsonl', ASYNC=True, QUEUE_SIZE=2),
+                      log_path=os.path.join(GlobalConfig().DEFAULT_LOG_PATH, 'async'),
+                      log_level=GlobalConfig().DEFAULT_LOG_LEVEL)
+        obj = Foo(name='foo')
+        for i in range(10):
+            obj.get_by_return(res=i, num=2)
+            Logger().flush_recorder()
+        log_dir = Logger()._record_file_log_dir
+        # close drains the queue before the writer is closed
+        Logger().close()
+        res = load_streamed_log(os.path.join(log_dir, 'foo'))
+        self.assertEqual([r['value'] for r in res['val2']], list(range(10)))
+        with self.assertRaises(ValueError):
+            Logger().reset()
+            Logger().init(config_or_config_dict=dict(ASYNC=True, QUEUE_FULL_POLICY='wait'),
+                          log_path=os.path.join(GlobalConfig().DEFAULT_LOG_PATH, 'async'),
+                          log_level=GlobalConfig().DEFAULT_LOG_LEVEL)
+
 
 class TesTLoggerWithDQN(TestWithAll):
 
@@ -0,0 +1,36 @@
+import time
+
+from baconian.common.profiler import Profiler, profile_decorator
+from baconian.test.tests.set_up.setup import BaseTestCase
+
+
+@profile_decorator('sleep')
+def sleep():
+    time.sleep(0.001)
+
+
+class TestProfiler(BaseTestCase):
+    def test_profiler(self):
+        Profiler().reset()
+        sleep()
+        # disabled by default
+        self.assertEqual(Profiler().summary(), dict())
+
+        Profiler().enable()
+        with Profiler().stage('train'):
+            for _ in range(3):
+                sleep()
+        sleep()
+        res = Profiler().summary()
+        self.assertEqual(res['train']['sleep']['count'], 3)
+        self.assertEqual(res['train']['stage_total']['count'], 1)
+        self.assertEqual(res['default']['sleep']['count'], 1)
+        self.assertEqual(sum(res['train']['sleep']['histogram'].values()), 3)
+        self.assertGreaterEqual(res['train']['sleep']['min'], 0.001)
+        self.assertGreaterEqual(res['train']['stage_total']['total'], res['train']['sleep']['total'])
+
+        recorder = Profiler().record()
+        self.assertEqual(len(recorder.get_log(attr_name='sleep')), 2)
+        Profiler().reset()
+        self.assertFalse(Profiler().enabled)
+        self.assertEqual(Profiler().summary(), dict())
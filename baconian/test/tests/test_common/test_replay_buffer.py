@@ -1,7 +1,12 @@
 from baconian.envs.gym_env import make
 from baconian.core.core import EnvSpec
 from baconian.test.tests.set_up.setup import BaseTestCase
-from baconian.algo.misc.replay_buffer import UniformRandomReplayBuffer
+from baconian.config.global_config import GlobalConfig
+from baconian.algo.misc.replay_buffer import UniformRandomReplayBuffer, RingBuffer, PrioritisedReplayBuffer, \
+    MemmapReplayBuffer
+from baconian.algo.misc.segment_tree import SumSegmentTree, MinSegmentTree
+import numpy as np
+import os
 
 
 class TestReplaybuffer(BaseTestCase):
@@ -23,3 +28,111 @@ class TestReplaybuffer(BaseTestCase):
         self.assertTrue(batch.reward_set.shape[0] == 10)
         self.assertTrue(batch.done_set.shape[0] == 10)
         self.assertTrue(batch.new_state_set.shape[0] == 10)
+
+    def test_ring_buffer_append_batch(self):
+        a = RingBuffer(maxlen=10, shape=(2,))
+        b = RingBuffer(maxlen=10, shape=(2,))
+        count = 0
+        for n in (3, 4, 6, 0, 9, 25, 1):
+            data = np.arange(count, count + n * 2).reshape(n, 2)
+            count += n * 2
+            a.append_batch(data)
+            for row in data:
+                b.append(row)
+            self.assertEqual(len(a), len(b))
+            self.assertTrue(np.equal(a.get_batch(np.arange(len(a))), b.get_batch(np.arange(len(b)))).all())
+
+    def test_append_batch_and_sample(self):
+        env = make('Acrobot-v1')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        a = UniformRandomReplayBuffer(limit=50, action_shape=env_spec.action_shape,
+                                      observation_shape=env_spec.obs_shape)
+        a.append_batch(obs0=np.ones((70,) + env_spec.obs_shape),
+                       obs1=np.zeros((70,) + env_spec.obs_shape),
+                       action=np.arange(70) % 3,
+                       reward=np.arange(70),
+                       terminal1=np.arange(70) % 2 == 0)
+        self.assertEqual(a.nb_entries, 50)
+        batch = a.sample(batch_size=10)
+        self.assertEqual(len(batch), 10)
+        self.assertEqual(batch.done_set.dtype, bool)
+        self.assertTrue(np.equal(batch.state_set, 1.0).all())
+        self.assertTrue((batch.reward_set >= 20).all())
+
+    def test_memmap_replay_buffer(self):
+        path = os.path.join(GlobalConfig().DEFAULT_LOG_PATH, 'memmap_replay_buffer')
+        a = MemmapReplayBuffer(limit=50, action_shape=(2,), observation_shape=(3,), path=path, resume=False)
+        a.append_batch(obs0=np.arange(210).reshape(70, 3),
+                       obs1=np.arange(210).reshape(70, 3),
+                       action=np.ones((70, 2)),
+                       reward=np.arange(70),
+                       terminal1=np.arange(70) % 2 == 0)
+        self.assertEqual(a.nb_entries, 50)
+        batch = a.sample(batch_size=10)
+        self.assertEqual(len(batch), 10)
+        self.assertTrue(np.equal(batch.state_set[:, 0], batch.reward_set * 3).all())
+        reward = a.rewards.get_batch(np.arange(a.nb_entries))
+        a.flush()
+
+        b = MemmapReplayBuffer(limit=50, action_shape=(2,), observation_shape=(3,), path=path)
+        self.assertEqual(b.nb_entries, 50)
+        self.assertTrue(np.equal(b.rewards.get_batch(np.arange(b.nb_entries)), reward).all())
+        with self.assertRaises(ValueError):
+            MemmapReplayBuffer(limit=20, action_shape=(2,), observation_shape=(3,), path=path)
+        b.reset()
+        self.assertEqual(b.nb_entries, 0)
+
+    def test_memmap_replay_buffer_flush_every(self):
+        path = os.path.join(GlobalConfig().DEFAULT_LOG_PATH, 'memmap_replay_buffer_flush_every')
+        a = MemmapReplayBuffer(limit=50, action_shape=(2,), observation_shape=(3,), path=path, resume=False,
+                               flush_every=10)
+        for i in range(9):
+            a.append(obs0=np.ones(3) * i, obs1=np.ones(3) * i, action=np.ones(2), reward=i, terminal1=False)
+        # the meta data is not written until 10 transitions are appended
+        self.assertEqual(MemmapReplayBuffer(limit=50, action_shape=(2,), observation_shape=(3,),
+                                            path=path).nb_entries, 0)
+        a.append(obs0=np.ones(3) * 9, obs1=np.ones(3) * 9, action=np.ones(2), reward=9, terminal1=False)
+        b = MemmapReplayBuffer(limit=50, action_shape=(2,), observation_shape=(3,), path=path)
+        self.assertEqual(b.nb_entries, 10)
+        self.assertTrue(np.equal(np.reshape(b.rewards.get_batch(np.arange(10)), [-1]), np.arange(10)).all())
+        a.append(obs0=np.ones(3), obs1=np.ones(3), action=np.ones(2), reward=10, terminal1=False)
+        a.close()
+        self.assertEqual(MemmapReplayBuffer(limit=50, action_shape=(2,), observation_shape=(3,),
+                                            path=path).nb_entries, 11)
+
+    def test_segment_tree(self):
+        val = np.array([1.0, 2.0, 3.0, 4.0, 0.0, 0.0, 5.0, 1.0])
+        sum_tree = SumSegmentTree(8)
+        min_tree = MinSegmentTree(8)
+        sum_tree[np.arange(8)] = val
+        min_tree[np.arange(8)] = val
+        self.assertEqual(sum_tree.sum(), 16.0)
+        self.assertEqual(sum_tree.sum(2, 5), 7.0)
+        self.assertEqual(min_tree.min(), 0.0)
+        self.assertEqual(min_tree.min(0, 3), 1.0)
+        self.assertTrue(np.equal(sum_tree.find_prefixsum_idx([0.5, 1.5, 3.1, 9.9, 10.5]), [0, 1, 2, 3, 6]).all())
+        sum_tree[[4, 5]] = [2.0, 2.0]
+        self.assertEqual(sum_tree.sum(), 20.0)
+
+    def test_prioritised_replay_buffer(self):
+        a = PrioritisedReplayBuffer(limit=10, action_shape=(), observation_shape=(1,), alpha=0.6, beta=0.4,
+                                    beta_increment=0.1)
+        a.append_batch(obs0=np.arange(15).reshape(-1, 1),
+                       obs1=np.arange(15).reshape(-1, 1),
+                       action=np.zeros(15),
+                       reward=np.arange(15),
+                       terminal1=np.zeros(15))
+        self.assertEqual(a.nb_entries, 10)
+        a.update_priorities(idxes=[0], priorities=[100.0])
+        count = np.zeros(10)
+        for _ in range(100):
+            batch = a.sample(batch_size=10)
+            slots = batch('buffer_index_set')
+            count += np.bincount(slots, minlength=10)
+            # slot and sampled data must match
+            self.assertTrue(np.equal(batch.state_set[:, 0], batch.reward_set).all())
+            self.assertTrue(np.equal(batch.reward_set[slots == 0], 5.0).all())
+            self.assertTrue((batch('importance_weight_set') <= 1.0 + 1e-8).all())
+        self.assertEqual(np.argmax(count), 0)
+        self.assertEqual(a.beta, 1.0)
@@ -1,4 +1,5 @@
-from baconian.common.sampler.sample_data import TransitionData, TrajectoryData
+from baconian.common.sampler.sample_data import TransitionData, TrajectoryData, DataColumn, PackedTrajectoryData
+from baconian.algo.misc.sample_processor import SampleProcessor, discount
 from baconian.envs.gym_env import make
 from baconian.core.core import EnvSpec
 import numpy as np
@@ -76,15 +77,15 @@ class TestSampleData(BaseTestCase):
         a.apply_transformation(set_name='action_set', func=lambda x: x // 2, direct_apply=True)
         self.assertTrue(np.equal(tmp_action, a('action_set')).all())
 
-        index = np.arange(len(a._internal_data_dict['state_set'][0])).tolist()
+        index = np.arange(len(a)).tolist()
         b = a.get_copy()
         a.shuffle(index=list(index))
         for i in range(len(index)):
             for key in a._internal_data_dict.keys():
-                self.assertTrue(np.equal(np.array(a._internal_data_dict[key][0][i]),
-                                         np.array(b._internal_data_dict[key][0][i])).all())
-        a.append_new_set(name='test', data_set=np.ones_like(a._internal_data_dict['state_set'][0]),
-                         shape=a._internal_data_dict['state_set'][1])
+                self.assertTrue(np.equal(np.array(a(key)[i]),
+                                         np.array(b(key)[i])).all())
+        a.append_new_set(name='test', data_set=np.ones_like(a('state_set')),
+                         shape=a._internal_data_dict['state_set'].shape)
         a.reset()
         self.assertEqual(a.reward_set.shape[0], 0)
         self.assertEqual(a.done_set.shape[0], 0)
@@ -125,3 +126,89 @@ class TestSampleData(BaseTestCase):
         self.assertEqual(a.trajectories.__len__(), 10)
         for traj in a.trajectories:
             self.assertEqual(len(traj), 10)
+
+    def test_data_column(self):
+        a = DataColumn(shape=[3], dtype=np.float32, capacity=2)
+        for i in range(100):
+            a.append(np.ones([3]) * i)
+        self.assertEqual(len(a), 100)
+        self.assertEqual(a.data.shape, (100, 3))
+        self.assertEqual(a.data.dtype, np.float32)
+        self.assertEqual(a.capacity, 128)
+        self.assertTrue(np.equal(a.data[:, 0], np.arange(100)).all())
+        a.extend(np.zeros([50, 3]))
+        self.assertEqual(len(a), 150)
+        self.assertTrue(np.equal(a.data[100:], 0.0).all())
+        b = a.get_copy()
+        view = a.data
+        a.reset()
+        self.assertEqual(len(a), 0)
+        a.append(np.ones([3]) * -1)
+        self.assertTrue(np.equal(view[0], 0.0).all())
+        self.assertEqual(len(b), 150)
+
+        a.set(np.zeros([0, 3]))
+        self.assertEqual(a.capacity, 0)
+        a.append(np.ones([3]))
+        self.assertEqual(len(a), 1)
+
+        data = TransitionData(obs_shape=[3], action_shape=[2])
+        data.shuffle()
+        data.append(state=np.ones([3]), new_state=np.ones([3]), action=np.ones([2]), reward=1.0, done=False)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data('state_set').shape, (1, 3))
+
+    def test_transition_data_union(self):
+        env = make('Acrobot-v1')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        a = TransitionData(env_spec)
+        b = TransitionData(env_spec)
+        st = env.reset()
+        for i in range(100):
+            ac = env_spec.action_space.sample()
+            st_new, re, done, _ = env.step(action=ac)
+            a.append(state=st, new_state=st_new, action=ac, done=done, reward=re)
+            b.append(state=st_new, new_state=st, action=ac, done=done, reward=re)
+            st = st_new
+        state_set = np.concatenate([a.state_set, b.state_set], axis=0)
+        a.union(b)
+        self.assertEqual(len(a), 200)
+        self.assertTrue(np.equal(a.state_set, state_set).all())
+        self.assertEqual(a.done_set.dtype, bool)
+        batch = a.sample_batch(batch_size=32)
+        for key in ('state_set', 'new_state_set', 'action_set', 'reward_set', 'done_set'):
+            self.assertEqual(batch[key].shape[0], 32)
+
+    def test_packed_trajectory_data(self):
+        a = TrajectoryData(obs_shape=[3], action_shape=[1])
+        for length in (5, 1, 7, 3):
+            traj = TransitionData(obs_shape=[3], action_shape=[1])
+            traj.append_batch(state=np.random.randn(length, 3), action=np.random.randn(length, 1),
+                              new_state=np.random.randn(length, 3), done=np.zeros(length, dtype=bool),
+                              reward=np.random.randn(length))
+            traj.append_new_set(name='v_value_set', data_set=np.random.randn(length), shape=[])
+            a.append(traj)
+        packed = a.return_as_packed_data()
+        self.assertTrue(isinstance(packed, PackedTrajectoryData))
+        self.assertEqual(len(packed), 16)
+        self.assertEqual(packed.episode_num, 4)
+        self.assertTrue(np.equal(packed.episode_offsets, [0, 5, 6, 13, 16]).all())
+        self.assertTrue(np.equal(packed.split('v_value_set')[2], a.trajectories[2]('v_value_set')).all())
+
+        gamma, lam = 0.99, 0.95
+        SampleProcessor.add_gae(packed, gamma=gamma, lam=lam)
+        SampleProcessor.add_discount_sum_reward(packed, gamma=gamma)
+        SampleProcessor.add_gae(a, gamma=gamma, lam=lam)
+        for traj, adv, dis in zip(a.trajectories, packed.split('advantage_set'), packed.split('discount_set')):
+            rewards = traj('reward_set') * (1 - gamma)
+            values = traj('v_value_set')
+            expected_adv = discount(rewards - values + np.append(values[1:] * gamma, 0), gamma * lam)
+            self.assertTrue(np.isclose(adv, expected_adv).all())
+            self.assertTrue(np.isclose(traj('advantage_set'), expected_adv).all())
+            self.assertTrue(np.isclose(dis, discount(rewards, gamma)).all())
+
+        b = packed.get_copy()
+        b.union(packed)
+        self.assertEqual(b.episode_num, 8)
+        self.assertTrue(np.equal(b.episode_offsets[4:], [16, 21, 22, 29, 32]).all())
@@ -35,6 +35,14 @@ class TestStatus(TestWithAll):
         self.assertTrue(res['test_counter'] == 10)
         self.assertTrue(res['train_counter'] == 20)
 
+        self.assertEqual(a.snapshot(), res)
+        self.assertEqual(a.snapshot(keys=['test_counter', 'not_registered']), dict(test_counter=10))
+        a.register_info_key_status(obj=agent, info_key='not_created', return_name='not_created')
+        self.assertIsNone(a.snapshot()['not_created'])
+        self.assertEqual(agent._status.snapshot()['TRAIN']['predict_counter'], 20)
+        with self.assertRaises(ValueError):
+            a.register_info_key_status(obj=agent, info_key='predict_counter', return_name='train_counter')
+
 
 class TestStatusWithDQN(TestWithAll):
     def test_with_dqn(self):
@@ -2,9 +2,15 @@ from baconian.test.tests.set_up.setup import BaseTestCase
 from baconian.core.experiment_runner import single_exp_runner, duplicate_exp_runner
 from baconian.common.schedules import LinearScheduler
 from baconian.config.global_config import GlobalConfig
+from baconian.common.sampler.parallel_sampler import ParallelSampler
+from baconian.test.tests.set_up.class_creator import ClassCreatorSetup
 import os
 
 
+def _make_dqn(env_spec):
+    return ClassCreatorSetup().create_dqn(name='worker_dqn')[0]
+
+
 class TestExperiment(BaseTestCase):
     def test_experiment(self):
         def func():
@@ -24,6 +30,28 @@ class TestExperiment(BaseTestCase):
 
         single_exp_runner(func, auto_choose_gpu_flag=False, gpu_id=0, del_if_log_path_existed=True)
 
+    def test_exp_with_finalized_graph(self):
+        def func():
+            GlobalConfig().set('DEFAULT_EXPERIMENT_END_POINT', dict(TOTAL_AGENT_TRAIN_SAMPLE_COUNT=200,
+                                                                    TOTAL_AGENT_TEST_SAMPLE_COUNT=None,
+                                                                    TOTAL_AGENT_UPDATE_COUNT=None))
+            GlobalConfig().set('DEFAULT_FINALIZE_TF_GRAPH_FLAG', True)
+            dqn, locals = self.create_dqn()
+            env_spec = locals['env_spec']
+            env = locals['env']
+            agent = self.create_agent(env=locals['env'],
+                                      algo=dqn,
+                                      name='agent',
+                                      eps=self.create_eps(env_spec)[0],
+                                      env_spec=env_spec)[0]
+            # the test samples are collected by the workers, which needs the flat ops of the parameters
+            agent.sampler = ParallelSampler(worker_num=2, algo_maker=_make_dqn)
+            exp = self.create_exp(name='model_free', env=env, agent=agent)
+            exp.run(load_model=False)
+            self.assertEqual(exp.get_status()['status'], 'FINISHED')
+
+        single_exp_runner(func, auto_choose_gpu_flag=False, gpu_id=0, del_if_log_path_existed=True)
+
     def test_exp_with_scheduler(self, algo=None, locals=None):
         def wrap_algo(algo=None, locals=None):
             def func(algo=algo, locals=locals):
@@ -21,6 +21,12 @@ class TestDynamicsModel(TestWithAll):
         print('true state', true_new)
         self.assertTrue(np.equal(true_new, new_state).all())
 
+        states = np.array([real_env.observation_space.sample() for _ in range(10)])
+        actions = np.array([real_env.action_space.sample() for _ in range(10)])
+        new_states = a.step_batch(states=states, actions=actions)
+        for i in range(10):
+            self.assertTrue(np.isclose(new_states[i], a.step(action=actions[i], state=states[i])).all())
+
     def test_linear_regression_model(self):
         real_env = self.create_env('Pendulum-v0')
         real_env.init()
@@ -40,3 +46,5 @@ class TestDynamicsModel(TestWithAll):
             predict.append(a.step(state=state, action=action))
         print(np.linalg.norm(np.array(predict) - data.new_state_set, ord=1))
         print(np.linalg.norm(np.array(predict) - data.new_state_set, ord=2))
+        self.assertTrue(np.isclose(a.step_batch(states=data.state_set, actions=data.action_set),
+                                   np.array(predict)).all())
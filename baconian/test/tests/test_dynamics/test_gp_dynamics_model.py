@@ -36,6 +36,11 @@ class TestDynamicsModel(TestWithAll):
         gp.init()
         gp.train()
         print("gp first fit")
+        batch_res = gp.step_batch(states=data.state_set, actions=data.action_set, allow_clip=True)
+        for i in range(len(data.state_set)):
+            self.assertTrue(np.isclose(batch_res[i], gp.step(action=data.action_set[i],
+                                                             state=data.state_set[i],
+                                                             allow_clip=True)).all())
         for i in range(len(data.state_set)):
             res = gp.step(action=data.action_set[i],
                           state=data.state_set[i],
@@ -1,10 +1,35 @@
 from baconian.common.sampler.sample_data import TransitionData
 from baconian.test.tests.set_up.setup import TestWithAll
 import numpy as np
+import tensorflow as tf
 
 
 class TestDynamicsModel(TestWithAll):
 
+    def test_step_batch(self):
+        mlp_dyna, local = self.create_continue_dynamics_model(name='mlp_dyna_model')
+        env_spec = local['env_spec']
+        mlp_dyna.init()
+        states = np.array([env_spec.obs_space.sample() for _ in range(20)])
+        actions = np.array([env_spec.action_space.sample() for _ in range(20)])
+        new_states = mlp_dyna.step_batch(states=states, actions=actions)
+        self.assertEqual(new_states.shape, (20,) + tuple(env_spec.obs_shape))
+        for i in range(20):
+            self.assertTrue(np.isclose(new_states[i], mlp_dyna.step(action=actions[i], state=states[i]),
+                                       atol=1e-5).all())
+
+    def test_jacobian_batch(self):
+        mlp_dyna, local = self.create_continue_dynamics_model(env_id='Pendulum-v0', name='mlp_dyna_model')
+        env_spec = local['env_spec']
+        mlp_dyna.init()
+        # the jacobian op is built by init, so planning does not add ops to the graph
+        op_num = len(tf.get_default_graph().get_operations())
+        states = np.array([env_spec.obs_space.sample() for _ in range(5)])
+        actions = np.array([env_spec.action_space.sample() for _ in range(5)])
+        jacobian = mlp_dyna.jacobian_batch(states=states, actions=actions)
+        self.assertEqual(jacobian.shape, (5, env_spec.flat_obs_dim, env_spec.flat_obs_dim + env_spec.flat_action_dim))
+        self.assertEqual(op_num, len(tf.get_default_graph().get_operations()))
+
     def test_mlp_dynamics_model(self):
         mlp_dyna, local = self.create_continue_dynamics_model(name='mlp_dyna_model')
         env = local['env']
@@ -0,0 +1,41 @@
+from baconian.common.sampler.sample_data import TransitionData
+from baconian.test.tests.set_up.setup import TestWithAll
+from baconian.envs.gym_env import make
+from baconian.core.core import EnvSpec
+import numpy as np
+
+
+class TestMLPEnsembleDynamicsModel(TestWithAll):
+
+    def test_mlp_ensemble_dynamics_model(self):
+        env = make('Pendulum-v0')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        ensemble, _ = self.create_continuous_mlp_ensemble_dynamics_model(env_spec=env_spec, n_models=3,
+                                                                         prediction_type='mean')
+        ensemble.init()
+        data = TransitionData(env_spec)
+        st = env.reset()
+        for i in range(20):
+            ac = env_spec.action_space.sample()
+            new_st, re, done, info = env.step(action=ac)
+            data.append(state=st, action=ac, new_state=new_st, done=done, reward=re)
+            st = new_st
+        res = ensemble.train(batch_data=data, train_iter=10)
+        self.assertTrue('model_2_average_loss' in res)
+
+        all_members = ensemble.step_all_members(states=data.state_set, actions=data.action_set)
+        self.assertEqual(all_members.shape, (3, 20) + tuple(env_spec.obs_shape))
+        # members are initialized and trained independently
+        self.assertFalse(np.isclose(all_members[0], all_members[1]).all())
+        self.assertTrue(np.isclose(ensemble.step_batch(states=data.state_set, actions=data.action_set),
+                                   np.mean(all_members, axis=0), atol=1e-5).all())
+        self.assertTrue(np.isclose(ensemble.disagreement(states=data.state_set, actions=data.action_set),
+                                   np.var(all_members, axis=0), atol=1e-5).all())
+        new_st = ensemble.step(action=data.action_set[0], state=data.state_set[0])
+        self.assertTrue(np.isclose(new_st, np.mean(all_members, axis=0)[0], atol=1e-5).all())
+
+        ensemble_2, _ = self.create_continuous_mlp_ensemble_dynamics_model(env_spec=env_spec, name='ensemble_2')
+        ensemble_2.init(source_obj=ensemble)
+        self.assert_var_list_equal(var_list1=ensemble.parameters('tf_var_list'),
+                                   var_list2=ensemble_2.parameters('tf_var_list'))
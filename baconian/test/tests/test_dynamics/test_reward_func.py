@@ -2,6 +2,8 @@ from baconian.common.sampler.sample_data import TransitionData
 from baconian.test.tests.set_up.setup import TestWithLogSet
 import numpy as np
 from baconian.algo.dynamics.terminal_func.terminal_func import *
+from baconian.algo.dynamics.reward_func.reward_func import QuadraticCostFunc, RewardFuncCostWrapper
+from baconian.envs.envs_reward_func import PendulumRewardFunc
 
 x = 0
 
@@ -15,6 +17,18 @@ class TestRewardTerminalFunc(TestWithLogSet):
     def test_all_reward_func(self):
         pass
 
+    def test_reward_func_batch_call(self):
+        state = np.random.random((10, 3))
+        action = np.random.random((10, 1))
+        C = np.random.random((4, 4))
+        for func in (QuadraticCostFunc(C=C + C.T, c=np.random.random(4)),
+                     RewardFuncCostWrapper(reward_func=PendulumRewardFunc()),
+                     PendulumRewardFunc()):
+            res = func.batch_call(state=state, action=action, new_state=state)
+            self.assertEqual(res.shape, (10,))
+            for i in range(10):
+                self.assertTrue(np.isclose(res[i], func(state=state[i], action=action[i], new_state=state[i])))
+
     def test_all_terminal_func(self):
         a = FixedEpisodeLengthTerminalFunc(max_step_length=10,
                                            step_count_fn=func)
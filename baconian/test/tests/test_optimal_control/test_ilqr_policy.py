@@ -1,10 +1,12 @@
 from baconian.test.tests.set_up.setup import TestWithAll
-from baconian.algo.dynamics.reward_func.reward_func import CostFunc
+from baconian.algo.dynamics.reward_func.reward_func import CostFunc, QuadraticCostFunc
 from baconian.envs.gym_env import make
 import numpy as np
 from baconian.core.core import EnvSpec
 from baconian.algo.dynamics.dynamics_model import GlobalDynamicsModel
-from baconian.algo.policy.ilqr_policy import iLQRPolicy
+from baconian.algo.policy.ilqr_policy import iLQRPolicy, iLQR
+from baconian.algo.misc.finite_difference import BatchFiniteDifference
+from baconian.algo.dynamics.linear_dynamics_model import LinearDynamicsModel
 from baconian.algo.dynamics.dynamics_model import DynamicsEnvWrapper
 from baconian.algo.dynamics.terminal_func.terminal_func import RandomTerminalFunc
 
@@ -53,3 +55,110 @@ class TestiLQRPolicy(TestWithAll):
             print("analytical optimal action -0.5, cost -0.25")
             print('state: {}, action: {}, cost {}'.format(st, ac, policy.iLqr_instance.cost_fn(state=st, action=ac,
                                                                                                new_state=None)))
+
+    def test_analytic_derivatives(self):
+        env = make('Pendulum-v0')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        dim = env_spec.flat_obs_dim + env_spec.flat_action_dim
+        F = np.random.uniform(-0.1, 0.1, size=[env_spec.flat_obs_dim, dim])
+        dyna = LinearDynamicsModel(env_spec=env_spec,
+                                   state_transition_matrix=F,
+                                   bias=np.zeros([env_spec.flat_obs_dim]))
+        C = np.random.random([dim, dim])
+        cost_fn = QuadraticCostFunc(C=C + C.T, c=np.random.random(dim))
+        ilqr = iLQR(env_spec=env_spec, delta=0.0001, T=5, dyn_model=dyna, cost_fn=cost_fn)
+        x_seq = [env_spec.obs_space.sample() * 0.1 for _ in range(5)]
+        u_seq = [env_spec.action_space.sample() * 0.1 for _ in range(4)]
+        C_seq, F_seq, c_seq, f_seq = ilqr.differentiate(x_seq, u_seq)
+        self.assertEqual(len(C_seq), 5)
+        self.assertEqual(len(F_seq), 5)
+        for t in range(5):
+            u = u_seq[t] if t < 4 else np.zeros_like(u_seq[0])
+            C_fd, F_fd, c_fd, f_fd = ilqr.finite_difference(x_seq[t], u)
+            self.assertTrue(np.allclose(F_seq[t], F_fd, atol=1e-3))
+            self.assertTrue(np.allclose(c_seq[t], c_fd, atol=1e-2))
+            self.assertTrue(np.allclose(C_seq[t], C_fd, atol=1e-1))
+            self.assertTrue(np.equal(f_seq[t], f_fd).all())
+
+    def test_batch_finite_difference(self):
+        env = make('Pendulum-v0')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        u_seq = [env_spec.action_space.sample() * 0.1 for _ in range(4)]
+        # a rollout of DebugDynamics, so the new states of the unperturbed points can be reused
+        x_seq = [env_spec.obs_space.sample() * 0.1]
+        for u in u_seq:
+            x_seq.append(x_seq[-1] + 0.0001 * u)
+        for scheme in BatchFiniteDifference.SCHEME_LIST:
+            for worker_num in (0, 2):
+                ilqr = iLQR(env_spec=env_spec, delta=0.001, T=5, dyn_model=DebugDynamics(env_spec=env_spec),
+                            cost_fn=DebuggingCostFunc(), finite_difference_scheme=scheme,
+                            finite_difference_worker_num=worker_num, reuse_base_rollout=worker_num > 0)
+                C_seq, F_seq, c_seq, f_seq = ilqr.differentiate(x_seq, u_seq)
+                ilqr.batch_finite_difference.close()
+                for t in range(5):
+                    u = u_seq[t] if t < 4 else np.zeros_like(u_seq[0])
+                    C_fd, F_fd, c_fd, f_fd = ilqr.finite_difference(x_seq[t], u)
+                    self.assertTrue(np.allclose(F_seq[t], F_fd, atol=1e-3))
+                    self.assertTrue(np.allclose(c_seq[t], c_fd, atol=1e-2))
+                    self.assertTrue(np.allclose(C_seq[t], C_fd, atol=1e-1))
+
+    def test_solve(self):
+        env = make('Pendulum-v0')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        ilqr = iLQR(env_spec=env_spec, delta=0.001, T=10, dyn_model=DebugDynamics(env_spec=env_spec),
+                    cost_fn=DebuggingCostFunc())
+        x0 = env_spec.obs_space.sample()
+        u_init = np.zeros((9, env_spec.flat_action_dim))
+        _, _, init_cost = ilqr.rollout(x0, u_init)
+        X, U, cost = ilqr.solve(x0, u_init, iteration=10, tolerance=1e-6)
+        self.assertEqual(X.shape, (10, env_spec.flat_obs_dim))
+        self.assertEqual(U.shape, (9, env_spec.flat_action_dim))
+        self.assertLess(cost, init_cost[0])
+        # analytical optimal action -0.5 with cost -0.25 per step
+        self.assertTrue(np.allclose(U, -0.5, atol=1e-2))
+
+    def test_solve_rejected_step(self):
+        env = make('Pendulum-v0')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        dim = env_spec.flat_obs_dim + env_spec.flat_action_dim
+        F = np.random.uniform(-0.5, 0.5, size=[env_spec.flat_obs_dim, dim])
+        dyna = LinearDynamicsModel(env_spec=env_spec,
+                                   state_transition_matrix=F,
+                                   bias=np.zeros([env_spec.flat_obs_dim]))
+        A = np.random.random([dim, dim])
+        cost_fn = QuadraticCostFunc(C=np.dot(A, A.T) + np.eye(dim), c=np.random.random(dim))
+        ilqr = iLQR(env_spec=env_spec, delta=0.0001, T=5, dyn_model=dyna, cost_fn=cost_fn)
+        ilqr.mu = 1.0
+        mu_list = []
+        k_list = []
+        backward = ilqr.backward
+
+        def recorded_backward(x_seq, u_seq):
+            mu_list.append(ilqr.mu)
+            res = backward(x_seq, u_seq)
+            k_list.append(np.copy(ilqr.k))
+            return res
+
+        ilqr.backward = recorded_backward
+        x0 = env_spec.obs_space.sample() * 0.1
+        u_init = np.zeros((4, env_spec.flat_action_dim))
+        _, _, init_cost = ilqr.rollout(x0, u_init)
+        # no step can be accepted, every iteration should be more conservative than the last one
+        ilqr.min_improvement_ratio = np.inf
+        _, _, cost = ilqr.solve(x0, u_init, iteration=3)
+        self.assertEqual(cost, init_cost[0])
+        self.assertEqual(len(mu_list), 3)
+        self.assertLess(mu_list[0], mu_list[1])
+        self.assertLess(mu_list[1], mu_list[2])
+        self.assertFalse(np.allclose(k_list[0], k_list[1]))
+        self.assertFalse(np.allclose(k_list[1], k_list[2]))
+
+        ilqr.min_improvement_ratio = 0.1
+        mu = ilqr.mu
+        _, _, cost = ilqr.solve(x0, u_init, iteration=1)
+        self.assertLess(cost, init_cost[0])
+        self.assertLess(ilqr.mu, mu)
@@ -41,3 +41,27 @@ class TestLQRPolicy(TestWithAll):
             st = dyna.step(action=ac, state=st, allow_clip=True)
             print(cost_fn(state=st, action=ac, new_state=None))
             print(st, ac)
+
+    def test_cache_and_infinite_horizon(self):
+        env = make('Pendulum-v0')
+        n = env.observation_space.flat_dim
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+        F = np.concatenate((np.eye(n) * 0.9, np.ones([n, env.action_space.flat_dim]) * 0.1), axis=1)
+        dyna = LinearDynamicsModel(env_spec=env_spec,
+                                   state_transition_matrix=F,
+                                   bias=np.zeros([n]))
+        dim = n + env.action_space.flat_dim
+        cost_fn = QuadraticCostFunc(C=np.eye(dim), c=np.zeros([dim]))
+
+        policy = LQRPolicy(env_spec=env_spec, T=200, dynamics=dyna, cost_fn=cost_fn)
+        infinite_policy = LQRPolicy(env_spec=env_spec, T=1, dynamics=dyna, cost_fn=cost_fn, infinite_horizon=True)
+        obs = np.array([env_spec.obs_space.sample() for _ in range(5)])
+        ac = policy.forward(obs)
+        self.assertEqual(ac.shape, (5, env.action_space.flat_dim))
+        self.assertTrue(np.allclose(ac[1], policy.forward(obs[1])[0]))
+        self.assertFalse(policy.Lqr_instance.update_gain())
+        self.assertTrue(np.allclose(infinite_policy.forward(obs), ac, atol=1e-6))
+
+        dyna.parameters.set('F', F * 0.5)
+        self.assertTrue(policy.Lqr_instance.update_gain())
@@ -0,0 +1,34 @@
+from baconian.test.tests.set_up.setup import TestWithAll
+from baconian.algo.model_ensemble import ModelEnsembleAlgo
+from baconian.algo.dynamics.terminal_func.terminal_func import RandomTerminalFunc
+from baconian.algo.dynamics.reward_func.reward_func import RandomRewardFunc
+
+
+class TestModelEnsemble(TestWithAll):
+    def test_validate_with_mlp_ensemble(self):
+        ddpg, locals = self.create_ddpg()
+        env_spec = locals['env_spec']
+        env = locals['env']
+        mlp_dyna = self.create_continuous_mlp_ensemble_dynamics_model(env_spec=env_spec, n_models=3)[0]
+        algo = ModelEnsembleAlgo(env_spec=env_spec,
+                                 dynamics_model=mlp_dyna,
+                                 model_free_algo=ddpg,
+                                 config_or_config_dict=dict(dynamics_model_train_iter=1,
+                                                            model_free_algo_train_iter=1,
+                                                            validation_trajectory_count=2))
+        algo.set_terminal_reward_function_for_dynamics_env(terminal_func=RandomTerminalFunc(),
+                                                           reward_func=RandomRewardFunc())
+        agent = self.create_agent(algo=algo, env=env, env_spec=env_spec)[0]
+        agent.init()
+        self.assertEqual(len(mlp_dyna.model), 3)
+        for member_model in mlp_dyna.model:
+            st = env_spec.obs_space.sample()
+            ac = env_spec.action_space.sample()
+            self.assertTrue(env_spec.obs_space.contains(member_model.step(action=ac, state=st)))
+        res = algo.validate(agent=agent)
+        self.assertTrue(0.0 <= res <= 1.0)
+        # the mean rewards of the first validation are all improved from -inf
+        self.assertEqual(res, 1.0)
+        self.assertEqual(len(algo.result), 3)
+        res = algo.validate(agent=agent)
+        self.assertTrue(0.0 <= res <= 1.0)
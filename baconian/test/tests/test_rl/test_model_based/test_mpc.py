@@ -1,6 +1,10 @@
 from baconian.common.sampler.sample_data import TransitionData
 import unittest
 from baconian.test.tests.set_up.setup import TestTensorflowSetup
+from baconian.algo.mpc import ModelPredictiveControl
+from baconian.algo.policy import UniformRandomPolicy
+from baconian.algo.dynamics.terminal_func.terminal_func import RandomTerminalFunc
+from baconian.envs.envs_reward_func import PendulumRewardFunc
 
 
 class TestMPC(TestTensorflowSetup):
@@ -47,6 +51,29 @@ class TestMPC(TestTensorflowSetup):
                         done=done)
         print(algo.train(batch_data=data))
 
+    def test_cem_planner(self):
+        mlp_dyna, local = self.create_continue_dynamics_model(env_id='Pendulum-v0')
+        env_spec = local['env_spec']
+        algo = ModelPredictiveControl(
+            dynamics_model=mlp_dyna,
+            env_spec=env_spec,
+            config_or_config_dict=dict(
+                SAMPLED_HORIZON=5,
+                SAMPLED_PATH_NUM=20,
+                dynamics_model_train_iter=10,
+                PLANNER='cem',
+                CEM_ITERATION=3,
+                CEM_ELITE_NUM=4
+            ),
+            name='mpc_cem',
+            policy=UniformRandomPolicy(env_spec=env_spec, name='unp')
+        )
+        algo.set_terminal_reward_function_for_dynamics_env(terminal_func=RandomTerminalFunc(name='random_p'),
+                                                           reward_func=PendulumRewardFunc())
+        algo.init()
+        for _ in range(10):
+            assert env_spec.action_space.contains(algo.predict(env_spec.obs_space.sample()))
+
     def test_mpc_polymorphism(self):
         policy_func = (
             self.create_mlp_deterministic_policy, self.create_normal_dist_mlp_policy, self.create_uniform_policy,
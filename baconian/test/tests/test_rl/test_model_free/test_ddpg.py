@@ -1,6 +1,8 @@
 from baconian.common.sampler.sample_data import TransitionData
 from baconian.test.tests.set_up.setup import TestWithAll
 from baconian.config.global_config import GlobalConfig
+import numpy as np
+import tensorflow as tf
 
 
 class TestDDPG(TestWithAll):
@@ -59,3 +61,70 @@ class TestDDPG(TestWithAll):
 
         self.assert_var_list_equal(ddpg.actor.parameters('tf_var_list'),
                                    new_ddpg.actor.parameters('tf_var_list'))
+
+    def test_fused_train(self):
+        ddpg, locals = self.create_ddpg(extra_config=dict(FUSED_TRAIN=True, FUSED_MINIBATCH_NUM=2))
+        env = locals['env']
+        env_spec = locals['env_spec']
+        ddpg.init()
+        data = TransitionData(env_spec)
+        st = env.reset()
+        for i in range(100):
+            ac = ddpg.predict(st)
+            new_st, re, done, _ = env.step(ac)
+            data.append(state=st, new_state=new_st, action=ac, reward=re, done=done)
+            st = new_st
+        ddpg.append_to_memory(data)
+        target_critic_val = [self.sess.run(var) for var in ddpg.target_critic.parameters('tf_var_list')]
+        ddpg.train(train_iter=4, update_target=False)
+        for val, var in zip(target_critic_val, ddpg.target_critic.parameters('tf_var_list')):
+            self.assertTrue(np.equal(val, self.sess.run(var)).all())
+        actor_val = [self.sess.run(var) for var in ddpg.actor.parameters('tf_var_list')]
+        op_num = len(tf.get_default_graph().get_operations())
+        res = ddpg.train(train_iter=4)
+        self.assertEqual(op_num, len(tf.get_default_graph().get_operations()))
+        self.assertTrue(np.isfinite(res['average_critic_loss']))
+        self.assertTrue(np.isfinite(res['average_actor_loss']))
+        self.assertTrue(np.any([np.any(np.not_equal(val, self.sess.run(var))) for val, var in
+                                zip(actor_val, ddpg.actor.parameters('tf_var_list'))]))
+        self.assertTrue(np.any([np.any(np.not_equal(val, self.sess.run(var))) for val, var in
+                                zip(target_critic_val, ddpg.target_critic.parameters('tf_var_list'))]))
+
+    def test_fused_train_equivalence(self):
+        self._check_fused_train_equivalence(minibatch_num=1)
+
+    def test_fused_train_equivalence_with_two_minibatches(self):
+        self._check_fused_train_equivalence(minibatch_num=2)
+
+    def _check_fused_train_equivalence(self, minibatch_num):
+        """
+        Train from the same weights and Adam state on the same batch, once by minibatch_num unfused steps and once by
+        one fused run, the critic, actor and target networks should end up the same.
+        """
+        ddpg, locals = self.create_ddpg(extra_config=dict(FUSED_TRAIN=True, FUSED_MINIBATCH_NUM=minibatch_num))
+        env_spec = locals['env_spec']
+        ddpg.init()
+        batch_data = TransitionData(env_spec)
+        for _ in range(50):
+            batch_data.append(state=env_spec.obs_space.sample(), new_state=env_spec.obs_space.sample(),
+                              action=env_spec.action_space.sample(), reward=np.random.randn(),
+                              done=np.random.rand() < 0.1)
+        var_list = tf.global_variables()
+        init_val = self.sess.run(var_list)
+        net_var_list = [var for net in (ddpg.critic, ddpg.actor, ddpg.target_critic, ddpg.target_actor)
+                        for var in net.parameters('tf_var_list')]
+        net_init_val = self.sess.run(net_var_list)
+
+        ddpg.fused_train_flag = False
+        ddpg.train(batch_data=batch_data, train_iter=minibatch_num)
+        unfused_val = self.sess.run(net_var_list)
+
+        for var, val in zip(var_list, init_val):
+            var.load(val, self.sess)
+        ddpg.fused_train_flag = True
+        ddpg.train(batch_data=batch_data, train_iter=minibatch_num)
+        fused_val = self.sess.run(net_var_list)
+
+        self.assertTrue(np.any([np.any(np.not_equal(init, val)) for init, val in zip(net_init_val, fused_val)]))
+        for var, unfused, fused in zip(net_var_list, unfused_val, fused_val):
+            self.assertTrue(np.allclose(unfused, fused, atol=1e-5), msg=var.name)
@@ -68,6 +68,22 @@ class TestDQN(TestWithAll):
                 total_diff += np.mean(np.abs(np.array(v1) - np.array(v2)))
             print('update target, difference mean', total_diff)
 
+    def test_batch_predict(self):
+        dqn, locals = self.create_dqn()
+        env = locals['env']
+        dqn.init()
+        obs = np.array([env.observation_space.sample() for _ in range(20)])
+        batch_action = dqn.predict(obs=obs, sess=self.sess, batch_flag=True)
+        batch_target_action, batch_target_q = dqn.predict_target_with_q_val(obs=obs, sess=self.sess,
+                                                                              batch_flag=True)
+        self.assertEqual(len(batch_action), 20)
+        self.assertEqual(batch_target_q.shape, (20,))
+        for i in range(20):
+            self.assertEqual(batch_action[i], dqn.predict(obs=obs[i], sess=self.sess, batch_flag=False))
+            action, q_val = dqn.predict_target_with_q_val(obs=obs[i], sess=self.sess, batch_flag=False)
+            self.assertEqual(batch_target_action[i], action)
+            self.assertTrue(np.isclose(batch_target_q[i], q_val))
+
     def test_l1_l2_norm(self):
         env = make('Acrobot-v1')
         env_spec = EnvSpec(obs_space=env.observation_space,
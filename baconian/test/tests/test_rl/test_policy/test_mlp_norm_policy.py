@@ -1,4 +1,5 @@
 import unittest
+import tensorflow as tf
 from baconian.envs.gym_env import make
 from baconian.core.core import EnvSpec
 from baconian.algo.policy.normal_distribution_mlp import NormalDistributionMLPPolicy
@@ -157,6 +158,15 @@ class TestNormalDistMLPPolicy(TestTensorflowSetup):
         })
         self.assertTrue(np.isclose(kl1, kl2).all())
 
+        for name in ['log_prob', 'prob', 'entropy', 'kl']:
+            self.assertIs(getattr(policy, name)(other=new_policy), getattr(policy, name)(other=new_policy))
+        op_num = len(tf.get_default_graph().get_operations())
+        policy.compute_dist_info(name='kl', other=new_policy, feed_dict={
+            policy.state_input: obs1,
+            new_policy.state_input: obs2
+        })
+        self.assertEqual(op_num, len(tf.get_default_graph().get_operations()))
+
 
 if __name__ == '__main__':
     unittest.main()
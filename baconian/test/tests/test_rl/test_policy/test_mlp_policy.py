@@ -1,3 +1,4 @@
+import numpy as np
 from baconian.core.core import EnvSpec
 from baconian.test.tests.set_up.setup import TestTensorflowSetup
 from baconian.envs.gym_env import make
@@ -31,4 +32,17 @@ class TestDeterministicMLPPolicy(TestTensorflowSetup):
         self.assertGreater(len(p3.parameters('tf_var_list')), 0)
         for var1, var2 in zip(policy.parameters('tf_var_list'), p3.parameters('tf_var_list')):
             self.assertEqual(var1.shape, var2.shape)
-            self.assertEqual(id(var1), id(var2))
\ No newline at end of file
+            self.assertEqual(id(var1), id(var2))
+
+    def test_compiled_forward(self):
+        env = make('Pendulum-v0')
+        env_spec = EnvSpec(obs_space=env.observation_space,
+                           action_space=env.action_space)
+
+        policy, locals = self.create_mlp_deterministic_policy(name='mlp_policy', env_spec=env_spec)
+        policy.init()
+        obs = np.array([env.observation_space.sample() for _ in range(5)])
+        ac = policy.forward(obs=obs)
+        for _ in range(3):
+            self.assertTrue(np.allclose(ac, policy.forward(obs=obs, compiled_flag=True)))
+        self.assertTrue(np.allclose(policy.forward(obs=obs[0]), policy.forward(obs=obs[0], compiled_flag=True)))
@@ -0,0 +1,46 @@
+import numpy as np
+import tensorflow as tf
+from baconian.common.numpy_mlp import NumpyMLP, greedy_discrete_action
+from baconian.test.tests.set_up.setup import TestTensorflowSetup
+
+
+class TestNumpyMLP(TestTensorflowSetup):
+    def test_ddpg_actor(self):
+        ddpg, locals = self.create_ddpg()
+        env_spec = locals['env_spec']
+        ddpg.init()
+        obs = np.array([env_spec.obs_space.sample() for _ in range(10)])
+        state = ddpg.export_numpy_actor_state()
+        actor = NumpyMLP(state)
+        self.assertTrue(np.allclose(actor.forward(obs), ddpg.predict(obs), atol=1e-5))
+        self.assertTrue(np.allclose(actor.forward(obs[0]), ddpg.predict(obs[0]), atol=1e-5))
+        self.assertEqual(actor.forward(obs).dtype, np.float32)
+
+        self.assertFalse(actor.load_state(state))
+        ddpg.actor.parameters.init()
+        self.assertTrue(actor.load_state(ddpg.export_numpy_actor_state()))
+        self.assertTrue(np.allclose(actor.forward(obs), ddpg.predict(obs), atol=1e-5))
+
+    def test_dqn_q_value_func(self):
+        dqn, locals = self.create_dqn()
+        env_spec = locals['env_spec']
+        dqn.init()
+        obs = np.array([env_spec.obs_space.sample() for _ in range(10)])
+        q_mlp = NumpyMLP(dqn.export_numpy_actor_state())
+        self.assertEqual(greedy_discrete_action(q_mlp, obs, env_spec.flat_action_dim).tolist(),
+                         dqn.predict(obs, batch_flag=True))
+
+    def test_ppo_policy(self):
+        ppo, locals = self.create_ppo()
+        env_spec = locals['env_spec']
+        ppo.init()
+        obs = np.array([env_spec.obs_space.sample() for _ in range(10)])
+        ppo.scaler.update_scaler(obs)
+        actor = NumpyMLP(ppo.export_numpy_actor_state())
+        mean = tf.get_default_session().run(ppo.policy.mean_output,
+                                            feed_dict={ppo.policy.state_input: ppo.scaler.process(obs),
+                                                       **ppo.parameters.return_tf_parameter_feed_dict()})
+        mean = np.clip(mean, env_spec.action_space.low, env_spec.action_space.high)
+        self.assertTrue(np.allclose(actor.forward(obs, deterministic=True), mean, atol=1e-4))
+        for ac in actor.forward(obs):
+            self.assertTrue(env_spec.action_space.contains(ac))
@@ -1,5 +1,7 @@
 import numpy as np
 import tensorflow as tf
+from baconian.algo.misc.placeholder_input import PlaceholderInput
+from baconian.common.schedules import LinearScheduler
 from baconian.config.global_config import GlobalConfig
 from baconian.tf.util import create_new_tf_session
 from baconian.test.tests.set_up.setup import TestWithAll
@@ -64,3 +66,61 @@ class TestTensorflowParameters(TestWithAll):
         param2.load(path_to_model=GlobalConfig().DEFAULT_LOG_PATH + '/model', global_step=9)
         for var1, var2 in zip(var_val, param2('tf_var_list')):
             self.assertTrue(np.equal(var1, self.sess.run(var2)).all())
+
+    def test_weight_transfer(self):
+        param, _ = self.create_tf_parameters('param')
+        param.init()
+        para2, _ = self.create_tf_parameters(name='para2')
+        para2.init()
+
+        para2.copy_from(param)
+        op_num = len(tf.get_default_graph().get_operations())
+        for _ in range(3):
+            para2.copy_from(param)
+        self.assertEqual(op_num, len(tf.get_default_graph().get_operations()))
+        for var1, var2 in zip(param('tf_var_list'), para2('tf_var_list')):
+            self.assertTrue(np.equal(self.sess.run(var1), self.sess.run(var2)).all())
+
+        flat_values = param.return_flat_tf_var_values()
+        self.assertEqual(flat_values.shape, (param.flat_tf_var_size,))
+        para2.set_flat_tf_var_values(flat_values + 1.0)
+        op_num = len(tf.get_default_graph().get_operations())
+        para2.set_flat_tf_var_values(flat_values + 1.0)
+        self.assertEqual(op_num, len(tf.get_default_graph().get_operations()))
+        self.assertTrue(np.allclose(para2.return_flat_tf_var_values(), flat_values + 1.0))
+        with self.assertRaises(ValueError):
+            para2.set_flat_tf_var_values(flat_values[1:])
+
+    def test_compiled_feed_list_invalidation(self):
+        param, _ = self.create_tf_parameters('param')
+        var2_ph = tf.placeholder(shape=(), dtype=tf.float32)
+        param.to_tf_ph(key='var2', ph=var2_ph)
+        param.init()
+        placeholder_input = PlaceholderInput(parameters=param)
+        output = var2_ph * 2.0
+
+        def compiled_forward():
+            return placeholder_input._compiled_run(output, input_ph_list=[], input_value_list=[])
+
+        self.assertTrue(np.isclose(compiled_forward(), 0.02))
+        # the cached feed list is reused when nothing changes
+        self.assertTrue(np.isclose(compiled_forward(), 0.02))
+
+        param.set('var2', 0.5)
+        self.assertTrue(np.isclose(compiled_forward(), 1.0))
+
+        para2, _ = self.create_tf_parameters(name='para2')
+        para2.to_tf_ph(key='var2', ph=tf.placeholder(shape=(), dtype=tf.float32))
+        para2.init()
+        para2.set('var2', 0.25)
+        param.copy_from(para2)
+        self.assertTrue(np.isclose(compiled_forward(), 0.5))
+
+        t = [0]
+        param.set_scheduler(param_key='var2',
+                            scheduler=LinearScheduler(t_fn=lambda: t[0], schedule_timesteps=10, final_p=1.25))
+        self.assertTrue(np.isclose(compiled_forward(), 0.5))
+        t[0] = 5
+        self.assertTrue(np.isclose(compiled_forward(), 1.5))
+        t[0] = 10
+        self.assertTrue(np.isclose(compiled_forward(), 2.5))
@@ -1,6 +1,6 @@
 import unittest
 import numpy as np
-from baconian.tf.util import MLPCreator
+from baconian.tf.util import MLPCreator, GraphOpCache
 from baconian.test.tests.set_up.setup import TestTensorflowSetup
 import tensorflow as tf
 
@@ -230,6 +230,19 @@ class TestTensorflowUtil(TestTensorflowSetup):
         var2 = self.sess.run(net2[2][0])
         self.assertTrue(np.equal(var1, var2).all())
 
+    def test_graph_op_cache(self):
+        cache = GraphOpCache()
+        input_ph = tf.placeholder(dtype=tf.float32, shape=[None, 5])
+        op = cache.get('sum', lambda: tf.reduce_sum(input_ph))
+        op_num = len(tf.get_default_graph().get_operations())
+        self.assertIs(op, cache.get('sum', lambda: tf.reduce_sum(input_ph)))
+        self.assertEqual(op_num, len(tf.get_default_graph().get_operations()))
+        self.assertTrue('sum' in cache)
+        with tf.Graph().as_default():
+            self.assertFalse('sum' in cache)
+        cache.clear()
+        self.assertFalse('sum' in cache)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,5 @@
 from typeguard import typechecked
-from baconian.tf.util import MLPCreator
+from baconian.tf.util import MLPCreator, CompiledRunner
 import tensorflow as tf
 import numpy as np
 from baconian.tf.tf_parameters import ParametersWithTensorflowVariable
@@ -23,6 +23,10 @@ class MLP(object):
         self.name_scope = name_scope
         self.mlp_config = mlp_config
         self.mlp_net_name = net_name
+        self.input_norm = input_norm
+        self.output_norm = output_norm
+        self.output_low = output_low
+        self.output_high = output_high
         self.net, self.output, self.var_list = MLPCreator.create_network_with_tf_layers(input=input_ph,
                                                                                         reuse=reuse,
                                                                                         network_config=mlp_config,
@@ -37,16 +41,72 @@ class MLP(object):
         self._parameters = ParametersWithTensorflowVariable(tf_var_list=self.var_list,
                                                             name='parameters_{}'.format(self.mlp_net_name),
                                                             rest_parameters=dict())
+        self._compiled_runner = CompiledRunner()
+        self._export_version = 0
 
-    def forward(self, input: np.ndarray, sess=tf.get_default_session()) -> np.ndarray:
-        feed_dict = {
-            self.input_ph: input,
-            **self._parameters.return_tf_parameter_feed_dict()
-        }
-        res = sess.run(self.output,
-                       feed_dict=feed_dict)
+    def forward(self, input: np.ndarray, sess=None, compiled_flag=False) -> np.ndarray:
+        sess = sess if sess else tf.get_default_session()
+        if compiled_flag is True:
+            res = self._compiled_runner.run(self.output, [self.input_ph], [input], parameters_list=[self._parameters],
+                                            sess=sess)
+        else:
+            feed_dict = {
+                self.input_ph: input,
+                **self._parameters.return_tf_parameter_feed_dict()
+            }
+            res = sess.run(self.output,
+                           feed_dict=feed_dict)
         return np.squeeze(res)
 
+    def export_numpy_state(self, sess=None, version=None, clip_low=None, clip_high=None, noise_stddev=None,
+                           input_norm=None) -> dict:
+        """
+        Export the weights and the config of the network as a plain dict, which is loaded by
+        baconian.common.numpy_mlp.NumpyMLP to run the network without tensorflow.
+
+        :param sess: tf session
+        :param version: version of the exported weights, an export counter of this network is used if None
+        :param clip_low: lower bound to clip the output into
+        :param clip_high: upper bound to clip the output into
+        :param noise_stddev: stddev of the gaussian noise added to the output
+        :param input_norm: overwrite the input_norm of the network, e.g., to fold an observation scaler into it
+        :return: dict of the state
+        :rtype: dict
+        """
+        sess = sess if sess else tf.get_default_session()
+        var_list = []
+        for layer_config in self.mlp_config:
+            if layer_config['TYPE'] != 'DENSE':
+                continue
+            var_list.append((self._find_layer_var(layer_config, 'kernel'), self._find_layer_var(layer_config, 'bias')))
+        value_iter = iter(sess.run([var for pair in var_list for var in pair if var is not None]))
+        weight_list = [(next(value_iter), None if bias is None else next(value_iter)) for _, bias in var_list]
+        if version is None:
+            self._export_version += 1
+            version = self._export_version
+        return dict(version=version,
+                    mlp_config=self.mlp_config,
+                    weight_list=weight_list,
+                    input_norm=input_norm if input_norm is not None else self.input_norm,
+                    output_norm=self.output_norm,
+                    output_low=self.output_low,
+                    output_high=self.output_high,
+                    clip_low=clip_low,
+                    clip_high=clip_high,
+                    noise_stddev=noise_stddev)
+
+    def _find_layer_var(self, layer_config: dict, var_name: str):
+        layer_var_name = '{}_{}/{}'.format(self.mlp_net_name, layer_config['NAME'], var_name)
+        res = [var for var in self.var_list if
+               var.op.name == layer_var_name or var.op.name.endswith('/' + layer_var_name)]
+        if len(res) > 1:
+            raise ValueError('more than one variable named {} in {}'.format(layer_var_name, self.name_scope))
+        if len(res) == 0:
+            if var_name == 'bias' and layer_config['B_INIT_VALUE'] is None:
+                return None
+            raise ValueError('variable {} not found in {}'.format(layer_var_name, self.name_scope))
+        return res[0]
+
     def copy_from(self, obj) -> bool:
         if not isinstance(obj, type(self)):
             raise TypeError('Wrong type of obj %s to be copied, which should be %s' % (type(obj), type(self)))
@@ -5,6 +5,7 @@ from overrides.overrides import overrides
 from typeguard import typechecked
 import os
 from baconian.common.schedules import Scheduler
+from baconian.tf.util import GraphOpCache
 import numpy as np
 
 
@@ -24,9 +25,6 @@ class ParametersWithTensorflowVariable(Parameters):
                                                                to_scheduler_param_tuple=to_scheduler_param_tuple,
                                                                source_config=source_config)
         self._tf_var_list = tf_var_list
-        self.snapshot_var = []
-        self.save_snapshot_op = []
-        self.load_snapshot_op = []
         self.saver = None
         self.max_to_keep = max_to_keep
         self.require_snapshot = require_snapshot
@@ -35,6 +33,11 @@ class ParametersWithTensorflowVariable(Parameters):
         if default_save_type != 'tf':
             raise NotImplementedError('only support saving tf')
         self._registered_tf_ph_dict = dict()
+        self._assign_value_ph_list = []
+        self._assign_value_op_list = []
+        # the snapshot, copy and flat transfer ops are built once and cached by their purpose
+        self._op_cache = GraphOpCache()
+        self._feed_list_cache = None
         if to_ph_parameter_dict:
             for key, val in to_ph_parameter_dict.items():
                 self.to_tf_ph(key=key, ph=val)
@@ -44,19 +47,7 @@ class ParametersWithTensorflowVariable(Parameters):
         sess = tf.get_default_session()
         sess.run(tf.variables_initializer(var_list=self._tf_var_list))
         if self.require_snapshot is True:
-            if len(self.snapshot_var) == 0:
-                # add the snapshot op after the init
-                sess = tf.get_default_session()
-                with tf.variable_scope('snapshot'):
-                    for var in self._tf_var_list:
-                        snap_var = tf.Variable(initial_value=sess.run(var),
-                                               expected_shape=var.get_shape().as_list(),
-                                               name=str(var.name).split(':')[0])
-                        self.snapshot_var.append(snap_var)
-                        self.save_snapshot_op.append(tf.assign(snap_var, var))
-                        self.load_snapshot_op.append(tf.assign(var, snap_var))
-            sess.run(tf.variables_initializer(var_list=self.snapshot_var))
-            sess.run(self.save_snapshot_op)
+            self.save_snapshot()
         self.saver = tf.train.Saver(max_to_keep=self.max_to_keep,
                                     var_list=self._tf_var_list)
 
@@ -66,29 +57,51 @@ class ParametersWithTensorflowVariable(Parameters):
             res[val] = self(key, require_true_value=True)
         return res
 
+    def return_tf_parameter_feed_list(self) -> tuple:
+        """
+        Return the registered placeholders and their values as two lists in the same order, which can be passed to a
+        callable made by Session.make_callable. The lists are cached, at each call only the values of the scheduled
+        parameters are refreshed, the others are refreshed after set, to_tf_ph, set_scheduler, copy_from and load.
+        """
+        if self._feed_list_cache is None:
+            key_list = list(self._registered_tf_ph_dict.keys())
+            self._feed_list_cache = ([self._registered_tf_ph_dict[key] for key in key_list],
+                                     [self(key, require_true_value=True) for key in key_list],
+                                     [(i, key) for i, key in enumerate(key_list) if key in self._scheduler_info_dict])
+        ph_list, value_list, scheduled_key_list = self._feed_list_cache
+        for i, key in scheduled_key_list:
+            value_list[i] = self(key, require_true_value=True)
+        return ph_list, value_list
+
     def save_snapshot(self):
         sess = tf.get_default_session()
-        if len(self.save_snapshot_op) == 0:
-            with tf.variable_scope('snapshot'):
-                for var in self._tf_var_list:
-                    snap_var = tf.Variable(initial_value=sess.run(var),
-                                           expected_shape=var.get_shape().as_list(),
-                                           name=var.name)
-                    self.snapshot_var.append(snap_var)
-                    self.save_snapshot_op.append(tf.assign(var, snap_var))
-        sess.run(self.save_snapshot_op)
+        sess.run(self._get_snapshot_op()[1])
 
     def load_snapshot(self):
         sess = tf.get_default_session()
-        if len(self.load_snapshot_op) == 0:
-            with tf.variable_scope('snapshot'):
-                for var in self._tf_var_list:
-                    snap_var = tf.Variable(initial_value=sess.run(var),
-                                           expected_shape=var.get_shape().as_list(),
-                                           name=var.name)
-                    self.snapshot_var.append(snap_var)
-                    self.load_snapshot_op.append(tf.assign(snap_var, var))
-        sess.run(self.load_snapshot_op)
+        sess.run(self._get_snapshot_op()[2])
+
+    def _get_snapshot_op(self) -> tuple:
+        """
+        Return (snapshot variable list, save op, load op), which are built at the first use and initialized with the
+        current values of the tf variables.
+        """
+        return self._op_cache.get('snapshot', self._build_snapshot_op)
+
+    def _build_snapshot_op(self) -> tuple:
+        sess = tf.get_default_session()
+        snapshot_var_list = []
+        with tf.variable_scope('snapshot'):
+            for var in self._tf_var_list:
+                snapshot_var_list.append(tf.Variable(initial_value=sess.run(var),
+                                                     expected_shape=var.get_shape().as_list(),
+                                                     name=str(var.name).split(':')[0]))
+            save_op = tf.group(*[tf.assign(snap_var, var) for snap_var, var in zip(snapshot_var_list,
+                                                                                   self._tf_var_list)])
+            load_op = tf.group(*[tf.assign(var, snap_var) for snap_var, var in zip(snapshot_var_list,
+                                                                                   self._tf_var_list)])
+        sess.run(tf.variables_initializer(var_list=snapshot_var_list))
+        return snapshot_var_list, save_op, load_op
 
     def save(self, save_path, global_step, sess=None, name=None, *args, **kwargs):
         if self.default_checkpoint_type == 'tf':
@@ -121,6 +134,7 @@ class ParametersWithTensorflowVariable(Parameters):
                         load_path=path_to_model,
                         global_step=global_step,
                         name=model_name)
+        self._feed_list_cache = None
 
     def _save_to_tf(self, save_path, global_step, sess=None, name=None):
         name = name if name else self.name
@@ -172,6 +186,7 @@ class ParametersWithTensorflowVariable(Parameters):
                 self._parameters[key] = new_val
             else:
                 self._source_config.set(key, new_val)
+            self._feed_list_cache = None
 
     def set_tf_var_list(self, tf_var_list: list):
         temp_var_list = list(set(tf_var_list))
@@ -180,22 +195,107 @@ class ParametersWithTensorflowVariable(Parameters):
         for var in tf_var_list:
             assert isinstance(var, (tf.Tensor, tf.Variable))
         self._tf_var_list += tf_var_list
+        # the cached ops only cover the old variables
+        self._op_cache.clear()
 
     def to_tf_ph(self, key, ph: tf.Tensor):
         # call the parameters first to make sure it have an init value
         self(key)
         self._registered_tf_ph_dict[key] = ph
+        self._feed_list_cache = None
 
     def copy_from(self, source_parameter, deep_copy=None):
         if not isinstance(source_parameter, type(self)):
             raise TypeError()
         super(ParametersWithTensorflowVariable, self).copy_from(source_parameter)
-        tmp_op_list = []
-        for t_para, s_para in zip(self._tf_var_list, source_parameter._tf_var_list):
-            tmp_op_list.append(tf.assign(t_para, s_para))
+        self._feed_list_cache = None
         sess = tf.get_default_session()
-        sess.run(tmp_op_list)
-        del tmp_op_list
+        sess.run(self._get_copy_op(source_parameter))
+
+    def _get_copy_op(self, source_parameter):
+        """
+        Return the grouped assign op that copies the tf variables of source_parameter into this one. The op is built
+        at the first copy from a source and cached, so repeated copies do not grow the graph.
+        """
+        if len(self._tf_var_list) != len(source_parameter._tf_var_list):
+            raise ValueError('can not copy {} tf variables into {} tf variables'.format(
+                len(source_parameter._tf_var_list), len(self._tf_var_list)))
+
+        def create_fn():
+            with tf.name_scope('{}_copy_op'.format(self.name)):
+                return tf.group(*[tf.assign(t_para, s_para) for t_para, s_para in zip(self._tf_var_list,
+                                                                                      source_parameter._tf_var_list)])
+
+        # the source itself is in the key, so the entry is never shared with another object of the same id
+        return self._op_cache.get(('copy', source_parameter), create_fn)
+
+    def return_tf_var_values(self, sess=None) -> list:
+        """
+        Export the values of all tf variables as a list of numpy arrays with one session run.
+        """
+        sess = sess if sess else tf.get_default_session()
+        return sess.run(self._tf_var_list)
+
+    def set_tf_var_values(self, values: list, sess=None):
+        """
+        Load the values exported by return_tf_var_values, the assign ops are created only once and fed by placeholders.
+        """
+        if len(values) != len(self._tf_var_list):
+            raise ValueError('got {} values for {} tf variables'.format(len(values), len(self._tf_var_list)))
+        for var in self._tf_var_list[len(self._assign_value_ph_list):]:
+            ph = tf.placeholder(dtype=var.dtype.base_dtype, shape=var.get_shape())
+            self._assign_value_ph_list.append(ph)
+            self._assign_value_op_list.append(tf.assign(var, ph))
+        sess = sess if sess else tf.get_default_session()
+        sess.run(self._assign_value_op_list, feed_dict=dict(zip(self._assign_value_ph_list, values)))
+
+    @property
+    def flat_tf_var_size(self) -> int:
+        return int(sum([np.prod(var.get_shape().as_list()) for var in self._tf_var_list]))
+
+    def return_flat_tf_var_values(self, sess=None) -> np.ndarray:
+        """
+        Export the values of all tf variables as one flat vector with one session run, the variables are concatenated
+        in the order of tf_var_list and casted to the dtype of the first one.
+
+        :param sess: session to use, the default session if None
+        :return: flat vector of size flat_tf_var_size
+        :rtype: np.ndarray
+        """
+        flat_value_tensor, _, _ = self._op_cache.get('flat', self._build_flat_op)
+        sess = sess if sess else tf.get_default_session()
+        return sess.run(flat_value_tensor)
+
+    def set_flat_tf_var_values(self, flat_values: np.ndarray, sess=None):
+        """
+        Load the vector exported by return_flat_tf_var_values, all variables are assigned by one op fed by one
+        placeholder.
+
+        :param flat_values: flat vector of size flat_tf_var_size
+        :param sess: session to use, the default session if None
+        """
+        _, flat_value_ph, flat_assign_op = self._op_cache.get('flat', self._build_flat_op)
+        flat_values = np.reshape(flat_values, [-1])
+        if flat_values.shape[0] != self.flat_tf_var_size:
+            raise ValueError('got flat values of size {} for tf variables of size {}'.format(flat_values.shape[0],
+                                                                                              self.flat_tf_var_size))
+        sess = sess if sess else tf.get_default_session()
+        sess.run(flat_assign_op, feed_dict={flat_value_ph: flat_values})
+
+    def _build_flat_op(self) -> tuple:
+        if len(self._tf_var_list) == 0:
+            raise ValueError('parameters {} has no tf variables'.format(self.name))
+        dtype = self._tf_var_list[0].dtype.base_dtype
+        shape_list = [var.get_shape().as_list() for var in self._tf_var_list]
+        size_list = [int(np.prod(shape)) for shape in shape_list]
+        with tf.name_scope('{}_flat_op'.format(self.name)):
+            flat_value_tensor = tf.concat([tf.cast(tf.reshape(var, [-1]), dtype) for var in self._tf_var_list],
+                                          axis=0)
+            flat_value_ph = tf.placeholder(dtype=dtype, shape=[sum(size_list)])
+            assign_op_list = []
+            for var, shape, val in zip(self._tf_var_list, shape_list, tf.split(flat_value_ph, size_list)):
+                assign_op_list.append(tf.assign(var, tf.cast(tf.reshape(val, shape), var.dtype.base_dtype)))
+            return flat_value_tensor, flat_value_ph, tf.group(*assign_op_list)
 
     def _update_dict(self, source_dict: dict, target_dict: dict):
         for key, val in source_dict.items():
@@ -205,10 +305,12 @@ class ParametersWithTensorflowVariable(Parameters):
 
     @typechecked
     def set_scheduler(self, param_key: str, scheduler: Scheduler, to_tf_ph_flag=True):
-        ori_val = self(param_key)
-        if to_tf_ph_flag is True:
+        ori_val = self(param_key, require_true_value=True)
+        if to_tf_ph_flag is True and param_key not in self._registered_tf_ph_dict:
+            # the placeholder is kept when the scheduler is set again, e.g., by copy_from
             self.to_tf_ph(key=param_key,
                           ph=tf.placeholder(shape=tuple(np.array(ori_val).shape),
                                             dtype=tf.dtypes.as_dtype(np.array(ori_val).dtype)))
         scheduler.initial_p = ori_val
         self._scheduler_info_dict[param_key] = dict(param_key=param_key, scheduler=scheduler)
+        self._feed_list_cache = None
@@ -7,8 +7,9 @@ import collections
 import multiprocessing
 import tensorflow.contrib as tf_contrib
 from baconian.common.error import *
+from baconian.common.profiler import profile_decorator
 
-__all__ = ['get_tf_collection_var_list', 'MLPCreator']
+__all__ = ['get_tf_collection_var_list', 'MLPCreator', 'GraphOpCache', 'CompiledRunner']
 
 
 def get_tf_collection_var_list(scope, key=tf.GraphKeys.GLOBAL_VARIABLES):
@@ -16,6 +17,73 @@ def get_tf_collection_var_list(scope, key=tf.GraphKeys.GLOBAL_VARIABLES):
     return sorted(list(set(var_list)), key=lambda x: x.name)
 
 
+class GraphOpCache(object):
+    """
+    Cache of the tensors/ops built lazily by an object, keyed by their purpose (e.g., 'log_prob', ('kl', other)). An
+    entry is built by its create function at the first get under the current default graph and reused afterwards, so
+    calling the object repeatedly does not grow the graph.
+    """
+
+    def __init__(self):
+        self._cache_dict = dict()
+
+    def get(self, key, create_fn):
+        """
+        :param key: hashable purpose of the op
+        :param create_fn: function without argument that builds the op, only called when the op is not cached
+        :return: the cached op
+        """
+        if key in self._cache_dict:
+            graph, op = self._cache_dict[key]
+            if graph is tf.get_default_graph():
+                return op
+        op = create_fn()
+        self._cache_dict[key] = (tf.get_default_graph(), op)
+        return op
+
+    def __contains__(self, key):
+        return key in self._cache_dict and self._cache_dict[key][0] is tf.get_default_graph()
+
+    def clear(self):
+        self._cache_dict = dict()
+
+
+class CompiledRunner(object):
+    """
+    Low latency alternative of sess.run for inference, the fetches are evaluated by a callable made by
+    Session.make_callable with the feed placeholders bound in a fixed order, so no feed dict is built and parsed at
+    each call. The callables are cached by (fetches, placeholders, session).
+    """
+
+    def __init__(self):
+        self._callable_dict = dict()
+
+    def run(self, fetches, input_ph_list: list, input_value_list: list, parameters_list: list = (), sess=None):
+        """
+        :param fetches: a tensor or a tuple of tensors to evaluate
+        :param input_ph_list: placeholders to feed
+        :param input_value_list: values of input_ph_list
+        :param parameters_list: ParametersWithTensorflowVariable whose registered placeholders are also fed, with the
+                                values from their return_tf_parameter_feed_list
+        :param sess: session to use, the default session if None
+        :return: the evaluated fetches
+        """
+        sess = sess if sess else tf.get_default_session()
+        ph_list = list(input_ph_list)
+        value_list = list(input_value_list)
+        for parameters in parameters_list:
+            param_ph_list, param_value_list = parameters.return_tf_parameter_feed_list()
+            ph_list += param_ph_list
+            value_list += param_value_list
+        key = (fetches, tuple(ph_list), sess)
+        if key not in self._callable_dict:
+            self._callable_dict[key] = profile_decorator('sess_run')(sess.make_callable(fetches, feed_list=ph_list))
+        return self._callable_dict[key](*value_list)
+
+    def clear(self):
+        self._callable_dict = dict()
+
+
 # def create_new_tf_session(cuda_device: int):
 #     os.environ["CUDA_VISIBLE_DEVICES"] = str(cuda_device)
 #     tf_config = tf.ConfigProto()
@@ -58,9 +126,12 @@ def make_session(config=None, num_cpu=None, make_default=False, graph=None):
         config.gpu_options.allow_growth = True
 
     if make_default:
-        return tf.InteractiveSession(config=config, graph=graph)
+        sess = tf.InteractiveSession(config=config, graph=graph)
     else:
-        return tf.Session(config=config, graph=graph)
+        sess = tf.Session(config=config, graph=graph)
+    # time every run call of the session when the Profiler is enabled
+    sess.run = profile_decorator('sess_run')(sess.run)
+    return sess
 
 
 # class TensorInput(object):